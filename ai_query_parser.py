@@ -2,19 +2,213 @@
 import os
 import re
 import json
-from openai import OpenAI
+import threading
 
-# Initialize new OpenAI client
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+from classifier import classify, mentions, DEFAULT_REGION, DEFAULT_SECTOR
 
-def parse_ai_prompt(prompt: str):
+# LLM results keyed by normalized prompt, so a repeated prompt never reaches the model twice
+MEMO_PATH = os.getenv("AI_PARSER_MEMO_PATH", os.path.join(".cache", "ai_prompts.json"))
+MEMO_MAX_ENTRIES = int(os.getenv("AI_PARSER_MEMO_ENTRIES", "5000"))
+# Set AI_PARSER_LLM=off to never call the model (offline runs, tests): the rule-based result is returned as-is
+LLM_ENABLED = os.getenv("AI_PARSER_LLM", "on") != "off"
+MODEL = os.getenv("AI_PARSER_MODEL", "gpt-4o-mini")
+
+# -------------------------
+# Rule-based extraction
+# -------------------------
+_NUM = r"\d[\d,]*(?:\.\d+)?"
+_UNIT = r"k|m|mn|bn|b|thousand|million|billion"
+_UNIT_VALUES = {"k": 1e3, "thousand": 1e3, "m": 1e6, "mn": 1e6, "million": 1e6,
+                "b": 1e9, "bn": 1e9, "billion": 1e9}
+_CAP_WORDS = r"under|below|less than|up to|upto|max(?:imum)?|at most|no more than|not more than|<=?"
+# "over £1m" is a floor, not a cap; left to the model
+_FLOOR_WORDS = r"over|above|more than|at least|min(?:imum)?|>=?"
+
+_CAP = re.compile(rf"(?:{_CAP_WORDS})\s*£?\s*({_NUM})\s*({_UNIT})?\b")
+_FLOOR = re.compile(rf"(?:{_FLOOR_WORDS})\s*£?\s*{_NUM}")
+_POUNDS = re.compile(rf"£\s*({_NUM})\s*({_UNIT})?\b|\b({_NUM})\s*(thousand|million|billion)\b")
+
+_TIMEFRAMES = [
+    (re.compile(r"\bclosing soon\b|\bsoon\b"), 15),
+    (re.compile(r"\b(?:today|tonight|tomorrow)\b"), 1),
+    (re.compile(r"\b(?:this|within a|within one|in a) week\b"), 7),
+    (re.compile(r"\bnext week\b"), 14),
+    (re.compile(r"\b(?:next|this|within a|within one|in a|within the next) month\b"), 30),
+]
+_N_DAYS = re.compile(r"\b(\d+)\s*(day|week|month)s?\b")
+_PERIOD_DAYS = {"day": 1, "week": 7, "month": 30}
+
+# Words that carry no filter on their own; anything else left over means the rules did not understand the prompt
+_STOPWORDS = frozenset("""
+    a all an and any are around at by closing deadline due ending expiring find for from give i in is
+    jobs latest list looking me my need new of on open opportunities opportunity or please procurement
+    procurements public sector services service show that the to tender tenders contract contracts uk
+    united kingdom britain great nationwide national england value worth budget want which with within
+    next this over the days weeks months
+""".split())
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Lower-cased, punctuation-free, whitespace-collapsed prompt (the memo key)."""
+    text = re.sub(r"(?<=\d),(?=\d{3})", "", (prompt or "").lower())  # "£250,000" -> "£250000"
+    return " ".join(re.findall(r"[a-z0-9£.]+", text))
+
+
+def _amount(num, unit):
+    value = float(num.replace(",", ""))
+    return int(value * _UNIT_VALUES.get((unit or "").lower(), 1))
+
+
+def parse_locally(prompt: str):
     """
-    Uses GPT to turn natural language queries into structured filter instructions.
-    Returns a dict with: region, sector, value_cap, timeframe_days
+    Deterministic extraction: regions and sectors from the classifier's keyword
+    tables, "£2m"/"under 2 million" value caps and "next month"/"closing soon"/
+    "within 10 days" timeframes. Returns (filters, complete): `complete` is True
+    when every content word of the prompt was accounted for, i.e. the model
+    would have nothing to add.
     """
-    if not prompt or len(prompt.strip()) == 0:
-        return {}
+    text = normalize_prompt(prompt)
+    consumed = []
+    filters = {"keywords": [], "region": None, "sector": None, "value_cap": None, "timeframe_days": None}
+
+    region_hit = sector_hit = False
+    for start, end, keyword, tables in mentions(text):
+        consumed.append((start, end))
+        region_hit = region_hit or "region" in tables
+        if "sector" in tables:
+            sector_hit = True
+            if keyword not in filters["keywords"]:
+                filters["keywords"].append(keyword)
+    region, sector = classify(text)
+    filters["region"] = region if region_hit and region != DEFAULT_REGION else None
+    filters["sector"] = sector if sector_hit and sector != DEFAULT_SECTOR else None
+
+    understood = _FLOOR.search(text) is None
+    cap = (_CAP.search(text) or _POUNDS.search(text)) if understood else None
+    if cap:
+        groups = cap.groups()
+        num, unit = groups[:2] if groups[0] else groups[2:4]
+        filters["value_cap"] = _amount(num, unit)
+        consumed.append(cap.span())
+
+    for pattern, days in _TIMEFRAMES:
+        m = pattern.search(text)
+        if m:
+            filters["timeframe_days"] = days
+            consumed.append(m.span())
+            break
+    else:
+        m = _N_DAYS.search(text)
+        if m:
+            filters["timeframe_days"] = int(m.group(1)) * _PERIOD_DAYS[m.group(2)]
+            consumed.append(m.span())
+
+    remaining = list(text)
+    for start, end in consumed:
+        remaining[start:end] = " " * (end - start)
+    leftover = [w for w in _TOKEN.findall("".join(remaining)) if w not in _STOPWORDS]
+    filters["keywords"] += [w for w in leftover if w not in filters["keywords"]]
+    return filters, understood and not leftover
+
+
+# -------------------------
+# Persistent memo of model answers
+# -------------------------
+class PromptMemo:
+    """JSON file of {namespace:normalized prompt -> parsed filters}, loaded once and rewritten atomically."""
+
+    def __init__(self, path=MEMO_PATH, max_entries=MEMO_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.entries = None
+        self.lock = threading.Lock()
+
+    def _load(self):
+        if self.entries is None:
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self.entries = json.load(f)
+            except (FileNotFoundError, json.JSONDecodeError):
+                self.entries = {}
+
+    def get(self, key):
+        with self.lock:
+            self._load()
+            return self.entries.get(key)
+
+    def put(self, key, value):
+        with self.lock:
+            self._load()
+            self.entries.pop(key, None)
+            self.entries[key] = value
+            # Oldest answers go first
+            while len(self.entries) > self.max_entries:
+                del self.entries[next(iter(self.entries))]
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self.entries, f, ensure_ascii=False)
+            os.replace(tmp, self.path)
 
+
+memo = PromptMemo()
+
+
+def two_tier(prompt, namespace, local, llm):
+    """
+    Shared lookup order: the rule-based `local` result when it is complete,
+    then the memo, then `llm(prompt)` (memoized). With the model disabled or
+    failing, the partial local result is returned instead.
+    """
+    parsed, complete = local
+    if complete:
+        return parsed
+    key = f"{namespace}:{normalize_prompt(prompt)}"
+    cached = memo.get(key)
+    if cached is not None:
+        return cached
+    if llm is None:
+        return parsed
+    try:
+        answer = llm(prompt)
+    except Exception as e:
+        print(f"⚠️ AI parser unavailable, using rule-based filters: {e}")
+        return parsed
+    if answer:
+        memo.put(key, answer)
+        return answer
+    return parsed
+
+
+# -------------------------
+# Model call (lazy client)
+# -------------------------
+_client = None
+
+
+def openai_client():
+    """The OpenAI client, created on first use so importing this module needs no key or network."""
+    global _client
+    if _client is None:
+        from openai import OpenAI
+        _client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    return _client
+
+
+def _canonical(filters):
+    """Maps the model's free-text region/sector onto the classifier's labels where it recognizes them."""
+    region, sector = filters.get("region"), filters.get("sector")
+    if isinstance(region, str):
+        label = classify(region)[0]
+        filters["region"] = label if label != DEFAULT_REGION else region
+    if isinstance(sector, str):
+        label = classify(sector)[1]
+        filters["sector"] = label if label != DEFAULT_SECTOR else sector
+    return filters
+
+
+def ask_model(prompt: str):
     system_prompt = """You are a data parser for tender search queries.
     Extract region, sector, max tender value in GBP, and timeframe (days until deadline).
     Return JSON like:
@@ -23,8 +217,8 @@ def parse_ai_prompt(prompt: str):
     """
 
     # ✅ Modern API call
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
+    response = openai_client().chat.completions.create(
+        model=MODEL,
         messages=[
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": prompt},
@@ -37,6 +231,25 @@ def parse_ai_prompt(prompt: str):
     if not match:
         return {}
     try:
-        return json.loads(match.group(0))
+        return _canonical(json.loads(match.group(0)))
     except Exception:
         return {}
+
+
+def parse_ai_prompt(prompt: str, llm=...):
+    """
+    Turns natural language queries into structured filter instructions.
+    Returns a dict with: region, sector, value_cap, timeframe_days
+
+    Common prompts are answered by the local rules, repeated ones from the
+    memo; only novel prompts reach the model. `llm` replaces the model call
+    (a callable taking the prompt), or None to never call it.
+    """
+    if not prompt or len(prompt.strip()) == 0:
+        return {}
+    if llm is ...:
+        llm = ask_model if LLM_ENABLED else None
+
+    parsed, complete = parse_locally(prompt)
+    local = {k: parsed[k] for k in ("region", "sector", "value_cap", "timeframe_days")}
+    return two_tier(prompt, "prompt", (local, complete), llm)
@@ -0,0 +1,100 @@
+import json
+import random
+from datetime import datetime, timedelta, timezone
+
+from classifier import REGION_KEYWORDS, SECTOR_KEYWORDS
+
+# Filler vocabulary for titles and descriptions; region/sector keywords are mixed in
+# at roughly the rate real notices mention them, so the classifier does real work
+FILLER = """
+    provision of services contract framework supply delivery management support works
+    council authority borough district trust partnership lot agreement requirement tender
+    specification supplier annual maintenance programme scheme equipment installation
+    repair replacement upgrade refurbishment consultancy professional advice independent
+    review community local national public procurement budget estimated value duration
+    months years option extend renewal quality social value sustainability carbon net zero
+    accessibility compliance standards training staff vehicles fleet grounds catering waste
+    collection recycling energy solar lighting heating ventilation security cctv furniture
+""".split()
+REGION_WORDS = [kw for _, kws in REGION_KEYWORDS for kw in kws]
+SECTOR_WORDS = [kw for _, kws in SECTOR_KEYWORDS for kw in kws]
+BUYERS = ["Leeds City Council", "NHS Supply Chain", "Kent County Council", "Crown Commercial Service",
+          "University of Glasgow", "Transport for London", "Welsh Government", "Belfast City Council"]
+STATUSES = ["active", "planned", "complete"]
+
+
+def _text(rng, low, high, keyword_rate=0.08):
+    words = []
+    for _ in range(rng.randint(low, high)):
+        roll = rng.random()
+        if roll < keyword_rate / 2:
+            words.append(rng.choice(REGION_WORDS))
+        elif roll < keyword_rate:
+            words.append(rng.choice(SECTOR_WORDS))
+        else:
+            words.append(rng.choice(FILLER))
+    return " ".join(words).capitalize()
+
+
+def release(i, rng, now):
+    """One OCDS release shaped like a Contracts Finder notice (realistic title/description lengths)."""
+    published = now - timedelta(minutes=i * 7)
+    amount = round(rng.lognormvariate(11, 1.6), 2) if rng.random() > 0.1 else None
+    return {
+        "ocid": f"ocds-b5fd17-{i:08d}",
+        "id": f"{i:08d}-release",
+        "date": published.isoformat(),
+        "buyer": {"name": rng.choice(BUYERS), "id": f"GB-BUYER-{rng.randint(1, 500)}"},
+        "tender": {
+            "title": _text(rng, 4, 16),
+            "description": _text(rng, 40, 260),
+            "status": rng.choice(STATUSES),
+            "mainProcurementCategory": rng.choice(["services", "goods", "works"]),
+            "value": {"amount": amount, "currency": "GBP"},
+            "tenderPeriod": {"endDate": (published + timedelta(days=rng.randint(5, 90))).isoformat()},
+        },
+    }
+
+
+def ocds_records(n, seed=0):
+    """Yields `n` OCDS records ({"ocid", "releases": [release]}), as fetch_tenders.iter_tenders reads them."""
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc)
+    for i in range(n):
+        r = release(i, rng, now)
+        yield {"ocid": r["ocid"], "releases": [r]}
+
+
+def release_package(n, seed=0, ocid_prefix="ocds-h6vhtk") -> bytes:
+    """An OCDS release package body (Find a Tender / Public Contracts Scotland shape) holding `n` releases."""
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc)
+    found = []
+    for i in range(n):
+        r = release(i, rng, now)
+        r["ocid"] = f"{ocid_prefix}-{i:08d}"
+        found.append(r)
+    return json.dumps({"uri": "https://example.invalid/package", "releases": found}).encode("utf-8")
+
+
+def flat_notices(n, seed=0):
+    """Yields `n` flat notices, as scripts/fetch_contracts_finder.normalize reads them."""
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc)
+    for i in range(n):
+        r = release(i, rng, now)
+        t = r["tender"]
+        yield {
+            "id": r["ocid"],
+            "title": t["title"],
+            "description": t["description"],
+            "publishedDate": r["date"],
+            "buyer": r["buyer"],
+            "value": t["value"],
+            "mainProcurementCategory": t["mainProcurementCategory"],
+        }
+
+
+def search_page(n, seed=0) -> bytes:
+    """A Contracts Finder search response body holding `n` records."""
+    return json.dumps({"records": list(ocds_records(n, seed)), "totalPages": 1}).encode("utf-8")
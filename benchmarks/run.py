@@ -0,0 +1,345 @@
+"""
+Pipeline stage benchmarks on synthetic OCDS notices, fully offline.
+
+    python benchmarks/run.py
+
+Settings (environment):
+    BENCH_NOTICES             notices per stage (1000 .. 1000000), default 10000
+    BENCH_SEED                fixture seed, default 0
+    BENCH_STAGES              comma-separated subset of stages, default all
+    BENCH_MEMORY              "off" skips the second, tracemalloc pass (peak memory)
+    BENCH_UPSERT_LATENCY_MS   local backend round trip per upsert request, default 20
+    BENCH_UPSERT_ROW_US       local backend cost per upserted row, default 20
+    UPSERT_BATCH_SIZE / UPSERT_MAX_IN_FLIGHT
+                              the writer's own knobs, to tune them against that latency
+    BENCH_OUTPUT              results file, default benchmarks/results/<timestamp>.json
+    BENCH_COMPARE             earlier results file to compare throughput against
+
+The HTTP API is a local server returning a pre-rendered search page and
+Supabase is the in-process local backend (local_backend.py), so numbers are comparable run to run.
+"""
+import os
+import io
+import sys
+import json
+import time
+import shutil
+import random
+import platform
+import tempfile
+import tracemalloc
+import subprocess
+import contextlib
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "scripts"))
+
+# Every local artifact the loaders write goes to a scratch directory, never the real .cache/
+WORK_DIR = tempfile.mkdtemp(prefix="cleanintel-bench-")
+os.environ.update({
+    "HASH_INDEX_DIR": os.path.join(WORK_DIR, "hashes"),
+    "HTTP_CACHE_DIR": os.path.join(WORK_DIR, "http"),
+    "SEARCH_INDEX_PATH": os.path.join(WORK_DIR, "search_index.pkl"),
+    "PARQUET_DIR": os.path.join(WORK_DIR, "parquet"),
+    "ROLLUP_PATH": os.path.join(WORK_DIR, "rollup.json"),
+    "VECTOR_INDEX_DIR": os.path.join(WORK_DIR, "vectors"),
+    "ENTITY_INDEX_DIR": os.path.join(WORK_DIR, "entities"),
+    "UPSERT_GENERATION_PATH": os.path.join(WORK_DIR, "upsert_generation.json"),
+    "SYNC_STATE_PATH": os.path.join(WORK_DIR, "sync_state.json"),
+    "AI_PARSER_MEMO_PATH": os.path.join(WORK_DIR, "ai_prompts.json"),
+    "HTTP_CACHE": "on",
+    "SYNC_MODE": "full",
+    "SUPABASE_BACKEND": "local",
+    "LOCAL_DB_PATH": "",
+})
+
+import pandas as pd  # noqa: E402
+
+import fetch_tenders  # noqa: E402
+import fetch_contracts_finder  # noqa: E402
+from bulk_writer import percentile  # noqa: E402
+from classifier import detect_region, detect_sector, classify_many  # noqa: E402
+from dashboard_data import SnapshotSource, TenderFilters  # noqa: E402
+from http_cache import HttpCache  # noqa: E402
+from normalizer import tenders_frame, normalize_notices  # noqa: E402
+import sources  # noqa: E402
+from benchmarks.fixtures import ocds_records, flat_notices, search_page, release_package  # noqa: E402
+from benchmarks.stubs import StubHttpServer  # noqa: E402
+from local_backend import LocalClient  # noqa: E402
+
+NOTICES = int(os.getenv("BENCH_NOTICES", "10000"))
+SEED = int(os.getenv("BENCH_SEED", "0"))
+STAGES = [s.strip() for s in os.getenv("BENCH_STAGES", "").split(",") if s.strip()]
+MEMORY = os.getenv("BENCH_MEMORY", "on") != "off"
+UPSERT_LATENCY = float(os.getenv("BENCH_UPSERT_LATENCY_MS", "20")) / 1000
+UPSERT_ROW_COST = float(os.getenv("BENCH_UPSERT_ROW_US", "20")) / 1e6
+OUTPUT = os.getenv("BENCH_OUTPUT") or os.path.join(
+    ROOT, "benchmarks", "results", f"{datetime.now(timezone.utc):%Y%m%dT%H%M%SZ}.json")
+COMPARE = os.getenv("BENCH_COMPARE")
+
+# Records per timed operation for the per-record stages
+CHUNK = 1000
+
+
+def chunks(items, size=CHUNK):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def timed_chunks(items, fn):
+    """Runs fn over each chunk; returns per-chunk latencies."""
+    latencies = []
+    for chunk in chunks(items):
+        started = time.perf_counter()
+        fn(chunk)
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+# -----------------------
+# Fixtures (built once, outside the timings)
+# -----------------------
+class Fixtures:
+    def __init__(self, n, seed):
+        started = time.perf_counter()
+        self.records = list(ocds_records(n, seed))
+        self.flat = list(flat_notices(n, seed))
+        self.page = search_page(n, seed)
+        self.texts = [r["releases"][0]["tender"]["title"] + " " + r["releases"][0]["tender"]["description"]
+                      for r in self.records]
+        self.tenders = list(fetch_tenders.iter_tenders(self.records, limit=None))
+        self.frame = pd.DataFrame(self.tenders)
+        self.seconds = time.perf_counter() - started
+
+    def snapshot_frame(self):
+        """The tenders in the compact dtypes tenders_reader produces, for the dashboard stage."""
+        df = self.frame[["tender_id", "title", "region", "sector", "tender_status", "value_gbp", "deadline"]].copy()
+        for col in ("region", "sector", "tender_status"):
+            df[col] = df[col].astype("category")
+        df["value_gbp"] = pd.to_numeric(df["value_gbp"], errors="coerce").astype("float32")
+        df["deadline"] = pd.to_datetime(df["deadline"], errors="coerce", utc=True)
+        return df
+
+
+# -----------------------
+# Stages: each returns (items processed, per-operation latencies in seconds),
+# plus optionally the seconds to count when setup (e.g. a server) must not be
+# -----------------------
+def stage_fetch_latest_tenders(fx):
+    with StubHttpServer(fx.page) as server:
+        fetch_tenders.SEARCH_URL = f"{server.url}/Published/Notices/OCDS/Search"
+        fetch_tenders.http_cache = HttpCache("bench", fetch=fetch_tenders.client.get)
+        started = time.perf_counter()
+        df = fetch_tenders.fetch_latest_tenders(limit=len(fx.records))
+        elapsed = time.perf_counter() - started
+        return len(df), [elapsed], elapsed
+
+
+def stage_stream_latest_tenders(fx):
+    with StubHttpServer(fx.page) as server:
+        fetch_tenders.SEARCH_URL = f"{server.url}/Published/Notices/OCDS/Search"
+        fetch_tenders.http_cache = HttpCache("bench", fetch=fetch_tenders.client.get)
+        started = time.perf_counter()
+        count = sum(1 for _ in fetch_tenders.stream_latest_tenders(limit=len(fx.records)))
+        elapsed = time.perf_counter() - started
+        return count, [elapsed], elapsed
+
+
+def stage_iter_tenders(fx):
+    return len(fx.records), timed_chunks(fx.records, lambda c: list(fetch_tenders.iter_tenders(c, limit=None)))
+
+
+def stage_normalize(fx):
+    normalize = fetch_contracts_finder.normalize
+    return len(fx.flat), timed_chunks(fx.flat, lambda c: [normalize(r) for r in c])
+
+
+def stage_tenders_frame(fx):
+    return len(fx.records), timed_chunks(fx.records, tenders_frame)
+
+
+def stage_normalize_notices(fx):
+    return len(fx.flat), timed_chunks(fx.flat, normalize_notices)
+
+
+def stage_classify_many(fx):
+    return len(fx.texts), timed_chunks(fx.texts, classify_many)
+
+
+def stage_detect_region_sector(fx):
+    return len(fx.texts), timed_chunks(fx.texts, lambda c: [(detect_region(t), detect_sector(t)) for t in c])
+
+
+def stage_dataframe(fx):
+    started = time.perf_counter()
+    pd.DataFrame(fx.tenders)
+    return len(fx.tenders), [time.perf_counter() - started]
+
+
+def stage_insert_into_supabase(fx):
+    fetch_tenders.supabase = LocalClient(path="", latency=UPSERT_LATENCY, row_cost=UPSERT_ROW_COST)
+    report = fetch_tenders.insert_into_supabase(fx.frame.copy())
+    return report.written, report.batch_latencies
+
+
+def stage_load_sources(fx):
+    """Three feeds (Contracts Finder page + two OCDS release packages) loaded concurrently."""
+    third = max(1, len(fx.records) // 3)
+    bodies = [search_page(third, SEED), release_package(third, SEED + 1), release_package(third, SEED + 2, "ocds-r6ebe6")]
+    with contextlib.ExitStack() as stack:
+        servers = [stack.enter_context(StubHttpServer(body)) for body in bodies]
+        picked = sources.selected_sources()
+        for source, server in zip(picked, servers):
+            source.url = server.url
+        db = LocalClient(path="", latency=UPSERT_LATENCY, row_cost=UPSERT_ROW_COST)
+        started = time.perf_counter()
+        runs = sources.load_sources(picked, db=db)
+        elapsed = time.perf_counter() - started
+    return sum(run.rows for run in runs.values()), [run.seconds for run in runs.values()], elapsed
+
+
+def stage_dashboard_filters(fx):
+    source = SnapshotSource(fx.snapshot_frame())
+    options = source.filter_options()
+    rng = random.Random(SEED)
+    latencies = []
+    queries = 0
+    for _ in range(30):
+        filters = TenderFilters(
+            regions=tuple(rng.sample(options["region"], k=min(len(options["region"]), rng.randint(0, 2)))),
+            sectors=tuple(rng.sample(options["sector"], k=min(len(options["sector"]), rng.randint(0, 2)))),
+            min_value=0,
+            max_value=rng.choice([options["max_value"], options["max_value"] / 10]),
+        )
+        for method in ("fetch_metrics", "fetch_region_totals", "fetch_upcoming_deadlines"):
+            started = time.perf_counter()
+            getattr(source, method)(filters)
+            latencies.append(time.perf_counter() - started)
+            queries += 1
+    return queries, latencies
+
+
+ALL_STAGES = {
+    "fetch_latest_tenders": stage_fetch_latest_tenders,
+    "stream_latest_tenders": stage_stream_latest_tenders,
+    "iter_tenders": stage_iter_tenders,
+    "tenders_frame": stage_tenders_frame,
+    "normalize": stage_normalize,
+    "normalize_notices": stage_normalize_notices,
+    "detect_region_sector": stage_detect_region_sector,
+    "classify_many": stage_classify_many,
+    "dataframe": stage_dataframe,
+    "insert_into_supabase": stage_insert_into_supabase,
+    "load_sources": stage_load_sources,
+    "dashboard_filters": stage_dashboard_filters,
+}
+
+
+def reset_work_dir():
+    """Fresh scratch state, so every pass of a stage does the same work (e.g. no hash-index hits)."""
+    for name in os.listdir(WORK_DIR):
+        path = os.path.join(WORK_DIR, name)
+        shutil.rmtree(path) if os.path.isdir(path) else os.remove(path)
+
+
+def run_stage(name, fn, fx) -> dict:
+    reset_work_dir()
+    with contextlib.redirect_stdout(io.StringIO()):
+        started = time.perf_counter()
+        items, latencies, *stage_seconds = fn(fx)
+        elapsed = stage_seconds[0] if stage_seconds else time.perf_counter() - started
+
+    result = {
+        "items": items,
+        "seconds": round(elapsed, 4),
+        "throughput_per_sec": round(items / elapsed, 1) if elapsed else None,
+        "operations": len(latencies),
+        "latency_ms": {f"p{p}": round(percentile(latencies, p) * 1000, 3) for p in (50, 95, 99)},
+        "peak_memory_mib": None,
+    }
+    result["latency_ms"]["max"] = round(max(latencies, default=0) * 1000, 3)
+
+    if MEMORY:
+        # Separate pass: tracemalloc slows allocation-heavy code, so it never touches the timings
+        reset_work_dir()
+        tracemalloc.start()
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                fn(fx)
+            result["peak_memory_mib"] = round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 2)
+        finally:
+            tracemalloc.stop()
+    return result
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, path):
+    """Prints throughput change per stage against an earlier results file."""
+    with open(path, "r", encoding="utf-8") as f:
+        before = json.load(f)["stages"]
+    print(f"\nCompared with {path}:")
+    for name, now in results.items():
+        old = before.get(name)
+        if not old or not old.get("throughput_per_sec") or not now.get("throughput_per_sec"):
+            continue
+        change = (now["throughput_per_sec"] / old["throughput_per_sec"] - 1) * 100
+        flag = "⚠️ regression" if change < -10 else ("🚀" if change > 10 else "")
+        print(f"  {name:<24} {change:+7.1f}% throughput  {flag}")
+
+
+def main():
+    names = STAGES or list(ALL_STAGES)
+    unknown = [n for n in names if n not in ALL_STAGES]
+    if unknown:
+        raise SystemExit(f"Unknown stages: {', '.join(unknown)} (known: {', '.join(ALL_STAGES)})")
+
+    print(f"🧪 Building {NOTICES:,} synthetic notices (seed {SEED})...")
+    with contextlib.redirect_stdout(io.StringIO()):
+        fx = Fixtures(NOTICES, SEED)
+    print(f"   done in {fx.seconds:.1f}s, search page {len(fx.page) / 2 ** 20:.1f} MiB")
+
+    results = {}
+    try:
+        for name in names:
+            results[name] = r = run_stage(name, ALL_STAGES[name], fx)
+            memory = f"{r['peak_memory_mib']:>8.1f} MiB" if r["peak_memory_mib"] is not None else ""
+            print(f"⏱️ {name:<24} {r['items']:>9,} in {r['seconds']:>7.2f}s "
+                  f"{r['throughput_per_sec'] or 0:>12,.0f}/s | p50 {r['latency_ms']['p50']:>8.2f}ms "
+                  f"p95 {r['latency_ms']['p95']:>8.2f}ms | {memory}")
+    finally:
+        shutil.rmtree(WORK_DIR, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "notices": NOTICES,
+            "seed": SEED,
+            "chunk": CHUNK,
+            "upsert_latency_ms": UPSERT_LATENCY * 1000,
+            "upsert_row_us": UPSERT_ROW_COST * 1e6,
+            "fixture_seconds": round(fx.seconds, 3),
+        },
+        "stages": results,
+    }
+    os.makedirs(os.path.dirname(OUTPUT) or ".", exist_ok=True)
+    with open(OUTPUT, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"💾 Results saved to {OUTPUT}")
+    if COMPARE:
+        compare(results, COMPARE)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+import os
+import time
+import threading
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# Rows per upsert request, and how many requests may be in flight at once
+BATCH_SIZE = int(os.getenv("UPSERT_BATCH_SIZE", "500"))
+MAX_IN_FLIGHT = int(os.getenv("UPSERT_MAX_IN_FLIGHT", "4"))
+
+
+def chunked(records, size):
+    """Groups any iterable into lists of at most `size` items."""
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers (0 for an empty list)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[k]
+
+
+@dataclass
+class WriteReport:
+    written: int = 0
+    failed: list = field(default_factory=list)  # (record, error message) pairs
+    batches: int = 0
+    batch_latencies: list = field(default_factory=list)  # seconds per upsert request
+    elapsed: float = 0.0
+
+    def merge(self, other: "WriteReport") -> "WriteReport":
+        return WriteReport(
+            written=self.written + other.written,
+            failed=self.failed + other.failed,
+            batches=self.batches + other.batches,
+            batch_latencies=self.batch_latencies + other.batch_latencies,
+            elapsed=self.elapsed + other.elapsed,
+        )
+
+    @property
+    def rows_per_sec(self) -> float:
+        return self.written / self.elapsed if self.elapsed else 0.0
+
+    def summary(self) -> str:
+        return (
+            f"{self.written} rows in {self.batches} batches, {len(self.failed)} failed | "
+            f"{self.rows_per_sec:,.0f} rows/s | batch latency "
+            f"p50 {percentile(self.batch_latencies, 50) * 1000:.0f}ms, "
+            f"p95 {percentile(self.batch_latencies, 95) * 1000:.0f}ms, "
+            f"max {max(self.batch_latencies, default=0) * 1000:.0f}ms"
+        )
+
+
+class BulkWriter:
+    """
+    Buffers records and upserts them in chunks of `batch_size`, keeping up to
+    `max_in_flight` chunks in flight on a thread pool. A chunk that fails is
+    bisected until the offending rows are isolated, so one bad row only costs
+    itself. Use as a context manager, or call close() to get the WriteReport.
+    `on_written`, if given, is called (from a writer thread) with every chunk
+    the server accepted. add() may be called from several threads at once.
+    """
+
+    def __init__(self, client, table="tenders", on_conflict="tender_id",
+                 batch_size=BATCH_SIZE, max_in_flight=MAX_IN_FLIGHT, on_written=None):
+        self.client = client
+        self.table = table
+        self.on_conflict = on_conflict
+        self.batch_size = max(1, batch_size)
+        self.max_in_flight = max(1, max_in_flight)
+        self.on_written = on_written
+        self.report = WriteReport()
+        self._buffer = []
+        self._pending = set()
+        self._pool = ThreadPoolExecutor(max_workers=self.max_in_flight)
+        self._lock = threading.Lock()
+        self._add_lock = threading.Lock()
+        self._started = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def add(self, records):
+        with self._add_lock:
+            self._buffer.extend(records)
+            while len(self._buffer) >= self.batch_size:
+                batch = self._buffer[:self.batch_size]
+                del self._buffer[:self.batch_size]
+                self._submit(batch)
+
+    def flush(self):
+        with self._add_lock:
+            if self._buffer:
+                batch, self._buffer = self._buffer, []
+                self._submit(batch)
+            wait(self._pending)
+            self._pending.clear()
+
+    def close(self) -> WriteReport:
+        self.flush()
+        self._pool.shutdown()
+        if self._started is not None:
+            self.report.elapsed = time.perf_counter() - self._started
+        return self.report
+
+    def _submit(self, batch):
+        if self._started is None:
+            self._started = time.perf_counter()
+        while len(self._pending) >= self.max_in_flight:
+            done, self._pending = wait(self._pending, return_when=FIRST_COMPLETED)
+        self._pending.add(self._pool.submit(self._write, batch))
+
+    def _send(self, batch):
+        started = time.perf_counter()
+        try:
+            self.client.table(self.table).upsert(batch, on_conflict=self.on_conflict).execute()
+        finally:
+            with self._lock:
+                self.report.batches += 1
+                self.report.batch_latencies.append(time.perf_counter() - started)
+
+    def _write(self, batch):
+        try:
+            self._send(batch)
+        except Exception as e:
+            if len(batch) == 1:
+                record = batch[0]
+                print(f"⚠️ Error upserting {record.get(self.on_conflict)}: {e}")
+                with self._lock:
+                    self.report.failed.append((record, str(e)))
+                return
+            mid = len(batch) // 2
+            self._write(batch[:mid])
+            self._write(batch[mid:])
+            return
+        with self._lock:
+            self.report.written += len(batch)
+        if self.on_written is not None:
+            self.on_written(batch)
+
+
+def bulk_upsert(client, records, table="tenders", on_conflict="tender_id",
+                batch_size=BATCH_SIZE, max_in_flight=MAX_IN_FLIGHT, on_written=None) -> WriteReport:
+    """One-shot helper: upserts an iterable of records through a BulkWriter."""
+    with BulkWriter(client, table, on_conflict, batch_size, max_in_flight, on_written) as writer:
+        writer.add(records)
+    return writer.report
@@ -0,0 +1,62 @@
+import os
+import json
+import hashlib
+
+# Fields that change on every run without the tender itself changing
+VOLATILE_FIELDS = frozenset({"created_at", "updated_at"})
+# One <name>_hashes.json per loader, since each writes a different record shape
+HASH_DIR = os.getenv("HASH_INDEX_DIR", ".cache")
+# Set CHANGE_DETECTION=off to force every fetched row to be rewritten
+ENABLED = os.getenv("CHANGE_DETECTION", "on") != "off"
+
+
+def content_hash(record: dict, exclude=VOLATILE_FIELDS) -> str:
+    """Stable hash of a normalized record, ignoring volatile timestamp fields."""
+    body = {k: v for k, v in record.items() if k not in exclude}
+    payload = json.dumps(body, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+class HashIndex:
+    """
+    Local tender_id -> content hash index. split() sorts a batch into new and
+    changed records and stages their hashes; commit() keeps the staged hashes
+    of the rows that were actually written and saves the index.
+    """
+
+    def __init__(self, name, key="tender_id"):
+        self.path = os.path.join(HASH_DIR, f"{name}_hashes.json")
+        self.key = key
+        self._staged = {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.hashes = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.hashes = {}
+
+    def split(self, records):
+        new, changed = [], []
+        for record in records:
+            tender_id = record.get(self.key)
+            if tender_id is None:
+                continue
+            h = content_hash(record)
+            old = self.hashes.get(str(tender_id))
+            if ENABLED and old == h:
+                continue
+            self._staged[str(tender_id)] = h
+            (new if old is None else changed).append(record)
+        return new, changed
+
+    def commit(self, failed=()):
+        failed_ids = {str(r.get(self.key)) for r, _ in failed}
+        for tender_id, h in self._staged.items():
+            if tender_id not in failed_ids:
+                self.hashes[tender_id] = h
+        self._staged = {}
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.hashes, f, separators=(",", ":"))
+        os.replace(tmp, self.path)
@@ -0,0 +1,191 @@
+import re
+import pandas as pd
+
+# Keyword tables, in priority order: when a text mentions several labels the
+# earliest one wins, exactly like the old if/elif chains.
+REGION_KEYWORDS = [
+    ("London", ["london", "westminster", "croydon"]),
+    ("Scotland", ["scotland", "edinburgh", "glasgow"]),
+    ("Midlands & North", ["birmingham", "manchester", "leeds", "liverpool", "yorkshire", "midlands"]),
+    ("South England", ["bristol", "southampton", "oxford", "cambridge", "kent", "sussex"]),
+    ("Wales", ["wales"]),
+    ("Northern Ireland", ["northern ireland", "belfast", "londonderry"]),
+]
+DEFAULT_REGION = "UK (General)"
+
+SECTOR_KEYWORDS = [
+    ("Information Technology", ["software", "it", "technology", "digital"]),
+    ("Facilities & Cleaning", ["cleaning", "janitorial", "maintenance", "facilities"]),
+    ("Construction & Engineering", ["construction", "building", "engineering", "civil"]),
+    ("Healthcare", ["health", "hospital", "nhs", "medical"]),
+    ("Education", ["education", "school", "university", "college"]),
+    ("Transport & Infrastructure", ["transport", "rail", "bus", "airport", "road"]),
+]
+DEFAULT_SECTOR = "General Public Sector"
+
+# Priority of a word that matches no keyword (sorts after every real priority)
+NO_HIT = 1 << 30
+# Endings a keyword may take: plurals for keywords of three letters or more
+# ("schools", "buses"; "it" never matches "its"), and the compounds listed per
+# stem. Any other word a keyword begins is a different word ("kent" is not
+# "kentucky", "road" is not "roadshow", "civil" is not "civilisation").
+PLURALS = ("s", "es")
+COMPOUNDS = {
+    "health": ("care",),
+    "rail": ("way", "ways"),
+    "road": ("works", "way", "ways"),
+    "digital": ("isation", "ization"),
+}
+_WORD_BYTES = frozenset(b"abcdefghijklmnopqrstuvwxyz0123456789_")
+# bytes.translate table: ASCII word characters survive, everything else becomes a space
+_SEPARATE_WORDS = bytes(c if c in _WORD_BYTES else 32 for c in range(256))
+
+
+class KeywordClassifier:
+    """
+    Compiles the region and sector tables into one word-boundary-aware regex
+    so a text is labelled in a single scan. A keyword matches a whole word,
+    its plural when it has three letters or more ("schools", "buses") and the
+    compounds COMPOUNDS lists for it ("healthcare", "railway", "roadworks",
+    "digitalisation"); "it" never matches inside "with" or "items", nor
+    "kent" inside "Kentucky".
+    """
+
+    def __init__(self, regions=REGION_KEYWORDS, sectors=SECTOR_KEYWORDS):
+        self.regions = [label for label, _ in regions]
+        self.sectors = [label for label, _ in sectors]
+        # keyword -> {table: priority}; a keyword's first entry in a table wins
+        self.lookup = {}
+        for table, entries in (("region", regions), ("sector", sectors)):
+            for priority, (_, keywords) in enumerate(entries):
+                for kw in keywords:
+                    self.lookup.setdefault(kw, {}).setdefault(table, priority)
+
+        # Longest first so "northern ireland" and "londonderry" win over shorter keywords;
+        # group 1 is the keyword, group 2 the rest of the word, checked by _keyword()
+        bodies = [r"\s+".join(re.escape(part) for part in kw.split())
+                  for kw in sorted(self.lookup, key=len, reverse=True)]
+        self.pattern = re.compile(r"\b(" + "|".join(bodies) + r")(\w*)")
+
+        # Batch fast path: (region, sector) priorities of every distinct word seen,
+        # memoized (the vocabulary is small). On ASCII text \w is [a-z0-9_], so mapping
+        # everything else to spaces and splitting yields exactly the regex's words.
+        self.words = {}
+        # First words of multi-word keywords: texts containing one take the regex path
+        self.phrase_heads = frozenset(kw.split()[0].encode() for kw in self.lookup if " " in kw)
+
+    def _keyword(self, match):
+        """The keyword a pattern match stands for, or None when the rest of the word is not allowed."""
+        kw = " ".join(match.group(1).split())
+        rest = match.group(2)
+        if not rest or (len(kw) >= 3 and rest in PLURALS) or rest in COMPOUNDS.get(kw, ()):
+            return kw
+        return None
+
+    def _word_priorities(self, word: bytes):
+        hit = self.words.get(word)
+        if hit is None:
+            m = self.pattern.match(word.decode())
+            kw = self._keyword(m) if m else None
+            hits = self.lookup[kw] if kw is not None and m.end() == len(word) else {}
+            hit = self.words[word] = (hits.get("region", NO_HIT), hits.get("sector", NO_HIT))
+        return hit
+
+    def classify(self, text):
+        """Returns (region, sector) for a text, or (None, None) for empty/non-string input."""
+        if not text or not isinstance(text, str):
+            return None, None
+        region = sector = None
+        for m in self.pattern.finditer(text.lower()):
+            kw = self._keyword(m)
+            if kw is None:
+                continue
+            hits = self.lookup[kw]
+            if "region" in hits and (region is None or hits["region"] < region):
+                region = hits["region"]
+            if "sector" in hits and (sector is None or hits["sector"] < sector):
+                sector = hits["sector"]
+            if region == 0 and sector == 0:
+                break
+        return (
+            self.regions[region] if region is not None else DEFAULT_REGION,
+            self.sectors[sector] if sector is not None else DEFAULT_SECTOR,
+        )
+
+    def mentions(self, text):
+        """
+        (start, end, keyword, tables) for every table keyword in a text, in order
+        of appearance; `tables` says whether it is a "region" and/or "sector" keyword.
+        """
+        if not text or not isinstance(text, str):
+            return []
+        found = []
+        for m in self.pattern.finditer(text.lower()):
+            kw = self._keyword(m)
+            if kw is not None:
+                found.append((m.start(1), m.end(2), kw, tuple(self.lookup[kw])))
+        return found
+
+    def classify_many(self, texts):
+        """
+        classify() for a batch of texts, with identical results. ASCII texts are
+        split into a set of words once and each distinct word's labels looked up
+        in a memo, which is several times cheaper than the regex scan; anything
+        else (and texts mentioning a multi-word keyword) falls back to classify().
+        """
+        heads, priorities = self.phrase_heads, self._word_priorities
+        labels = []
+        for text in texts:
+            if not text or not isinstance(text, str) or not text.isascii():
+                labels.append(self.classify(text))
+                continue
+            found = set(text.lower().encode().translate(_SEPARATE_WORDS).split())
+            if not heads.isdisjoint(found):
+                labels.append(self.classify(text))
+                continue
+            hits = [priorities(word) for word in found]
+            region = min((h[0] for h in hits), default=NO_HIT)
+            sector = min((h[1] for h in hits), default=NO_HIT)
+            labels.append((
+                self.regions[region] if region != NO_HIT else DEFAULT_REGION,
+                self.sectors[sector] if sector != NO_HIT else DEFAULT_SECTOR,
+            ))
+        return labels
+
+    def classify_series(self, texts):
+        """Labels a whole pandas Series; returns a DataFrame with `region` and `sector` columns."""
+        labels = self.classify_many(texts)
+        return pd.DataFrame(labels, columns=["region", "sector"], index=texts.index)
+
+
+_default = KeywordClassifier()
+
+
+def classify(text):
+    """(region, sector) for a text in a single scan."""
+    return _default.classify(text)
+
+
+def detect_region(text):
+    """Keyword-based region detection."""
+    return _default.classify(text)[0]
+
+
+def detect_sector(text):
+    """Classify sector based on title or description."""
+    return _default.classify(text)[1]
+
+
+def classify_series(texts):
+    """Batch region/sector labels for a pandas Series of texts."""
+    return _default.classify_series(texts)
+
+
+def classify_many(texts):
+    """Batch (region, sector) labels for any iterable of texts."""
+    return _default.classify_many(texts)
+
+
+def mentions(text):
+    """Table keywords mentioned in a text, as (start, end, keyword, tables)."""
+    return _default.mentions(text)
@@ -1,13 +1,19 @@
 # cleanintel_app.py
 import os
-import json
+import time
+import threading
 import pandas as pd
 import streamlit as st
-from supabase import create_client
+from supabase_client import create_client, BACKEND
+
+from search_index import SearchIndex, DISPLAY_FIELDS, extract_buyer_name
+from query_cache import QueryCache, DatabaseGeneration, query_key
+from saved_searches import save_search, valid_email
+from entity_resolution import buyer_key, read_buyer_aliases
 
 st.set_page_config(page_title="CleanIntel – UK Tender Intelligence", page_icon="🧽", layout="wide")
 st.title("CleanIntel – UK Tender Intelligence")
-st.write("Fuzzy search in title, fallback to buyer (JSON stored).")
+st.write("Fuzzy, ranked search across title, description and buyer.")
 
 # --- Read secrets robustly (env first, then st.secrets) ---
 def read_secret(name: str) -> str | None:
@@ -42,7 +48,8 @@ else:
 if not SUPABASE_KEY:
     problems.append("`SUPABASE_KEY` is missing.")
 
-if problems:
+# The local backend (SUPABASE_BACKEND=local) needs no credentials
+if problems and BACKEND != "local":
     st.error("Configuration error:\n\n- " + "\n- ".join(problems))
     st.info(
         "Open **Manage app → App settings → Secrets** and set exactly:\n\n"
@@ -65,55 +72,113 @@ except Exception as e:
     st.caption(f"URL seen: {SUPABASE_URL}")
     st.stop()
 
+SEARCH_SYNC_SECONDS = float(os.getenv("SEARCH_SYNC_SECONDS", "300"))
+
+
+# --- Local trigram index: ranked, typo-tolerant, no table scan per keystroke ---
+@st.cache_resource(show_spinner="Building the search index…")
+def search_index():
+    index = SearchIndex.load()
+    index.sync(supabase)
+    index.save()
+    return {"index": index, "synced_at": time.time(), "lock": threading.Lock()}
+
+
+# --- Results shared by every session; repeat searches are a dict lookup ---
+# Dropped when the loaders write tenders, wherever they run (newest updated_at)
+@st.cache_resource
+def result_cache():
+    return QueryCache(generation=DatabaseGeneration(supabase))
+
+
+def refresh_index():
+    state = search_index()
+    with state["lock"]:
+        # Pick up tenders written since the last sync (only the delta is read)
+        if time.time() - state["synced_at"] > SEARCH_SYNC_SECONDS:
+            if state["index"].sync(supabase):
+                state["index"].save()
+                result_cache().invalidate()
+            state["synced_at"] = time.time()
+    return state
+
+
+def indexed_search(keyword: str) -> pd.DataFrame:
+    state = search_index()
+    with state["lock"]:
+        hits = state["index"].search(keyword, limit=200)
+    return pd.DataFrame([doc for _, _, doc in hits], columns=DISPLAY_FIELDS)
+
+
+def ilike_search(keyword: str) -> pd.DataFrame:
+    # OR across title and buyer (jsonb cast to text)
+    query = (
+        supabase.table("tenders")
+        .select("title, buyer, value_gbp, status, deadline")
+        .or_(f"(title.ilike.%{keyword}%),(buyer::text.ilike.%{keyword}%)")
+        .limit(200)
+    )
+    df = pd.DataFrame(query.execute().data or [])
+    if df.empty:
+        return df
+    # buyer json → readable string
+    if "buyer" in df.columns:
+        df["buyer_name"] = df["buyer"].apply(extract_buyer_name)
+    else:
+        df["buyer_name"] = None
+    return df
+
+
+# --- Canonical buyer names: spelling variants of a buyer display as one name ---
+@st.cache_resource(ttl=600)
+def buyer_aliases() -> dict:
+    try:
+        return read_buyer_aliases(supabase)
+    except Exception:
+        return {}
+
+
+def canonical_buyers(df: pd.DataFrame) -> pd.DataFrame:
+    if "buyer_name" not in df.columns:
+        return df
+    aliases = buyer_aliases()
+    if not aliases:
+        return df
+    names = [aliases.get(buyer_key(name), name) for name in df["buyer_name"]]
+    return df.assign(buyer_name=names)
+
+
 keyword = st.text_input("Keyword (e.g., cleaning, school, waste, solar)")
 
 if keyword:
+    # --- Saved search: the loaders push new matches, no need to re-run it ---
+    with st.expander("🔔 Alert me when new tenders match this search"):
+        contact = st.text_input("Email for alerts").strip()
+        if contact and not valid_email(contact):
+            st.warning("Enter a valid email address to save this search.")
+        if st.button("Save search", disabled=not valid_email(contact)):
+            try:
+                saved = save_search(supabase, contact, keyword)
+                st.success(f"Saved. New tenders matching “{keyword}” will be emailed to {contact}.")
+                st.caption(f"Filters: {saved.get('filters')}")
+            except Exception as e:
+                st.error(f"Could not save the search: {e}")
+
     try:
-        # OR across title and buyer (jsonb cast to text)
-        query = (
-            supabase.table("tenders")
-            .select("title, buyer, value_gbp, status, deadline")
-.or_(f"(title.ilike.%{keyword}%),(buyer::text.ilike.%{keyword}%)")
-            .limit(200)
-        )
-        response = query.execute()
-        rows = response.data or []
-
-        if not rows:
+        try:
+            refresh_index()
+            df = result_cache().get_or_compute(query_key("index", keyword), lambda: indexed_search(keyword))
+        except Exception as e:
+            st.caption(f"Search index unavailable ({e}); searching Supabase directly.")
+            df = result_cache().get_or_compute(query_key("ilike", keyword), lambda: ilike_search(keyword))
+
+        if df.empty:
             st.warning("No tenders found.")
             st.stop()
 
-        df = pd.DataFrame(rows)
-
-        # buyer json → readable string (simple view). We’ll improve later if needed.
-        if "buyer" in df.columns:
-            # If jsonb is a dict → pick a few common paths; else stringify.
-            def extract_name(obj):
-                if isinstance(obj, dict):
-                    if obj.get("name"):
-                        return obj["name"]
-                    cp = obj.get("contactPoint")
-                    if isinstance(cp, dict) and cp.get("name"):
-                        return cp["name"]
-                    org = obj.get("organization")
-                    if isinstance(org, dict) and org.get("name"):
-                        return org["name"]
-                # jsonb as a plain string (e.g., "Royal Hospital Chelsea")
-                if isinstance(obj, str):
-                    return obj.strip('"')
-                # fallback
-                try:
-                    return json.dumps(obj, ensure_ascii=False)
-                except Exception:
-                    return str(obj)
-
-            df["buyer_name"] = df["buyer"].apply(extract_name)
-        else:
-            df["buyer_name"] = None
-
-        # final order
-        keep = [c for c in ["title", "buyer_name", "value_gbp", "status", "deadline"] if c in df.columns]
-        df = df[keep]
+        # final order (best match first)
+        keep = [c for c in DISPLAY_FIELDS if c in df.columns]
+        df = canonical_buyers(df[keep])  # a new frame; the cached one is left untouched
 
         st.success(f"Found {len(df)} tenders")
         st.dataframe(df, use_container_width=True)
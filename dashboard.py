@@ -1,9 +1,12 @@
 import streamlit as st
-import pandas as pd
-import numpy as np
 from datetime import datetime, timezone
-from supabase import create_client
+from supabase_client import create_client
 import plotly.express as px
+from dashboard_data import TenderFilters, ServerSource, SnapshotSource, ParquetSource, SNAPSHOT_COLUMNS
+import parquet_store
+from snapshot_cache import SnapshotCache
+from rollup_cube import RollupSource, read_cells
+from entity_resolution import read_duplicates
 
 # -----------------------
 # Load Supabase connection
@@ -64,42 +67,110 @@ st.markdown("""
 # -----------------------
 # Fetch Data
 # -----------------------
-@st.cache_data(ttl=600)
+# "server": filtering and aggregation run in Postgres (sql/dashboard_functions.sql);
+# only aggregates and the deadline table's columns come over the wire.
+# "snapshot": the table is read once by keyset pages (compact dtypes), kept warm and
+# delta-refreshed in the background by updated_at, and filtered in memory.
+# "parquet": the loaders' local Parquet snapshot, scanned per query with column
+# and predicate pushdown (falls back to "server" when no snapshot exists).
+# Every mode leaves out the tenders the loaders resolved as near-duplicates of
+# an older one (entity_resolution.py), so a tender listed twice counts once.
+DATA_MODE = os.getenv("DASHBOARD_DATA_MODE", "server")
+if DATA_MODE == "parquet" and parquet_store.dataset() is None:
+    st.warning("No local Parquet snapshot found; querying Supabase instead.")
+    DATA_MODE = "server"
+
+@st.cache_resource
+def snapshot_cache():
+    return SnapshotCache(supabase, SNAPSHOT_COLUMNS)
+
 def load_tenders():
-    response = supabase.table("tenders").select("*").execute()
-    df = pd.DataFrame(response.data)
-    if df.empty:
-        return df
+    return snapshot_cache().get()
+
+@st.cache_resource(ttl=600)
+def load_duplicates():
+    try:
+        return read_duplicates(supabase)
+    except Exception as e:
+        print(f"Entity mapping unavailable, counting every tender: {e}")
+        return frozenset()
+
+@st.cache_resource
+def snapshot_sources():
+    return {}
+
+def load_snapshot_source():
+    """SnapshotSource for the current frame; its filter index is rebuilt only when a refresh swaps the frame or the duplicates."""
+    frame, duplicates = load_tenders(), load_duplicates()
+    held = snapshot_sources()
+    if held.get("frame") is not frame or held.get("duplicates") is not duplicates:
+        held["source"] = SnapshotSource(frame, duplicates)
+        held["frame"], held["duplicates"] = frame, duplicates
+    return held["source"]
 
-    df["deadline"] = pd.to_datetime(df["deadline"], errors="coerce", utc=True)
-    df["days_remaining"] = (df["deadline"] - datetime.now(timezone.utc)).dt.days
-    df["value_gbp"] = pd.to_numeric(df["value_gbp"], errors="coerce").fillna(0)
-    return df
+@st.cache_data(ttl=600)
+def server_query(method, *args):
+    return getattr(ServerSource(supabase), method)(*args)
+
+if DATA_MODE == "snapshot":
+    snapshot = load_snapshot_source()
+
+    def query(method, *args):
+        return getattr(snapshot, method)(*args)
+elif DATA_MODE == "parquet":
+    parquet = ParquetSource(duplicates=load_duplicates())
+
+    def query(method, *args):
+        return getattr(parquet, method)(*args)
+else:
+    query = server_query
 
-df = load_tenders()
+# The metric cards and region chart are read from the loaders' rollup cube
+# (rollup_cube.py) when it has been published and the value slider spans every
+# tender; raw rows are only touched for the deadline table and value ranges.
+USE_ROLLUP = os.getenv("DASHBOARD_ROLLUP", "on") != "off"
+
+@st.cache_data(ttl=600)
+def load_rollup_cells():
+    try:
+        cells = read_cells(supabase)
+    except Exception as e:
+        print(f"Rollup cube unavailable, aggregating tenders instead: {e}")
+        return None
+    return cells if len(cells) else None
+
+rollup_cells = load_rollup_cells() if USE_ROLLUP else None
+rollup = RollupSource(rollup_cells) if rollup_cells is not None else None
+
+def aggregate(method, filters):
+    if rollup is not None and rollup.answers(filters):
+        return getattr(rollup, method)(filters)
+    return query(method, filters)
+
+options = query("filter_options")
 
 # -----------------------
 # Sidebar Filters
 # -----------------------
 with st.sidebar:
     st.markdown("## 🔍 Filters")
-    selected_region = st.multiselect("Region", sorted(df["region"].dropna().unique()))
-    selected_sector = st.multiselect("Sector", sorted(df["sector"].dropna().unique()))
-    selected_status = st.multiselect("Tender Status", sorted(df["tender_status"].dropna().unique()))
-    value_range = st.slider("Value Range (GBP)", 0, int(df["value_gbp"].max()), (0, int(df["value_gbp"].max())))
+    selected_region = st.multiselect("Region", options["region"])
+    selected_sector = st.multiselect("Sector", options["sector"])
+    selected_status = st.multiselect("Tender Status", options["tender_status"])
+    max_value = int(options["max_value"])
+    value_range = st.slider("Value Range (GBP)", 0, max_value, (0, max_value))
 
 # -----------------------
 # Apply Filters
 # -----------------------
-if not df.empty:
-    filtered = df[
-        ((df["region"].isin(selected_region)) | (not selected_region)) &
-        ((df["sector"].isin(selected_sector)) | (not selected_sector)) &
-        ((df["tender_status"].isin(selected_status)) | (not selected_status)) &
-        (df["value_gbp"].between(value_range[0], value_range[1]))
-    ]
-else:
-    filtered = df
+filters = TenderFilters(
+    regions=tuple(selected_region),
+    sectors=tuple(selected_sector),
+    statuses=tuple(selected_status),
+    min_value=value_range[0],
+    max_value=value_range[1],
+)
+metrics = aggregate("fetch_metrics", filters)
 
 # -----------------------
 # Header
@@ -112,18 +183,18 @@ st.markdown("_Real-time tender intelligence powered by Supabase_")
 # -----------------------
 col1, col2, col3 = st.columns(3)
 with col1:
-    st.markdown('<div class="metric-card">📊 <h3>Total Tenders</h3><h2>' + str(len(filtered)) + '</h2></div>', unsafe_allow_html=True)
+    st.markdown('<div class="metric-card">📊 <h3>Total Tenders</h3><h2>' + str(metrics["tenders"]) + '</h2></div>', unsafe_allow_html=True)
 with col2:
-    st.markdown('<div class="metric-card">💷 <h3>Total Value (GBP)</h3><h2>£' + f"{filtered['value_gbp'].sum():,.0f}" + '</h2></div>', unsafe_allow_html=True)
+    st.markdown('<div class="metric-card">💷 <h3>Total Value (GBP)</h3><h2>£' + f"{metrics['total_value']:,.0f}" + '</h2></div>', unsafe_allow_html=True)
 with col3:
-    avg_value = filtered["value_gbp"].mean() if len(filtered) > 0 else 0
+    avg_value = metrics["avg_value"]
     st.markdown('<div class="metric-card">📈 <h3>Avg Tender Value</h3><h2>£' + f"{avg_value:,.0f}" + '</h2></div>', unsafe_allow_html=True)
 
 # -----------------------
 # Charts
 # -----------------------
-if not filtered.empty:
-    region_group = filtered.groupby("region")["value_gbp"].sum().reset_index()
+if metrics["tenders"] > 0:
+    region_group = aggregate("fetch_region_totals", filters)
     with st.container():
         st.markdown("### 📍 Tenders by Region")
         fig = px.bar(region_group, x="region", y="value_gbp", color="region",
@@ -139,11 +210,33 @@ if not filtered.empty:
         )
         st.plotly_chart(fig, use_container_width=True)
 
+# -----------------------
+# Top Buyers
+# -----------------------
+# Buyer name variants are resolved to one canonical buyer by the loaders; the
+# totals are always aggregated in Postgres (buyer_totals), whatever DATA_MODE is.
+if metrics["tenders"] > 0:
+    try:
+        top_buyers = server_query("fetch_buyer_totals", filters)
+    except Exception as e:
+        print(f"Buyer totals unavailable: {e}")
+        top_buyers = None
+    if top_buyers is not None and len(top_buyers):
+        st.markdown("### 🏛️ Top Buyers")
+        st.dataframe(
+            top_buyers[["buyer_name", "tenders", "value_gbp"]],
+            use_container_width=True,
+            hide_index=True
+        )
+
 # -----------------------
 # Upcoming Deadlines
 # -----------------------
 st.markdown("### 🗓️ Upcoming Deadlines (Next 30 Days)")
-upcoming = filtered[(filtered["days_remaining"] >= 0) & (filtered["days_remaining"] <= 30)].sort_values("deadline")
+upcoming = query("fetch_upcoming_deadlines", filters, 30)
+# days_remaining is computed at render time so a cached frame never shows stale counts
+upcoming = upcoming.assign(days_remaining=(upcoming["deadline"] - datetime.now(timezone.utc)).dt.days)
+upcoming = upcoming[(upcoming["days_remaining"] >= 0) & (upcoming["days_remaining"] <= 30)]
 st.dataframe(
     upcoming[["title", "region", "sector", "value_gbp", "deadline", "days_remaining"]],
     use_container_width=True,
@@ -0,0 +1,248 @@
+import pandas as pd
+import parquet_store
+from entity_resolution import TENDER_ENTITIES_TABLE
+from filter_engine import FilterEngine
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+
+# Only the columns the deadline table renders; never select("*")
+DEADLINE_COLUMNS = ["title", "region", "sector", "value_gbp", "deadline", "tender_status"]
+
+
+@dataclass(frozen=True)
+class TenderFilters:
+    """Sidebar filter state. Empty tuples / None mean "no filter" (hashable for st.cache_data)."""
+    regions: tuple = ()
+    sectors: tuple = ()
+    statuses: tuple = ()
+    min_value: float = None
+    max_value: float = None
+
+    def rpc_params(self) -> dict:
+        return {
+            "p_regions": list(self.regions) or None,
+            "p_sectors": list(self.sectors) or None,
+            "p_statuses": list(self.statuses) or None,
+            "p_min_value": self.min_value,
+            "p_max_value": self.max_value,
+        }
+
+    def apply(self, query):
+        """Pushes the same filters down into a PostgREST table query."""
+        if self.regions:
+            query = query.in_("region", list(self.regions))
+        if self.sectors:
+            query = query.in_("sector", list(self.sectors))
+        if self.statuses:
+            query = query.in_("tender_status", list(self.statuses))
+        if self.min_value is not None:
+            query = query.gte("value_gbp", self.min_value)
+        if self.max_value is not None:
+            query = query.lte("value_gbp", self.max_value)
+        return query
+
+
+def filter_options(client) -> dict:
+    """Distinct regions/sectors/statuses and the max tender value, via the tender_filter_options RPC."""
+    rows = client.rpc("tender_filter_options").execute().data or []
+    options = {"region": [], "sector": [], "tender_status": [], "max_value": 0.0}
+    for row in rows:
+        if row["kind"] == "max_value":
+            options["max_value"] = float(row["value"] or 0)
+        else:
+            options[row["kind"]].append(row["value"])
+    for kind in ("region", "sector", "tender_status"):
+        options[kind].sort()
+    return options
+
+
+def fetch_metrics(client, filters: TenderFilters) -> dict:
+    """Count, total and mean value for the filtered tenders, aggregated in the database."""
+    rows = client.rpc("tender_metrics", filters.rpc_params()).execute().data or []
+    row = rows[0] if rows else {}
+    return {
+        "tenders": int(row.get("tenders") or 0),
+        "total_value": float(row.get("total_value") or 0),
+        "avg_value": float(row.get("avg_value") or 0),
+    }
+
+
+def fetch_region_totals(client, filters: TenderFilters) -> pd.DataFrame:
+    """Summed value_gbp (and tender count) per region for the filtered tenders."""
+    rows = client.rpc("tender_region_totals", filters.rpc_params()).execute().data or []
+    df = pd.DataFrame(rows, columns=["region", "tenders", "value_gbp"])
+    df["value_gbp"] = pd.to_numeric(df["value_gbp"], errors="coerce").fillna(0)
+    return df
+
+
+def fetch_buyer_totals(client, filters: TenderFilters, limit=20) -> pd.DataFrame:
+    """Tender count and summed value_gbp of the `limit` largest canonical buyers, via the buyer_totals RPC."""
+    rows = client.rpc("buyer_totals", dict(filters.rpc_params(), p_limit=limit)).execute().data or []
+    df = pd.DataFrame(rows, columns=["buyer_id", "buyer_name", "tenders", "value_gbp"])
+    df["value_gbp"] = pd.to_numeric(df["value_gbp"], errors="coerce").fillna(0)
+    return df
+
+
+def drop_duplicates(client, rows: list) -> list:
+    """`rows` without the tenders the entity mapping marks as near-duplicates (all of them if it is unavailable)."""
+    ids = [row["tender_id"] for row in rows if row.get("tender_id") is not None]
+    if not ids:
+        return rows
+    try:
+        marked = (client.table(TENDER_ENTITIES_TABLE).select("tender_id")
+                  .in_("tender_id", ids).eq("duplicate", True).execute().data or [])
+    except Exception as e:
+        print(f"Entity mapping unavailable, keeping duplicates: {e}")
+        return rows
+    duplicates = {row["tender_id"] for row in marked}
+    return [row for row in rows if row.get("tender_id") not in duplicates]
+
+
+def fetch_upcoming_deadlines(client, filters: TenderFilters, days=30, limit=1000) -> pd.DataFrame:
+    """
+    Filtered tenders whose deadline is 0-`days` whole days away, soonest
+    first, with days_remaining computed at call time. Near-duplicates of
+    another listed tender are dropped.
+    """
+    now = datetime.now(timezone.utc)
+    query = (
+        client.table("tenders")
+        .select(", ".join(["tender_id"] + DEADLINE_COLUMNS))
+        .gte("deadline", now.isoformat())
+        .lt("deadline", (now + timedelta(days=days + 1)).isoformat())
+    )
+    query = filters.apply(query).order("deadline").limit(limit)
+    df = pd.DataFrame(drop_duplicates(client, query.execute().data or []), columns=DEADLINE_COLUMNS)
+    df["deadline"] = pd.to_datetime(df["deadline"], errors="coerce", utc=True)
+    df["value_gbp"] = pd.to_numeric(df["value_gbp"], errors="coerce").fillna(0)
+    df["days_remaining"] = (df["deadline"] - now).dt.days
+    return df
+
+
+class ServerSource:
+    """The functions above bound to a client: everything is computed in Postgres."""
+
+    def __init__(self, client):
+        self.client = client
+
+    def filter_options(self):
+        return filter_options(self.client)
+
+    def fetch_metrics(self, filters):
+        return fetch_metrics(self.client, filters)
+
+    def fetch_region_totals(self, filters):
+        return fetch_region_totals(self.client, filters)
+
+    def fetch_upcoming_deadlines(self, filters, days=30):
+        return fetch_upcoming_deadlines(self.client, filters, days)
+
+    def fetch_buyer_totals(self, filters, limit=20):
+        return fetch_buyer_totals(self.client, filters, limit)
+
+
+# Columns kept in memory by SnapshotSource (read once via tenders_reader)
+SNAPSHOT_COLUMNS = ["tender_id", "title", "region", "sector", "tender_status", "value_gbp", "deadline"]
+
+
+class SnapshotSource:
+    """
+    Same interface as ServerSource, answered from an in-memory snapshot of the
+    table through a FilterEngine built once per snapshot (create one
+    SnapshotSource per frame, not per rerun). Tenders in `duplicates`
+    (entity_resolution.read_duplicates) are left out.
+    """
+
+    def __init__(self, df: pd.DataFrame, duplicates=frozenset()):
+        if len(duplicates):
+            df = df[~df["tender_id"].isin(duplicates)].reset_index(drop=True)
+        self.df = df
+        self.values = pd.to_numeric(df["value_gbp"], errors="coerce").fillna(0).astype("float64")
+        self.engine = FilterEngine(df, self.values)
+
+    def mask(self, filters: TenderFilters):
+        return pd.Series(self.engine.mask(filters), index=self.df.index)
+
+    def filter_options(self):
+        options = {k: sorted(self.df[k].dropna().unique()) for k in ("region", "sector", "tender_status")}
+        options["max_value"] = float(self.values.max()) if len(self.values) else 0.0
+        return options
+
+    def fetch_metrics(self, filters):
+        return self.engine.metrics(filters)
+
+    def fetch_region_totals(self, filters):
+        return self.engine.region_totals(filters)
+
+    def fetch_upcoming_deadlines(self, filters, days=30):
+        now = datetime.now(timezone.utc)
+        rows = self.engine.upcoming_rows(filters, now, days)
+        df = self.df.iloc[rows]
+        df = df.assign(value_gbp=self.values.to_numpy()[rows], days_remaining=(df["deadline"] - now).dt.days)
+        return df[DEADLINE_COLUMNS + ["days_remaining"]]
+
+
+class ParquetSource:
+    """
+    Same interface as ServerSource, answered from the loaders' local Parquet
+    snapshot (parquet_store): each call scans only the columns it needs, with
+    the filters pushed down into the scan. Tenders in `duplicates` are left out.
+    """
+
+    def __init__(self, directory=parquet_store.DATASET_DIR, duplicates=frozenset()):
+        self.directory = directory
+        self.duplicates = sorted(duplicates)
+
+    def _scan(self, columns, filters, extra=None):
+        import pyarrow.dataset as ds
+
+        expr = extra
+        conditions = []
+        if self.duplicates:
+            conditions.append(~ds.field("tender_id").isin(self.duplicates))
+        if filters.regions:
+            conditions.append(ds.field("region").isin(list(filters.regions)))
+        if filters.sectors:
+            conditions.append(ds.field("sector").isin(list(filters.sectors)))
+        if filters.statuses:
+            conditions.append(ds.field("tender_status").isin(list(filters.statuses)))
+        if filters.min_value is not None:
+            conditions.append(parquet_store.value_field() >= filters.min_value)
+        if filters.max_value is not None:
+            conditions.append(parquet_store.value_field() <= filters.max_value)
+        for cond in conditions:
+            expr = cond if expr is None else expr & cond
+        return parquet_store.scan(columns, expr, self.directory)
+
+    def filter_options(self):
+        df = parquet_store.read_snapshot(["region", "sector", "tender_status", "value_gbp"], directory=self.directory)
+        options = {k: sorted(df[k].dropna().unique()) for k in ("region", "sector", "tender_status")}
+        options["max_value"] = float(df["value_gbp"].max()) if df["value_gbp"].notna().any() else 0.0
+        return options
+
+    def fetch_metrics(self, filters):
+        values = self._scan(["value_gbp"], filters).column("value_gbp").to_pandas().fillna(0).astype("float64")
+        return {
+            "tenders": int(len(values)),
+            "total_value": float(values.sum()),
+            "avg_value": float(values.mean()) if len(values) else 0.0,
+        }
+
+    def fetch_region_totals(self, filters):
+        import pyarrow.dataset as ds
+
+        df = self._scan(["region", "value_gbp"], filters, ds.field("region").is_valid()).to_pandas()
+        df["value_gbp"] = df["value_gbp"].fillna(0).astype("float64")
+        out = df.groupby("region", observed=True)["value_gbp"].agg(["count", "sum"]).reset_index()
+        out.columns = ["region", "tenders", "value_gbp"]
+        return out
+
+    def fetch_upcoming_deadlines(self, filters, days=30):
+        import pyarrow.dataset as ds
+
+        now = pd.Timestamp.now(tz="UTC")
+        window = (ds.field("deadline") >= now) & (ds.field("deadline") < now + timedelta(days=days + 1))
+        df = self._scan(DEADLINE_COLUMNS, filters, window).to_pandas()
+        df["value_gbp"] = df["value_gbp"].fillna(0)
+        df["days_remaining"] = (df["deadline"] - now).dt.days
+        return df.sort_values("deadline")[DEADLINE_COLUMNS + ["days_remaining"]]
@@ -0,0 +1,639 @@
+import os
+import re
+import time
+import pickle
+import zlib
+from collections import Counter
+from datetime import datetime, timezone
+
+import numpy as np
+
+from bulk_writer import chunked
+from search_index import extract_buyer_name
+from sync_state import parse_ts
+
+ENTITY_DIR = os.getenv("ENTITY_INDEX_DIR", os.path.join(".cache", "entities"))
+# Mapping tables main() publishes to (sql/dashboard_functions.sql)
+TENDER_ENTITIES_TABLE = os.getenv("TENDER_ENTITIES_TABLE", "tender_entities")
+BUYER_ALIASES_TABLE = os.getenv("BUYER_ALIASES_TABLE", "buyer_aliases")
+# Set ENTITY_RESOLUTION=off to skip the resolution job
+ENABLED = os.getenv("ENTITY_RESOLUTION", "on") != "off"
+
+# MinHash signature length and LSH bands (PERMUTATIONS / BANDS rows per band)
+PERMUTATIONS = 64
+BANDS = 16
+# Estimated Jaccard similarity from which two tenders / two buyer names are the same entity
+TENDER_THRESHOLD = float(os.getenv("DUPLICATE_THRESHOLD", "0.7"))
+BUYER_THRESHOLD = float(os.getenv("BUYER_THRESHOLD", "0.8"))
+# Tenders whose known deadlines are further apart than this are never duplicates
+DEADLINE_SLACK_DAYS = 7
+# Words of the description that go into a tender's shingles
+DESCRIPTION_WORDS = 120
+# Tenders with fewer shingles (short titles, no description) are never matched
+MIN_SHINGLES = 4
+# Contracts Finder's OCDS prefix: "ocds-b5fd17-<notice id>" (fetch_tenders) is notice "<notice id>"
+# (scripts/fetch_contracts_finder.py), whatever the rows' text and buyers
+OCID_PREFIX = os.getenv("OCID_PREFIX", "ocds-b5fd17")
+# Rows of one LSH bucket checked per lookup (a bucket of exact copies only needs a few)
+BUCKET_CAP = 32
+
+# Columns to read when seeding the resolver from Supabase
+SOURCE_COLUMNS = ["tender_id", "title", "description", "buyer", "deadline"]
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+_DIGITS = re.compile(r"[0-9]+")
+_PARENTHESES = re.compile(r"\([^)]*\)")
+STOPWORDS = frozenset("a an and are as at be by for from in is it of on or the to with".split())
+# Words that do not tell two buyers apart ("Acme Ltd" is "ACME Limited")
+LEGAL_WORDS = frozenset("the ltd limited plc llp llc inc".split())
+
+_rng = np.random.default_rng(20240601)
+# One seed per MinHash permutation
+_SEEDS = _rng.integers(0, 1 << 63, PERMUTATIONS, dtype=np.uint64)
+# Multipliers folding the rows of a band into one key
+_MIX = _rng.integers(1, 1 << 62, PERMUTATIONS // BANDS, dtype=np.uint64) | np.uint64(1)
+
+
+def buyer_key(name):
+    """
+    Normalized buyer name: lower case, "&" as "and", without parenthesized
+    abbreviations, punctuation or legal suffixes. None when nothing is left.
+    """
+    if not name or not isinstance(name, str):
+        return None
+    text = _PARENTHESES.sub(" ", name.lower()).replace("&", " and ")
+    words = [w for w in _TOKEN.findall(text) if w not in LEGAL_WORDS]
+    return " ".join(words) or None
+
+
+def notice_key(tender_id) -> str:
+    """The Contracts Finder notice id of a tender id: the id itself, or the rest of an OCID_PREFIX ocid."""
+    prefix = f"{OCID_PREFIX}-"
+    return tender_id[len(prefix):] if tender_id.startswith(prefix) else tender_id
+
+
+def tender_shingles(record) -> set:
+    """
+    Word bigrams of the title and the start of the description; none when
+    there are fewer than MIN_SHINGLES, since two short titles ("Cleaning
+    services") would look identical.
+    """
+    words = []
+    for field, limit in (("title", None), ("description", DESCRIPTION_WORDS)):
+        text = record.get(field)
+        if text and isinstance(text, str):
+            words += [w for w in _TOKEN.findall(text.lower())[:limit] if w not in STOPWORDS]
+    shingles = {f"{a} {b}" for a, b in zip(words, words[1:])}
+    return shingles if len(shingles) >= MIN_SHINGLES else set()
+
+
+def buyer_shingles(key) -> set:
+    """Character trigrams of a normalized buyer name."""
+    padded = f" {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _mix(x):
+    """splitmix64 finalizer: a well-mixed 64-bit hash of each uint64 (wrapping arithmetic)."""
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def signatures(shingle_sets) -> np.ndarray:
+    """
+    MinHash signatures (n x PERMUTATIONS uint32) of shingle sets: each
+    permutation is the splitmix64 hash of the shingles' CRC32 plus that
+    permutation's seed, minimized per set (top 32 bits kept). Empty sets get
+    an all-zero row; callers skip them.
+    """
+    sigs = np.zeros((len(shingle_sets), PERMUTATIONS), dtype=np.uint32)
+    sizes = np.fromiter((len(s) for s in shingle_sets), dtype=np.int64, count=len(shingle_sets))
+    rows = np.flatnonzero(sizes)
+    if not len(rows):
+        return sigs
+    x = np.fromiter((zlib.crc32(s.encode("utf-8")) for i in rows for s in shingle_sets[i]),
+                    dtype=np.uint64, count=int(sizes[rows].sum()))
+    starts = np.concatenate([[0], np.cumsum(sizes[rows])[:-1]])
+    with np.errstate(over="ignore"):
+        for k in range(PERMUTATIONS):
+            sigs[rows, k] = np.minimum.reduceat(_mix(x + _SEEDS[k]), starts) >> np.uint64(32)
+    return sigs
+
+
+def band_keys(sigs) -> np.ndarray:
+    """One uint64 key per (row, band): the band's rows folded together, tagged with the band number."""
+    r = PERMUTATIONS // BANDS
+    blocks = sigs.astype(np.uint64).reshape(len(sigs), BANDS, r)
+    keys = np.zeros((len(sigs), BANDS), dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        for i in range(r):
+            keys = keys * _MIX[i] + blocks[:, :, i]
+    return keys * np.uint64(BANDS) + np.arange(BANDS, dtype=np.uint64)
+
+
+class Clusters:
+    """
+    Items (tenders or buyer names) with a MinHash signature each, an LSH band
+    index to find the items likely to be similar to a new one, and a
+    union-find forest of the items found to be the same entity. The root of
+    a cluster is always its first-added item, so merging two clusters only
+    moves the later one's members.
+
+    Buyer names are union()ed directly and only ever merge. Tenders are
+    link()ed in pairs instead, and regroup() recomputes their clusters as the
+    connected components of the links, so unlinking a changed tender can
+    split a cluster and make a duplicate canonical again.
+
+    The band index is two sorted (key, row) runs: everything inserted before
+    the last merge, and a small run of recent inserts that is merged into the
+    first once it grows past an eighth of it, so inserts stay cheap.
+    """
+
+    def __init__(self):
+        self.ids = []
+        self.row_of = {}
+        self.sigs = np.zeros((0, PERMUTATIONS), dtype=np.uint32)
+        self.signed = np.zeros(0, dtype=bool)
+        self.parent = np.zeros(0, dtype=np.int64)
+        self.members = {}  # root -> rows, for clusters of more than one item
+        self.links = {}  # row -> rows found to be the same entity (tenders)
+        self.runs = [(np.zeros(0, dtype=np.uint64), np.zeros(0, dtype=np.int64))] * 2
+
+    def __len__(self):
+        return len(self.ids)
+
+    def rows(self, ids) -> np.ndarray:
+        """Rows of `ids`, appending the unseen ones as single-item clusters."""
+        out = []
+        for item in ids:
+            row = self.row_of.get(item)
+            if row is None:
+                row = self.row_of[item] = len(self.ids)
+                self.ids.append(item)
+            out.append(row)
+        capacity = len(self.parent)
+        if len(self.ids) > capacity:
+            # Grown geometrically, so a full load does not copy the signatures per chunk
+            grow = max(len(self.ids), 2 * capacity, 1024) - capacity
+            self.sigs = np.concatenate([self.sigs, np.zeros((grow, PERMUTATIONS), dtype=np.uint32)])
+            self.signed = np.concatenate([self.signed, np.zeros(grow, dtype=bool)])
+            self.parent = np.concatenate([self.parent, np.arange(capacity, capacity + grow, dtype=np.int64)])
+        return np.asarray(out, dtype=np.int64)
+
+    def find(self, row) -> int:
+        parent = self.parent
+        while parent[row] != row:
+            parent[row] = parent[parent[row]]
+            row = parent[row]
+        return int(row)
+
+    def union(self, a, b) -> list:
+        """Merges the clusters of rows a and b; returns the rows whose root changed."""
+        a, b = self.find(a), self.find(b)
+        if a == b:
+            return []
+        keep, gone = min(a, b), max(a, b)
+        moved = self.members.pop(gone, [gone])
+        self.members.setdefault(keep, [keep]).extend(moved)
+        self.parent[gone] = keep
+        return moved
+
+    def link(self, a, b):
+        self.links.setdefault(a, set()).add(b)
+        self.links.setdefault(b, set()).add(a)
+
+    def unlink(self, rows) -> bool:
+        """Drops every link of `rows`; returns whether there were any."""
+        dropped = False
+        for row in rows:
+            for other in self.links.pop(row, ()):
+                peers = self.links[other]
+                peers.discard(row)
+                if not peers:
+                    del self.links[other]
+                dropped = True
+        return dropped
+
+    def regroup(self) -> list:
+        """Recomputes the clusters from the links; returns the rows whose root changed."""
+        before = {row: root for root, rows in self.members.items() for row in rows}
+        # Only clustered rows have a parent other than themselves
+        self.parent[list(before)] = list(before)
+        self.members = {}
+        for a, others in self.links.items():
+            for b in others:
+                if a < b:
+                    self.union(a, b)
+        after = {row: root for root, rows in self.members.items() for row in rows}
+        return [row for row in before.keys() | after.keys() if before.get(row, row) != after.get(row, row)]
+
+    def duplicates(self) -> list:
+        """Rows that are not the root of their cluster."""
+        return [row for root, rows in self.members.items() for row in rows if row != root]
+
+    def _insert(self, keys, rows):
+        recent_keys, recent_rows = self.runs[1]
+        keys = np.concatenate([recent_keys, keys])
+        rows = np.concatenate([recent_rows, rows])
+        order = np.argsort(keys, kind="stable")
+        self.runs[1] = (keys[order], rows[order])
+        if len(keys) * 8 > len(self.runs[0][0]):
+            keys = np.concatenate([self.runs[0][0], self.runs[1][0]])
+            rows = np.concatenate([self.runs[0][1], self.runs[1][1]])
+            order = np.argsort(keys, kind="stable")
+            self.runs = [(keys[order], rows[order]), (np.zeros(0, dtype=np.uint64), np.zeros(0, dtype=np.int64))]
+
+    def store(self, rows, sigs) -> np.ndarray:
+        """Stores the signatures of `rows` (all-zero rows are unsigned); returns the rows whose signature changed."""
+        signed = sigs.any(axis=1)
+        changed = (signed != self.signed[rows]) | (sigs != self.sigs[rows]).any(axis=1)
+        rows, sigs, signed = rows[changed], sigs[changed], signed[changed]
+        self.sigs[rows] = sigs
+        self.signed[rows] = signed
+        if signed.any():
+            # Keys of a previous signature stay in the runs; candidates() compares current signatures
+            self._insert(band_keys(sigs[signed]).ravel(), np.repeat(rows[signed], BANDS))
+        return rows
+
+    def index(self, rows, sigs) -> tuple:
+        """Stores the signatures of `rows` and returns their candidates()."""
+        self.store(rows, sigs)
+        return self.candidates(rows)
+
+    def candidates(self, rows) -> tuple:
+        """
+        The candidate pairs (row, other row, estimated Jaccard) of the signed
+        `rows` that share at least one band with them, among everything
+        indexed so far.
+        """
+        rows = rows[self.signed[rows]]
+        none = np.zeros(0, dtype=np.int64)
+        if not len(rows):
+            return none, none, np.zeros(0)
+
+        flat = band_keys(self.sigs[rows]).ravel()
+        queries, others = [], []
+        for run_keys, run_rows in self.runs:
+            if not len(run_keys):
+                continue
+            lo = np.searchsorted(run_keys, flat, "left")
+            counts = np.minimum(np.searchsorted(run_keys, flat, "right") - lo, BUCKET_CAP)
+            total = int(counts.sum())
+            if not total:
+                continue
+            starts = np.repeat(lo - (np.cumsum(counts) - counts), counts)
+            others.append(run_rows[starts + np.arange(total)])
+            queries.append(np.repeat(np.repeat(rows, BANDS), counts))
+        if not queries:
+            return none, none, np.zeros(0)
+        pairs = np.unique(np.stack([np.concatenate(queries), np.concatenate(others)], axis=1), axis=0)
+        pairs = pairs[(pairs[:, 0] != pairs[:, 1]) & self.signed[pairs[:, 1]]]
+        similarity = (self.sigs[pairs[:, 0]] == self.sigs[pairs[:, 1]]).mean(axis=1)
+        return pairs[:, 0], pairs[:, 1], similarity
+
+
+# -----------------------
+# Resolver
+# -----------------------
+class EntityResolver:
+    """
+    Near-duplicate tenders and canonical buyers, found in roughly linear time
+    with MinHash signatures and LSH banding instead of comparing every pair.
+
+    Buyer names are normalized (buyer_key) and the distinct keys clustered on
+    character-trigram signatures, so spelling variants of one buyer share a
+    canonical buyer. Tenders are clustered on word-bigram signatures of their
+    title and description; a candidate pair is only a duplicate when it is
+    similar enough, both buyers are known and resolve to the same canonical
+    buyer, the numbers in the titles match ("Lot 1" is not "Lot 2") and its
+    deadlines (when both are known) are close. A tender whose text, buyer,
+    title numbers or deadline changed loses its links and is matched again,
+    so a tender that stopped matching is canonical again (duplicate false)
+    at the next publish. A notice loaded under both its Contracts Finder id
+    and its ocid (notice_key) is always one tender, buyer or not.
+
+    Every tender maps to the first-resolved tender of its cluster
+    (canonical_id), and every buyer to the most common spelling of its
+    canonical buyer's key. publish() writes the mapping rows that changed to TENDER_ENTITIES_TABLE
+    and the buyer keys' canonical buyers to BUYER_ALIASES_TABLE.
+
+    The mapping tables have a single writer: main(), run as one job after the
+    loads. It reads the tenders written since the resolver's watermark (the
+    newest tenders.updated_at it accounted for) from the table, whichever
+    host loaded them, so no loader's local state overwrites another's.
+    """
+
+    def __init__(self, directory=ENTITY_DIR):
+        self.directory = directory
+        self.seeded = False
+        self.watermark = None
+        self.tenders = Clusters()
+        self.buyers = Clusters()
+        self.buyer_of = np.zeros(0, dtype=np.int64)  # tender row -> buyer row (-1: unknown)
+        self.deadline = np.zeros(0, dtype=np.int64)  # tender row -> deadline day (-1: unknown)
+        self.numbers = {}  # tender row -> numeric words of its title, for titles with any
+        self.notices = {}  # notice_key -> tender rows (a notice loaded under its id and its ocid)
+        self.names = []  # buyer row -> most common spelling among its tenders
+        self.spellings = []  # buyer row -> Counter of spellings
+        self.dirty_tenders = set()
+        self.dirty_buyers = set()
+
+    def __len__(self):
+        return len(self.tenders)
+
+    def _buyer_rows(self, names) -> np.ndarray:
+        """Buyer rows of raw names (-1 for none), resolving the keys not seen before."""
+        keys = [buyer_key(name) for name in names]
+        spelling = {}
+        for name, key in zip(names, keys):
+            if key is not None and key not in self.buyers.row_of:
+                spelling.setdefault(key, name.strip())
+        fresh = list(spelling)
+        rows = self.buyers.rows(fresh)
+        self.names += spelling.values()
+        self.spellings += [Counter() for _ in fresh]
+        if len(rows):
+            self.dirty_buyers.update(rows.tolist())
+            a, b, similarity = self.buyers.index(rows, signatures([buyer_shingles(k) for k in fresh]))
+            for x, y, s in zip(a.tolist(), b.tolist(), similarity.tolist()):
+                if s >= BUYER_THRESHOLD and self._same_digits(x, y):
+                    moved = self.buyers.union(x, y)
+                    self.dirty_buyers.update(moved)
+        return np.asarray([self.buyers.row_of[k] if k is not None else -1 for k in keys], dtype=np.int64)
+
+    def _count(self, row, name):
+        """Counts a tender's spelling of its buyer; a new most common spelling of a root renames its cluster."""
+        counts = self.spellings[row]
+        name = name.strip()
+        counts[name] += 1
+        if name != self.names[row] and counts[name] > counts[self.names[row]]:
+            self.names[row] = name
+            if self.buyers.find(row) == row:
+                self.dirty_buyers.update(self.buyers.members.get(row, [row]))
+
+    def _same_digits(self, x, y) -> bool:
+        """Buyer names with different numbers ("Academy Trust 2") are never merged."""
+        digits = [set(_DIGITS.findall(self.buyers.ids[r])) for r in (x, y)]
+        return digits[0] == digits[1]
+
+    def add(self, records):
+        """
+        Resolves a chunk of written tender records. Fields a record lacks
+        (title and description, buyer, deadline) keep their previous value.
+        """
+        records = [r for r in records if r.get("tender_id") is not None]
+        if not records:
+            return
+        ids = [str(r["tender_id"]) for r in records]
+        new = [item not in self.tenders.row_of for item in ids]
+        rows = self.tenders.rows(ids)
+        grow = len(self.tenders.parent) - len(self.buyer_of)
+        if grow > 0:
+            self.buyer_of = np.concatenate([self.buyer_of, np.full(grow, -1, dtype=np.int64)])
+            self.deadline = np.concatenate([self.deadline, np.full(grow, -1, dtype=np.int64)])
+        new = {row for row, is_new in zip(rows.tolist(), new) if is_new}
+        self.dirty_tenders.update(new)
+        for row in new:
+            self.notices.setdefault(notice_key(self.tenders.ids[row]), []).append(row)
+        changed = set(new)
+
+        has_buyer = [("buyer" in r or "buyer_name" in r) for r in records]
+        names = [r.get("buyer_name") or extract_buyer_name(r.get("buyer")) for r in records]
+        buyers = self._buyer_rows(names)
+        for row, known, buyer, name in zip(rows.tolist(), has_buyer, buyers.tolist(), names):
+            if known and self.buyer_of[row] != buyer:
+                self.buyer_of[row] = buyer
+                self.dirty_tenders.add(row)
+                changed.add(row)
+                if buyer >= 0:
+                    self._count(buyer, name)
+        for row, record in zip(rows.tolist(), records):
+            if "deadline" in record:
+                deadline = parse_ts(record["deadline"])
+                deadline = deadline.toordinal() if deadline else -1
+                if self.deadline[row] != deadline:
+                    self.deadline[row] = deadline
+                    changed.add(row)
+            if "title" in record:
+                numbers = frozenset(w for w in _TOKEN.findall(str(record["title"] or "").lower()) if w.isdigit())
+                if numbers != self.numbers.get(row, frozenset()):
+                    if numbers:
+                        self.numbers[row] = numbers
+                    else:
+                        self.numbers.pop(row, None)
+                    changed.add(row)
+
+        # Records without title or description keep their signature
+        texts = [i for i, r in enumerate(records) if r.get("title") or r.get("description")]
+        changed.update(self.tenders.store(rows[texts], signatures([tender_shingles(records[i]) for i in texts])).tolist())
+        if not changed:
+            return
+        changed = np.asarray(sorted(changed), dtype=np.int64)
+        relinked = self.tenders.unlink(changed.tolist())
+        # The same notice under both loaders' ids is linked without comparing the rows
+        for row in changed.tolist():
+            for other in self.notices[notice_key(self.tenders.ids[row])]:
+                if other != row:
+                    self.tenders.link(row, other)
+                    relinked = True
+
+        a, b, similarity = self.tenders.candidates(changed)
+        keep = similarity >= TENDER_THRESHOLD
+        a, b = a[keep], b[keep]
+        # Both buyers known and the same canonical buyer; both deadlines known -> within the slack
+        buyer_a, buyer_b = self.buyer_of[a], self.buyer_of[b]
+        deadline_a, deadline_b = self.deadline[a], self.deadline[b]
+        dated = (deadline_a >= 0) & (deadline_b >= 0)
+        keep = (buyer_a >= 0) & (buyer_b >= 0) & (~dated | (np.abs(deadline_a - deadline_b) <= DEADLINE_SLACK_DAYS))
+        for x, y, bx, by in zip(a[keep].tolist(), b[keep].tolist(), buyer_a[keep].tolist(), buyer_b[keep].tolist()):
+            if self.buyers.find(bx) != self.buyers.find(by) or not self._same_numbers(x, y):
+                continue
+            self.tenders.link(x, y)
+            relinked = True
+        if relinked:
+            self.dirty_tenders.update(self.tenders.regroup())
+
+    def _same_numbers(self, x, y) -> bool:
+        """Tenders with different numeric words in their titles ("Lot 1", "Lot 2") are never duplicates."""
+        return self.numbers.get(x, frozenset()) == self.numbers.get(y, frozenset())
+
+    def rebuild(self, client):
+        """Seeds the resolver from every row of the tenders table."""
+        from tenders_reader import iter_pages, newest_update
+
+        self.__init__(self.directory)
+        # Read first: rows written during the walk are read again by the next catch_up()
+        self.watermark = newest_update(client)
+        for rows in iter_pages(client, columns=SOURCE_COLUMNS):
+            self.add(rows)
+        self.seeded = True
+
+    def catch_up(self, client) -> int:
+        """Adds the tenders written since the watermark and moves it up to the newest write; returns how many."""
+        from tenders_reader import newest_update, written_since
+
+        latest = newest_update(client)
+        read = 0
+        if latest is not None and latest != self.watermark:
+            for rows in written_since(client, self.watermark, SOURCE_COLUMNS, latest):
+                self.add(rows)
+                read += len(rows)
+        self.watermark = latest
+        return read
+
+    # --- results ---
+    def canonical_id(self, tender_id):
+        row = self.tenders.row_of.get(str(tender_id))
+        return None if row is None else self.tenders.ids[self.tenders.find(row)]
+
+    def duplicate_ids(self) -> set:
+        """Ids of every tender that is a near-duplicate of an older one."""
+        return {self.tenders.ids[row] for row in self.tenders.duplicates()}
+
+    def canonical_buyer(self, name) -> tuple:
+        """(buyer_id, display name) of a raw buyer name's canonical buyer, or (None, name) when unknown."""
+        row = self.buyers.row_of.get(buyer_key(name))
+        if row is None:
+            return None, name
+        root = self.buyers.find(row)
+        return self.buyers.ids[root], self.names[root]
+
+    def tender_row(self, row, stamp) -> dict:
+        root = self.tenders.find(row)
+        buyer = int(self.buyer_of[row])
+        return {
+            "tender_id": self.tenders.ids[row],
+            "canonical_id": self.tenders.ids[root],
+            "duplicate": root != row,
+            "buyer_key": self.buyers.ids[buyer] if buyer >= 0 else None,
+            "updated_at": stamp,
+        }
+
+    def buyer_row(self, row, stamp) -> dict:
+        root = self.buyers.find(row)
+        return {
+            "buyer_key": self.buyers.ids[row],
+            "buyer_id": self.buyers.ids[root],
+            "buyer_name": self.names[root],
+            "updated_at": stamp,
+        }
+
+    def stats(self) -> dict:
+        return {
+            "tenders": len(self.tenders),
+            "duplicates": len(self.tenders.duplicates()),
+            "buyer_names": len(self.buyers),
+            "buyers": len(self.buyers) - len(self.buyers.duplicates()),
+        }
+
+    def publish(self, client) -> int:
+        """
+        Upserts the mapping rows changed since the last publish (every row
+        after a rebuild), tenders that stopped being duplicates included.
+        Seeds the resolver from the tenders table first if it never was, and
+        otherwise catches up on the tenders written since. Returns the rows
+        written.
+        """
+        if not self.seeded or self.watermark is None:
+            self.rebuild(client)
+            self.dirty_tenders = set(range(len(self.tenders)))
+            self.dirty_buyers = set(range(len(self.buyers)))
+        else:
+            self.catch_up(client)
+        stamp = datetime.now(timezone.utc).isoformat()
+        for batch in chunked(sorted(self.dirty_buyers), 500):
+            rows = [self.buyer_row(row, stamp) for row in batch]
+            client.table(BUYER_ALIASES_TABLE).upsert(rows, on_conflict="buyer_key").execute()
+        for batch in chunked(sorted(self.dirty_tenders), 500):
+            rows = [self.tender_row(row, stamp) for row in batch]
+            client.table(TENDER_ENTITIES_TABLE).upsert(rows, on_conflict="tender_id").execute()
+        written = len(self.dirty_tenders) + len(self.dirty_buyers)
+        self.dirty_tenders, self.dirty_buyers = set(), set()
+        return written
+
+    # --- persistence ---
+    def save(self):
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, "index.pkl")
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, directory=ENTITY_DIR) -> "EntityResolver":
+        """Loads the on-disk resolver, or returns an empty one."""
+        try:
+            with open(os.path.join(directory, "index.pkl"), "rb") as f:
+                resolver = pickle.load(f)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return cls(directory)
+        if not hasattr(resolver, "watermark"):
+            # Saved before tender links were kept: reseeded at the next publish
+            return cls(directory)
+        resolver.directory = directory
+        return resolver
+
+
+# -----------------------
+# Reading the mapping (dashboard, search app)
+# -----------------------
+def read_duplicates(client, table=TENDER_ENTITIES_TABLE, page_size=1000) -> frozenset:
+    """Ids of every tender mapped to an older canonical tender, walked by keyset on tender_id."""
+    ids, after = [], None
+    while True:
+        query = client.table(table).select("tender_id").eq("duplicate", True)
+        if after is not None:
+            query = query.gt("tender_id", after)
+        page = query.order("tender_id").limit(page_size).execute().data or []
+        if not page:
+            return frozenset(ids)
+        ids += [row["tender_id"] for row in page]
+        after = page[-1]["tender_id"]
+
+
+def read_buyer_aliases(client, table=BUYER_ALIASES_TABLE, page_size=1000) -> dict:
+    """buyer_key -> canonical buyer name, for every buyer key, walked by keyset on buyer_key."""
+    aliases, after = {}, None
+    while True:
+        query = client.table(table).select("buyer_key, buyer_name")
+        if after is not None:
+            query = query.gt("buyer_key", after)
+        page = query.order("buyer_key").limit(page_size).execute().data or []
+        if not page:
+            return aliases
+        aliases.update((row["buyer_key"], row["buyer_name"]) for row in page)
+        after = page[-1]["buyer_key"]
+
+
+def main():
+    """
+    The resolution job, run after the loads: catches the on-disk resolver up
+    with the tenders table (seeding it on the first run), publishes the
+    changed mapping rows, and excludes the duplicates from the rollup cube.
+    """
+    import rollup_cube
+    from supabase_client import create_client
+
+    if not ENABLED:
+        print("🪪 Entity resolution is off (ENTITY_RESOLUTION=off).")
+        return
+    started = time.perf_counter()
+    client = create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_SERVICE_KEY"), service=True)
+    resolver = EntityResolver.load()
+    written = resolver.publish(client)
+    resolver.save()
+    stats = resolver.stats()
+    print(f"🪪 Entities: {stats['duplicates']} of {stats['tenders']} tenders are near-duplicates, "
+          f"{stats['buyer_names']} buyer names resolve to {stats['buyers']} buyers "
+          f"({written} mapping rows written in {time.perf_counter() - started:.1f}s)")
+    if rollup_cube.ENABLED:
+        cube = rollup_cube.RollupCube()
+        cube.set_duplicates(resolver.duplicate_ids())
+        print(f"🧊 Rollup cube: {cube.publish(client)} cells published, {len(cube)} tenders")
+        cube.save()
+
+
+if __name__ == "__main__":
+    main()
@@ -2,8 +2,17 @@ import os
 import requests
 import pandas as pd
 from datetime import datetime, timezone
-from supabase import create_client
+from supabase_client import create_client
 from dotenv import load_dotenv
+from classifier import classify, detect_region, detect_sector  # noqa: F401 (re-exported)
+import metrics
+from bulk_writer import BulkWriter, BATCH_SIZE, chunked
+from change_detection import HashIndex
+from post_upsert import PostUpsert
+from normalizer import tenders_frame, iter_tender_batches
+from http_cache import HttpCache
+from http_client import FetchClient
+from sync_state import sync_since, save_high_water_mark, parse_ts, api_date, HighWaterMark
 
 # ----------------------------------------------------------
 # 1. Load environment variables
@@ -11,61 +20,33 @@ from dotenv import load_dotenv
 load_dotenv()
 
 SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY")
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+SUPABASE_SERVICE_KEY = os.getenv("SUPABASE_SERVICE_KEY")
+# Writes tenders and publishes the indexes: the service key, never the anon key
+supabase = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY, service=True)
 
 # ----------------------------------------------------------
 # 2. Helper functions
 # ----------------------------------------------------------
-def detect_region(text):
-    """Simple keyword-based region detection."""
-    if not text or not isinstance(text, str):
-        return None
-    text_lower = text.lower()
-    if any(x in text_lower for x in ["london", "westminster", "croydon"]):
-        return "London"
-    elif any(x in text_lower for x in ["scotland", "edinburgh", "glasgow"]):
-        return "Scotland"
-    elif any(x in text_lower for x in ["birmingham", "manchester", "leeds", "liverpool", "yorkshire", "midlands"]):
-        return "Midlands & North"
-    elif any(x in text_lower for x in ["bristol", "southampton", "oxford", "cambridge", "kent", "sussex"]):
-        return "South England"
-    elif "wales" in text_lower:
-        return "Wales"
-    elif "northern ireland" in text_lower or "belfast" in text_lower:
-        return "Northern Ireland"
-    else:
-        return "UK (General)"
+# Region/sector detection lives in classifier.py: the keyword tables are
+# compiled once into a single word-boundary regex and matched in one pass.
 
+SYNC_SOURCE = "fetch_tenders"
+SEARCH_URL = "https://www.contractsfinder.service.gov.uk/Published/Notices/OCDS/Search"
+# Notices per request; incremental runs request as many pages as it takes to reach the present
+FETCH_LIMIT = int(os.getenv("FETCH_LIMIT", "50"))
+# STREAMING=on parses the response incrementally and upserts tenders as they are parsed
+STREAMING = os.getenv("STREAMING", "off") == "on"
 
-def detect_sector(text):
-    """Classify sector based on title or description."""
-    if not text or not isinstance(text, str):
-        return None
-    text_lower = text.lower()
-    if any(x in text_lower for x in ["software", "it", "technology", "digital"]):
-        return "Information Technology"
-    elif any(x in text_lower for x in ["cleaning", "janitorial", "maintenance", "facilities"]):
-        return "Facilities & Cleaning"
-    elif any(x in text_lower for x in ["construction", "building", "engineering", "civil"]):
-        return "Construction & Engineering"
-    elif any(x in text_lower for x in ["health", "hospital", "nhs", "medical"]):
-        return "Healthcare"
-    elif any(x in text_lower for x in ["education", "school", "university", "college"]):
-        return "Education"
-    elif any(x in text_lower for x in ["transport", "rail", "bus", "airport", "road"]):
-        return "Transport & Infrastructure"
-    else:
-        return "General Public Sector"
+# Pooled keep-alive session with timeouts, retries/backoff and a circuit breaker
+client = FetchClient()
+# Raw responses are archived under .cache/http/fetch_tenders and revalidated with ETag/Last-Modified
+http_cache = HttpCache(SYNC_SOURCE, fetch=client.get)
 
 
 # ----------------------------------------------------------
 # 3. Fetch tenders from Contracts Finder API
 # ----------------------------------------------------------
-def fetch_latest_tenders(limit=50):
-    print("🚀 Fetching tenders from Contracts Finder API...")
-
-    headers = {"Accept": "application/json"}
+def search_params(limit, since=None):
     params = {
         "limit": limit,
         "order": "desc",
@@ -73,50 +54,56 @@ def fetch_latest_tenders(limit=50):
         "status": "open",
         "showExpired": "false"
     }
+    if since is not None:
+        # Oldest first: a page cut off at `limit` ends at a point everything before it was fetched
+        params["publishedFrom"] = api_date(since)
+        params["order"] = "asc"
+        print(f"🔁 Incremental sync: notices published since {since.isoformat()}")
+    return params
 
-    response = requests.get(
-        "https://www.contractsfinder.service.gov.uk/Published/Notices/OCDS/Search",
-        headers=headers,
-        params=params
-    )
-
-    if response.status_code != 200:
-        print(f"❌ HTTP Error {response.status_code}: {response.text[:300]}")
-        return pd.DataFrame()
-
-    try:
-        data = response.json()
-    except Exception as e:
-        print("❌ Failed to parse JSON:", e)
-        print(response.text[:400])
-        return pd.DataFrame()
 
-    # Flexible extraction
-    if "records" in data:
-        notices = data["records"]
-    elif "releases" in data:
-        notices = data["releases"]
-    else:
-        print("⚠️ No 'records' or 'releases' key found in API response.")
-        print(f"Keys returned: {list(data.keys())}")
-        return pd.DataFrame()
+def _next_since(published, since):
+    """
+    publishedFrom of the next incremental page: the newest date of a full
+    page, or None when the page was the last one (or did not move forward).
+    """
+    newest = max((ts for ts in map(parse_ts, published) if ts is not None), default=None)
+    if newest is None or newest <= since:
+        if newest is not None:
+            print(f"⚠️ More than a page of notices published at {newest.isoformat()}; raise FETCH_LIMIT")
+        return None
+    return newest
 
-    print(f"Fetched {len(notices)} tenders from API.")
 
-    tenders = []
-    for n in notices[:limit]:
+def iter_tenders(notices, limit=50, since=None):
+    """
+    Yields normalized tender dicts from any iterable of OCDS records/releases,
+    one at a time. The loaders use the batch equivalents in normalizer.py,
+    which produce the same values (with one created_at/updated_at per batch).
+    """
+    for i, n in enumerate(notices):
+        if limit is not None and i >= limit:
+            break
         release = n.get("releases", [n])[0]
         tender_info = release.get("tender", {})
 
         title = tender_info.get("title", "No title")
         desc = tender_info.get("description", "")
         published = release.get("date", None)
+        if since is not None:
+            published_at = parse_ts(published)
+            if published_at is not None and published_at < since:
+                # Results are newest-first, so everything after this was already loaded
+                break
         deadline = tender_info.get("tenderPeriod", {}).get("endDate", None)
         value = tender_info.get("value", {})
         value_amount = value.get("amount")
         currency = value.get("currency", "GBP")
+        with metrics.timer("classify"):
+            region, sector = classify(title + " " + desc)
+        metrics.count("rows_parsed")
 
-        tender = {
+        yield {
             "tender_id": release.get("ocid"),
             "title": title,
             "description": desc,
@@ -124,50 +111,230 @@ def fetch_latest_tenders(limit=50):
             "deadline": deadline,
             "value_gbp": float(value_amount) if value_amount else 0,
             "currency": currency,
-            "region": detect_region(title + " " + desc),
-            "sector": detect_sector(title + " " + desc),
+            "region": region,
+            "sector": sector,
             "tender_status": tender_info.get("status", "Open"),
             "created_at": datetime.now(timezone.utc).isoformat(),
             "updated_at": datetime.now(timezone.utc).isoformat(),
         }
-        tenders.append(tender)
+
+
+def fetch_latest_tenders(limit=50, since=None):
+    """
+    Fetches the newest open notices. When `since` is given (incremental mode)
+    every notice published at or after it is fetched instead, oldest first,
+    one page of `limit` after another until a page comes back short.
+    """
+    print("🚀 Fetching tenders from Contracts Finder API...")
+    if since is None:
+        return fetch_tenders_page(limit)[0]
+
+    frames = []
+    while since is not None:
+        tenders, full = fetch_tenders_page(limit, since)
+        frames.append(tenders)
+        since = _next_since(tenders.get("published_date", []), since) if full else None
+    tenders = pd.concat(frames, ignore_index=True)
+    if tenders.empty:
+        return tenders
+    # Consecutive pages overlap on the date they share
+    return tenders.drop_duplicates("tender_id", keep="last").reset_index(drop=True)
+
+
+def fetch_tenders_page(limit, since=None):
+    """One search request as a DataFrame, and whether it came back full (more may follow)."""
+    entry = fetch_search_page(limit, since)
+    if entry is None:
+        return pd.DataFrame(), False
+
+    try:
+        with metrics.timer("parse_page"):
+            data = entry.json()
+    except Exception as e:
+        print("❌ Failed to parse JSON:", e)
+        return pd.DataFrame(), False
+
+    # Flexible extraction
+    if "records" in data:
+        notices = data["records"]
+    elif "releases" in data:
+        notices = data["releases"]
+    else:
+        print("⚠️ No 'records' or 'releases' key found in API response.")
+        print(f"Keys returned: {list(data.keys())}")
+        return pd.DataFrame(), False
+
+    print(f"Fetched {len(notices)} tenders from API.")
+
+    with metrics.timer("normalize"):
+        # Oldest-first pages are bounded by publishedFrom alone; the newest-first cut-off does not apply
+        tenders = tenders_frame(notices, limit)
+    metrics.count("rows_parsed", len(tenders))
 
     print(f"✅ Parsed {len(tenders)} valid tenders.")
-    return pd.DataFrame(tenders)
+    return tenders, len(notices) >= limit
+
+
+def stream_latest_tenders(limit=50, since=None):
+    """
+    Streaming counterpart of fetch_latest_tenders: yields tenders while the
+    response body is still being parsed, so memory stays flat for any limit.
+    """
+    print("🚀 Streaming tenders from Contracts Finder API...")
+
+    yielded = set()
+    while True:
+        entry = fetch_search_page(limit, since)
+        if entry is None:
+            return
+        published, seen = [], 0
+        for batch in iter_tender_batches(entry.notices(), BATCH_SIZE, limit):
+            metrics.count("rows_parsed", len(batch))
+            published += [t["published_date"] for t in batch]
+            seen += len(batch)
+            # Consecutive pages overlap on the date they share; a tender is upserted once
+            batch = [t for t in batch if t["tender_id"] not in yielded]
+            yielded.update(t["tender_id"] for t in batch)
+            yield from batch
+        # Incremental runs page on (see fetch_latest_tenders)
+        if since is None or seen < limit:
+            return
+        since = _next_since(published, since)
+        if since is None:
+            return
+
+
+@metrics.timer("fetch")
+def fetch_search_page(limit, since=None):
+    """
+    Fetches the search results through the on-disk archive. Returns None on
+    an HTTP error, or when the API answered 304 for a page already loaded.
+    """
+    try:
+        entry = http_cache.get(
+            SEARCH_URL,
+            headers={"Accept": "application/json"},
+            params=search_params(limit, since)
+        )
+    except requests.HTTPError as e:
+        print(f"❌ HTTP Error {e.response.status_code}: {e.response.text[:300]}")
+        return None
+    except requests.RequestException as e:
+        print(f"❌ Request failed after retries: {e}")
+        return None
+
+    metrics.count("pages_fetched")
+    if entry.skippable:
+        metrics.count("pages_not_modified")
+        print("✅ Unchanged since the last run (304 Not Modified); nothing to parse.")
+        return None
+    return entry
+
+
+def replay_archive():
+    """Re-runs normalization and loading from the archived responses alone (HTTP_CACHE=offline)."""
+    entries = http_cache.entries()
+    print(f"📼 Replaying {len(entries)} archived responses...")
+
+    def archived_tenders():
+        for entry in entries:
+            for batch in iter_tender_batches(entry.notices(), BATCH_SIZE):
+                yield from batch
+
+    return upsert_tenders(archived_tenders())
 
 
 # ----------------------------------------------------------
 # 4. Upload to Supabase (UPSERT)
 # ----------------------------------------------------------
+def upsert_tenders(records):
+    """
+    Upserts an iterable of tender dicts (a list or a streaming generator),
+    consuming it one batch at a time.
+    """
+    index = HashIndex("tenders")
+    hooks = PostUpsert(db=supabase)
+    seen = new_count = changed_count = 0
+
+    # ✅ Chunked upserts, several in flight; on_conflict ensures update instead of duplicate insert.
+    # New and changed rows use separate writers because every row in a bulk upsert needs the same columns.
+    with BulkWriter(supabase, on_conflict="tender_id", on_written=hooks) as new_writer, \
+            BulkWriter(supabase, on_conflict="tender_id", on_written=hooks) as changed_writer:
+        for batch in chunked(records, BATCH_SIZE):
+            # ✅ Only new or changed tenders are written; unchanged ones are skipped entirely
+            with metrics.timer("diff"):
+                new, changed = index.split(batch)
+            for record in changed:
+                record.pop("created_at", None)  # ✅ Keeps the original created_at on updates
+            new_writer.add(new)
+            changed_writer.add(changed)
+            seen += len(batch)
+            new_count += len(new)
+            changed_count += len(changed)
+
+    report = new_writer.report.merge(changed_writer.report)
+    index.commit(report.failed)
+    with metrics.timer("post_upsert_close"):
+        hooks.close()
+    metrics.count("rows_seen", seen)
+    metrics.count("rows_new", new_count)
+    metrics.count("rows_changed", changed_count)
+    metrics.count("rows_unchanged", seen - new_count - changed_count)
+    metrics.record_writes(report)
+
+    print(f"🔍 {new_count} new, {changed_count} changed, {seen - new_count - changed_count} unchanged")
+    print(f"✅ Successfully inserted/updated {report.written} tenders; ❌ failed {len(report.failed)}")
+    print(f"⏱️ {report.summary()}")
+    return report
+
+
 def insert_into_supabase(df):
     print(f"Inserting {len(df)} tenders into Supabase...")
-    success, fail = 0, 0
-
-    for _, row in df.iterrows():
-        record = row.to_dict()
-        record.pop("id", None)  # ✅ Prevents 'id' conflicts with Supabase identity column
-        try:
-            supabase.table("tenders").upsert(
-                record,
-                on_conflict="tender_id"  # ✅ ensures update instead of duplicate insert
-            ).execute()
-            success += 1
-        except Exception as e:
-            fail += 1
-            print(f"⚠️ Error inserting {record.get('tender_id')}: {e}")
 
-    print(f"✅ Successfully inserted/updated {success} tenders; ❌ failed {fail}")
+    df = df.drop(columns=["id"], errors="ignore")  # ✅ Prevents 'id' conflicts with Supabase identity column
+    records = df.astype(object).where(df.notna(), None).to_dict("records")  # NaN isn't valid JSON
+    return upsert_tenders(records)
 
 
 # ----------------------------------------------------------
 # 5. Main entry point
 # ----------------------------------------------------------
 def main():
-    df = fetch_latest_tenders(limit=50)
-    if df.empty:
-        print("⚠️ No tenders fetched.")
+    try:
+        run()
+    finally:
+        # Written for failed and empty runs too, so a slow or broken stage is always visible
+        metrics.record_http(client.stats)
+        metrics.write_report(SYNC_SOURCE, mode="streaming" if STREAMING else "batch")
+
+
+def run():
+    if http_cache.mode == "offline":
+        replay_archive()
+        return
+
+    since = sync_since(SYNC_SOURCE)
+    hwm = HighWaterMark()
+    if STREAMING:
+        report = upsert_tenders(hwm.track(stream_latest_tenders(limit=FETCH_LIMIT, since=since)))
+        if hwm.value is None:
+            print("⚠️ No tenders fetched.")
+            return
+    else:
+        df = fetch_latest_tenders(limit=FETCH_LIMIT, since=since)
+        if df.empty:
+            print("⚠️ No tenders fetched.")
+            return
+        report = insert_into_supabase(df)
+        for published in df["published_date"]:
+            hwm.observe(published)
+    if report.failed:
+        print("⚠️ Some tenders failed; keeping the previous sync high-water mark.")
         return
-    insert_into_supabase(df)
+    save_high_water_mark(SYNC_SOURCE, hwm.value)
+    http_cache.mark_loaded()
+    http_cache.prune()
+    print(f"🌐 HTTP: {client.stats.summary()}")
     print("✅ All tenders inserted successfully!")
 
 
@@ -4,6 +4,7 @@ import pandas as pd
 from datetime import datetime, timezone
 from supabase import create_client
 from dotenv import load_dotenv
+from classifier import classify, detect_region, detect_sector  # noqa: F401 (re-exported)
 
 # ----------------------------------------------------------
 # 1. Load environment variables
@@ -17,43 +18,8 @@ supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
 # ----------------------------------------------------------
 # 2. Helper functions
 # ----------------------------------------------------------
-def detect_region(text):
-    if not text or not isinstance(text, str):
-        return None
-    text_lower = text.lower()
-    if any(x in text_lower for x in ["london", "westminster", "croydon"]):
-        return "London"
-    elif any(x in text_lower for x in ["scotland", "edinburgh", "glasgow"]):
-        return "Scotland"
-    elif any(x in text_lower for x in ["birmingham", "manchester", "leeds", "liverpool", "yorkshire", "midlands"]):
-        return "Midlands & North"
-    elif any(x in text_lower for x in ["bristol", "southampton", "oxford", "cambridge", "kent", "sussex"]):
-        return "South England"
-    elif "wales" in text_lower:
-        return "Wales"
-    elif "northern ireland" in text_lower or "belfast" in text_lower:
-        return "Northern Ireland"
-    else:
-        return "UK (General)"
-
-def detect_sector(text):
-    if not text or not isinstance(text, str):
-        return None
-    text_lower = text.lower()
-    if any(x in text_lower for x in ["software", "it", "technology", "digital"]):
-        return "Information Technology"
-    elif any(x in text_lower for x in ["cleaning", "janitorial", "maintenance", "facilities"]):
-        return "Facilities & Cleaning"
-    elif any(x in text_lower for x in ["construction", "building", "engineering", "civil"]):
-        return "Construction & Engineering"
-    elif any(x in text_lower for x in ["health", "hospital", "nhs", "medical"]):
-        return "Healthcare"
-    elif any(x in text_lower for x in ["education", "school", "university", "college"]):
-        return "Education"
-    elif any(x in text_lower for x in ["transport", "rail", "bus", "airport", "road"]):
-        return "Transport & Infrastructure"
-    else:
-        return "General Public Sector"
+# Region/sector detection lives in classifier.py: the keyword tables are
+# compiled once into a single word-boundary regex and matched in one pass.
 
 # ----------------------------------------------------------
 # 3. Fetch tenders from Contracts Finder API
@@ -112,6 +78,7 @@ def fetch_latest_tenders(limit=50):
         value = tender_info.get("value", {})
         value_amount = value.get("amount")
         currency = value.get("currency", "GBP")
+        region, sector = classify(title + " " + desc)
 
         tender = {
             "id": release.get("ocid"),
@@ -121,8 +88,8 @@ def fetch_latest_tenders(limit=50):
             "deadline": deadline,
             "value_gbp": float(value_amount) if value_amount else 0,
             "currency": currency,
-            "region": detect_region(title + " " + desc),
-            "sector": detect_sector(title + " " + desc),
+            "region": region,
+            "sector": sector,
             "tender_status": tender_info.get("status", "Open"),
             "created_at": datetime.now(timezone.utc).isoformat(),
             "updated_at": datetime.now(timezone.utc).isoformat(),
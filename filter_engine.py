@@ -0,0 +1,163 @@
+import numpy as np
+import pandas as pd
+from datetime import timedelta
+
+# Categorical filter columns, in the order their codes make up a cell id
+CATEGORY_COLUMNS = ["region", "sector", "tender_status"]
+
+
+class FilterEngine:
+    """
+    Indexes one tenders snapshot so every sidebar filter combination is
+    answered without scanning the frame:
+
+    - one packed bitmap per distinct region, sector and status value, OR-ed
+      within a column and AND-ed across columns by mask();
+    - rows ordered by (region, sector, status) cell and then value, with a
+      prefix sum of value_gbp, so the count and total of any set of cells
+      within a value range is two binary searches per cell (metrics and
+      region totals never touch individual rows);
+    - a deadline-sorted row index, so the upcoming-deadline window is a
+      binary search plus a check of only the rows inside it.
+
+    Build it once per snapshot; it never changes the frame.
+    """
+
+    def __init__(self, df: pd.DataFrame, values=None):
+        self.df = df
+        self.n = len(df)
+        values = pd.to_numeric(df["value_gbp"], errors="coerce") if values is None else values
+        self.values = np.asarray(pd.Series(values).fillna(0), dtype="float64")
+
+        # Category codes shifted by one so 0 is "missing" (never matched by a value filter)
+        self.labels = {}
+        self.codes = {}
+        self.bitmaps = {}
+        for col in CATEGORY_COLUMNS:
+            cat = pd.Categorical(df[col])
+            self.labels[col] = list(cat.categories)
+            codes = (np.asarray(cat.codes, dtype="int64") + 1)
+            self.codes[col] = codes
+            self.bitmaps[col] = {
+                label: np.packbits(codes == i + 1) for i, label in enumerate(self.labels[col])
+            }
+        self.sizes = [len(self.labels[col]) + 1 for col in CATEGORY_COLUMNS]
+
+        # Cell id per row, then rows sorted by (cell, value) with a prefix sum of values
+        cells = np.zeros(self.n, dtype="int64")
+        for col, size in zip(CATEGORY_COLUMNS, self.sizes):
+            cells = cells * size + self.codes[col]
+        self.unique_values = np.unique(self.values)
+        ranks = np.searchsorted(self.unique_values, self.values)
+        self.stride = len(self.unique_values) + 1
+        keys = cells * self.stride + ranks
+        order = np.argsort(keys, kind="stable")
+        self.keys = keys[order]
+        self.prefix = np.concatenate([[0.0], np.cumsum(self.values[order])])
+        self.value_order = np.argsort(self.values, kind="stable")
+        self.sorted_values = self.values[self.value_order]
+
+        # Rows with a deadline, soonest first
+        deadlines = pd.to_datetime(df["deadline"], errors="coerce", utc=True)
+        valid = np.flatnonzero(deadlines.notna().to_numpy())
+        stamps = deadlines.dt.tz_localize(None).to_numpy("datetime64[ns]")[valid].view("int64")
+        by_deadline = np.argsort(stamps, kind="stable")
+        self.deadline_rows = valid[by_deadline]
+        self.deadline_ns = stamps[by_deadline]
+
+    # --- selections ---
+    def _selected_codes(self, col, wanted):
+        """Codes (0 = missing included) a column filter keeps; every code when unfiltered."""
+        if not wanted:
+            return np.arange(self.sizes[CATEGORY_COLUMNS.index(col)])
+        index = {label: i + 1 for i, label in enumerate(self.labels[col])}
+        return np.array(sorted(index[v] for v in set(wanted) if v in index), dtype="int64")
+
+    def _wanted(self, filters):
+        return {"region": filters.regions, "sector": filters.sectors, "tender_status": filters.statuses}
+
+    def _cells(self, filters):
+        """Cell ids of every selected (region, sector, status) combination, plus the region code of each."""
+        wanted = self._wanted(filters)
+        grids = np.meshgrid(*[self._selected_codes(col, wanted[col]) for col in CATEGORY_COLUMNS], indexing="ij")
+        cells = np.zeros(grids[0].shape, dtype="int64")
+        for grid, size in zip(grids, self.sizes):
+            cells = cells * size + grid
+        return cells.ravel(), grids[0].ravel()
+
+    def _rank_range(self, filters):
+        lo = 0 if filters.min_value is None else np.searchsorted(self.unique_values, filters.min_value, "left")
+        hi = (len(self.unique_values) if filters.max_value is None
+              else np.searchsorted(self.unique_values, filters.max_value, "right"))
+        return lo, hi
+
+    def _cell_totals(self, filters):
+        """(region code, count, total value) for every selected cell within the value range."""
+        cells, regions = self._cells(filters)
+        lo, hi = self._rank_range(filters)
+        if hi <= lo:
+            zeros = np.zeros(len(cells))
+            return regions, zeros.astype("int64"), zeros
+        start = np.searchsorted(self.keys, cells * self.stride + lo, "left")
+        end = np.searchsorted(self.keys, cells * self.stride + hi, "left")
+        return regions, end - start, self.prefix[end] - self.prefix[start]
+
+    def mask(self, filters) -> np.ndarray:
+        """Boolean row mask for the filters, from the bitmaps and the value-sorted index."""
+        packed = None
+        wanted = self._wanted(filters)
+        for col in CATEGORY_COLUMNS:
+            if not wanted[col]:
+                continue
+            column = np.zeros((self.n + 7) // 8, dtype="uint8")
+            for value in set(wanted[col]):
+                if value in self.bitmaps[col]:
+                    column |= self.bitmaps[col][value]
+            packed = column if packed is None else packed & column
+        mask = (np.ones(self.n, dtype=bool) if packed is None
+                else np.unpackbits(packed, count=self.n).view(bool))
+        if filters.min_value is not None or filters.max_value is not None:
+            lo = 0 if filters.min_value is None else np.searchsorted(self.sorted_values, filters.min_value, "left")
+            hi = (self.n if filters.max_value is None
+                  else np.searchsorted(self.sorted_values, filters.max_value, "right"))
+            in_range = np.zeros(self.n, dtype=bool)
+            in_range[self.value_order[lo:hi]] = True
+            mask &= in_range
+        return mask
+
+    # --- dashboard queries ---
+    def metrics(self, filters) -> dict:
+        _, counts, totals = self._cell_totals(filters)
+        count, total = int(counts.sum()), float(totals.sum())
+        return {"tenders": count, "total_value": total, "avg_value": total / count if count else 0.0}
+
+    def region_totals(self, filters) -> pd.DataFrame:
+        regions, counts, totals = self._cell_totals(filters)
+        size = self.sizes[0]
+        count = np.bincount(regions, weights=counts, minlength=size)[1:]
+        value = np.bincount(regions, weights=totals, minlength=size)[1:]
+        present = np.flatnonzero(count > 0)
+        return pd.DataFrame({
+            "region": [self.labels["region"][i] for i in present],
+            "tenders": count[present].astype("int64"),
+            "value_gbp": value[present],
+        })
+
+    def upcoming_rows(self, filters, now, days=30) -> np.ndarray:
+        """Row positions with a deadline in [now, now + days + 1 days) that pass the filters, soonest first."""
+        start_ns = pd.Timestamp(now).value
+        end_ns = (pd.Timestamp(now) + timedelta(days=days + 1)).value
+        lo, hi = np.searchsorted(self.deadline_ns, [start_ns, end_ns], "left")
+        rows = self.deadline_rows[lo:hi]
+        keep = np.ones(len(rows), dtype=bool)
+        wanted = self._wanted(filters)
+        for col in CATEGORY_COLUMNS:
+            if wanted[col]:
+                allowed = np.zeros(self.sizes[CATEGORY_COLUMNS.index(col)], dtype=bool)
+                allowed[self._selected_codes(col, wanted[col])] = True
+                keep &= allowed[self.codes[col][rows]]
+        if filters.min_value is not None:
+            keep &= self.values[rows] >= filters.min_value
+        if filters.max_value is not None:
+            keep &= self.values[rows] <= filters.max_value
+        return rows[keep]
@@ -0,0 +1,154 @@
+import os
+import gzip
+import json
+import hashlib
+import requests
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urlencode
+
+from ocds_stream import open_dump
+
+CACHE_DIR = os.getenv("HTTP_CACHE_DIR", os.path.join(".cache", "http"))
+# "on": conditional requests against the archive; "offline": never touch the network,
+# replay archived bodies only
+MODE = os.getenv("HTTP_CACHE", "on")
+# Archived responses older than this are pruned at the end of a run
+MAX_AGE_DAYS = float(os.getenv("HTTP_CACHE_MAX_AGE_DAYS", "30"))
+
+
+def cache_key(url: str, params=None) -> str:
+    query = urlencode(sorted((params or {}).items()))
+    return hashlib.sha256(f"{url}?{query}".encode("utf-8")).hexdigest()
+
+
+class CacheEntry:
+    """One archived response: a gzipped body plus its validators and bookkeeping."""
+
+    def __init__(self, directory, key, meta, changed=True):
+        self.key = key
+        self.meta = meta
+        self.changed = changed
+        self.body_path = os.path.join(directory, f"{key}.json.gz")
+        self.meta_path = os.path.join(directory, f"{key}.meta.json")
+
+    @property
+    def skippable(self) -> bool:
+        """Unchanged (304) and already loaded successfully by an earlier run."""
+        return not self.changed and self.meta.get("loaded", False)
+
+    def notices(self):
+        return open_dump(self.body_path)
+
+    def json(self):
+        with gzip.open(self.body_path, "rb") as f:
+            return json.load(f)
+
+
+class HttpCache:
+    """
+    On-disk archive of raw API responses keyed by URL + params, one
+    directory per loader. Revalidates with If-None-Match/If-Modified-Since
+    so unchanged pages come back as a bodiless 304 and need no parsing.
+    """
+
+    def __init__(self, namespace: str, directory=CACHE_DIR, mode=MODE, fetch=requests.get):
+        self.directory = os.path.join(directory, namespace)
+        self.mode = mode
+        self.fetch = fetch
+        self.fetched = []
+
+    def _read_meta(self, key):
+        try:
+            with open(os.path.join(self.directory, f"{key}.meta.json"), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def _write_meta(self, entry):
+        tmp = f"{entry.meta_path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(entry.meta, f, indent=2)
+        os.replace(tmp, entry.meta_path)
+
+    def get(self, url, params=None, headers=None, timeout=30) -> CacheEntry:
+        """
+        Fetches (or revalidates) a URL and returns its archive entry.
+        Raises requests.HTTPError on error statuses, like raise_for_status().
+        """
+        key = cache_key(url, params)
+        meta = self._read_meta(key)
+        os.makedirs(self.directory, exist_ok=True)
+
+        if self.mode == "offline":
+            if meta is None:
+                raise FileNotFoundError(f"Offline mode: no archived response for {url} {params}")
+            return CacheEntry(self.directory, key, meta, changed=False)
+
+        headers = dict(headers or {})
+        if meta:
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+
+        response = self.fetch(url, params=params, headers=headers, timeout=timeout, stream=True)
+        now = datetime.now(timezone.utc).isoformat()
+        if response.status_code == 304 and meta is not None:
+            response.close()
+            entry = CacheEntry(self.directory, key, meta, changed=False)
+            entry.meta["validated_at"] = now
+            self._write_meta(entry)
+            self.fetched.append(entry)
+            return entry
+
+        response.raise_for_status()
+        entry = CacheEntry(self.directory, key, {
+            "url": url,
+            "params": params or {},
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "fetched_at": now,
+            "validated_at": now,
+            "loaded": False,
+        })
+        # Body goes straight from the socket into the gzip file, a chunk at a time
+        tmp = f"{entry.body_path}.tmp"
+        with gzip.open(tmp, "wb") as f:
+            for chunk in response.iter_content(chunk_size=64 * 1024):
+                f.write(chunk)
+        response.close()
+        os.replace(tmp, entry.body_path)
+        entry.meta["bytes"] = os.path.getsize(entry.body_path)
+        self._write_meta(entry)
+        self.fetched.append(entry)
+        return entry
+
+    def entries(self):
+        """All archived entries of this namespace, oldest fetch first (for offline replay)."""
+        if not os.path.isdir(self.directory):
+            return []
+        found = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".meta.json"):
+                key = name[:-len(".meta.json")]
+                meta = self._read_meta(key)
+                if meta is not None:
+                    found.append(CacheEntry(self.directory, key, meta, changed=False))
+        return sorted(found, key=lambda e: e.meta.get("fetched_at", ""))
+
+    def mark_loaded(self):
+        """Records that everything fetched in this run was loaded, so a later 304 can be skipped."""
+        for entry in self.fetched:
+            if not entry.meta.get("loaded"):
+                entry.meta["loaded"] = True
+                self._write_meta(entry)
+        self.fetched = []
+
+    def prune(self, max_age_days=MAX_AGE_DAYS):
+        """Drops archived responses not fetched or revalidated within `max_age_days`."""
+        cutoff = (datetime.now(timezone.utc) - timedelta(days=max_age_days)).isoformat()
+        for entry in self.entries():
+            if entry.meta.get("validated_at", "") < cutoff:
+                for path in (entry.body_path, entry.meta_path):
+                    if os.path.exists(path):
+                        os.remove(path)
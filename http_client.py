@@ -0,0 +1,209 @@
+import os
+import time
+import random
+import threading
+import requests
+from dataclasses import dataclass, field
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from requests.adapters import HTTPAdapter
+
+from bulk_writer import percentile
+
+TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "30"))
+MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "5"))
+# Exponential backoff: base * 2**attempt seconds with full jitter, capped at BACKOFF_MAX
+BACKOFF_BASE = float(os.getenv("HTTP_BACKOFF_BASE", "0.5"))
+BACKOFF_MAX = float(os.getenv("HTTP_BACKOFF_MAX", "30"))
+POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "10"))
+# Consecutive failed requests that open the circuit, and how long it stays open
+BREAKER_THRESHOLD = int(os.getenv("HTTP_BREAKER_THRESHOLD", "5"))
+BREAKER_COOLDOWN = float(os.getenv("HTTP_BREAKER_COOLDOWN", "60"))
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+class CircuitOpenError(requests.RequestException):
+    """Raised without touching the network while the circuit breaker is open."""
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second, at most `burst` banked."""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class CircuitBreaker:
+    """Opens after `threshold` consecutive failures; lets one trial through after `cooldown`."""
+
+    def __init__(self, threshold=BREAKER_THRESHOLD, cooldown=BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at >= self.cooldown:
+                self.opened_at = time.monotonic()  # half-open: one trial per cooldown
+                return True
+            return False
+
+    def record(self, ok: bool):
+        with self.lock:
+            if ok:
+                self.failures = 0
+                self.opened_at = None
+            else:
+                self.failures += 1
+                if self.failures >= self.threshold:
+                    self.opened_at = time.monotonic()
+
+
+@dataclass
+class ClientStats:
+    requests: int = 0
+    retries: int = 0
+    failures: int = 0
+    bytes: int = 0
+    latencies: list = field(default_factory=list)  # seconds to response headers, per attempt
+
+    def summary(self) -> str:
+        return (
+            f"{self.requests} requests, {self.retries} retries, {self.failures} failed, "
+            f"{self.bytes / 1024:,.0f} KiB | latency "
+            f"p50 {percentile(self.latencies, 50) * 1000:.0f}ms, "
+            f"p95 {percentile(self.latencies, 95) * 1000:.0f}ms"
+        )
+
+
+def retry_after_seconds(response):
+    """Parses a Retry-After header (delta-seconds or HTTP-date) into seconds, or None."""
+    value = response.headers.get("Retry-After") if response is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+def pooled_session(pool_size=POOL_SIZE) -> requests.Session:
+    """A keep-alive session holding up to `pool_size` connections per host."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+class FetchClient:
+    """
+    Shared HTTP client for the Contracts Finder loaders: one keep-alive
+    connection pool, a default timeout, retries with jittered exponential
+    backoff (honouring Retry-After on 429/5xx), an optional token-bucket rate
+    limit and a circuit breaker. get() has the requests.get signature.
+    Clients for different APIs can share one connection pool by passing the
+    same `session` (see pooled_session) while keeping their own rate limit,
+    breaker and stats.
+    """
+
+    def __init__(self, limiter=None, timeout=TIMEOUT, max_retries=MAX_RETRIES,
+                 breaker=None, pool_size=POOL_SIZE, session=None):
+        self.session = session or pooled_session(pool_size)
+        self.limiter = limiter
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.breaker = breaker or CircuitBreaker()
+        self.stats = ClientStats()
+        self._lock = threading.Lock()
+
+    def _backoff(self, attempt, response=None) -> float:
+        delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+        retry_after = retry_after_seconds(response)
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, BACKOFF_MAX))
+        return delay
+
+    def _count_bytes(self, response):
+        iter_content = response.iter_content
+
+        def counting(*args, **kwargs):
+            for chunk in iter_content(*args, **kwargs):
+                with self._lock:
+                    self.stats.bytes += len(chunk)
+                yield chunk
+
+        response.iter_content = counting
+
+    def get(self, url, params=None, headers=None, timeout=None, stream=False, **kwargs):
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"Circuit open after repeated failures; skipping {url}")
+
+        with self._lock:
+            self.stats.requests += 1
+        attempt = 0
+        while True:
+            if self.limiter is not None:
+                self.limiter.acquire()
+            started = time.perf_counter()
+            response = error = None
+            try:
+                response = self.session.get(url, params=params, headers=headers,
+                                            timeout=timeout or self.timeout, stream=stream, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+            with self._lock:
+                self.stats.latencies.append(time.perf_counter() - started)
+
+            retryable = error is not None or response.status_code in RETRY_STATUSES
+            if not retryable or attempt >= self.max_retries:
+                break
+            delay = self._backoff(attempt, response)
+            reason = error or f"HTTP {response.status_code}"
+            print(f"🔁 {reason}; retrying in {delay:.1f}s ({attempt + 1}/{self.max_retries})")
+            if response is not None:
+                response.close()
+            with self._lock:
+                self.stats.retries += 1
+            time.sleep(delay)
+            attempt += 1
+
+        ok = error is None and response.status_code < 500 and response.status_code != 429
+        self.breaker.record(ok)
+        if not ok:
+            with self._lock:
+                self.stats.failures += 1
+        if error is not None:
+            raise error
+
+        if stream:
+            self._count_bytes(response)
+        else:
+            with self._lock:
+                self.stats.bytes += len(response.content)
+        return response
@@ -0,0 +1,549 @@
+import os
+import re
+import json
+import time
+import atexit
+import pickle
+import random
+import threading
+from datetime import datetime, timezone
+
+try:
+    from postgrest.exceptions import APIError
+except ImportError:  # same shape as postgrest's, for callers that catch it
+    class APIError(Exception):
+        def __init__(self, error):
+            self.message = error.get("message")
+            super().__init__(self.message)
+
+# Injected cost of every request: fixed round trip, random jitter on top, and per-row work
+LATENCY = float(os.getenv("LOCAL_DB_LATENCY_MS", "0")) / 1000
+JITTER = float(os.getenv("LOCAL_DB_JITTER_MS", "0")) / 1000
+ROW_COST = float(os.getenv("LOCAL_DB_ROW_US", "0")) / 1e6
+# Pickle file the tables are loaded from and saved to at exit ("" = memory only)
+DB_PATH = os.getenv("LOCAL_DB_PATH", "")
+
+_ISO_DATE = re.compile(r"^\d{4}-\d{2}-\d{2}")
+
+
+class LocalResponse:
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+
+# -----------------------
+# Value semantics (SQL-like: NULL never matches a comparison)
+# -----------------------
+def _as_datetime(value):
+    if isinstance(value, datetime):
+        return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+    if isinstance(value, str) and _ISO_DATE.match(value):
+        try:
+            parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            return None
+        return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+    return None
+
+
+def _coerce(value, like):
+    """Converts a filter operand (often a string from or_()) to the type of the stored value."""
+    if isinstance(like, bool):
+        return str(value).lower() == "true" if isinstance(value, str) else bool(value)
+    if isinstance(like, (int, float)):
+        return float(value)
+    if isinstance(like, (dict, list)):
+        return json.loads(value) if isinstance(value, str) else value
+    return value
+
+
+def _compare(stored, operand):
+    """(stored, operand) made comparable: timestamps as datetimes, numbers as floats."""
+    if isinstance(stored, (str, datetime)):
+        left, right = _as_datetime(stored), _as_datetime(operand)
+        if left is not None and right is not None:
+            return left, right
+        return str(stored), str(operand)
+    if isinstance(stored, (int, float)) and not isinstance(stored, bool):
+        return float(stored), float(operand)
+    return stored, _coerce(operand, stored)
+
+
+def _like(pattern, flags=0):
+    parts = [".*" if ch == "%" else "." if ch == "_" else re.escape(ch) for ch in pattern]
+    return re.compile("".join(parts), flags | re.S)
+
+
+def _column_value(row, column):
+    """Row value for a column reference; `col::text` casts like Postgres (json for objects)."""
+    name, _, cast = column.partition("::")
+    value = row.get(name.strip())
+    if cast == "text" and value is not None and not isinstance(value, str):
+        return json.dumps(value, ensure_ascii=False) if isinstance(value, (dict, list)) else str(value)
+    return value
+
+
+def predicate(column, op, operand):
+    """A row -> bool test for one PostgREST filter (op as in `column.op.value`)."""
+    if op == "is":
+        target = {"null": None, "true": True, "false": False}.get(str(operand).lower(), operand)
+        return lambda row: _column_value(row, column) is target if target is None \
+            else _column_value(row, column) == target
+    if op in ("like", "ilike"):
+        regex = _like(str(operand), re.I if op == "ilike" else 0)
+        return lambda row: (v := _column_value(row, column)) is not None and regex.fullmatch(str(v)) is not None
+    if op == "in":
+        values = operand if isinstance(operand, (list, tuple, set)) else _split(str(operand).strip("()"))
+        values = [v.strip('"') if isinstance(v, str) else v for v in values]
+
+        def test_in(row):
+            v = _column_value(row, column)
+            return v is not None and any(a == b for a, b in (_compare(v, x) for x in values))
+        return test_in
+
+    compare = {
+        "eq": lambda a, b: a == b, "neq": lambda a, b: a != b,
+        "gt": lambda a, b: a > b, "gte": lambda a, b: a >= b,
+        "lt": lambda a, b: a < b, "lte": lambda a, b: a <= b,
+    }.get(op)
+    if compare is None:
+        raise APIError({"message": f"Unsupported filter operator: {op}", "code": "PGRST100"})
+    if isinstance(operand, str):
+        operand = operand.strip('"')
+
+    def test(row):
+        v = _column_value(row, column)
+        if v is None:
+            return False
+        try:
+            return compare(*_compare(v, operand))
+        except (TypeError, ValueError):
+            return False
+    return test
+
+
+def _split(text):
+    """Splits on top-level commas, respecting parentheses and double quotes."""
+    parts, depth, quoted, current = [], 0, False, []
+    for ch in text:
+        if ch == '"':
+            quoted = not quoted
+        elif not quoted and ch == "(":
+            depth += 1
+        elif not quoted and ch == ")":
+            depth -= 1
+        if ch == "," and depth == 0 and not quoted:
+            parts.append("".join(current))
+            current = []
+        else:
+            current.append(ch)
+    if current:
+        parts.append("".join(current))
+    return [p.strip() for p in parts if p.strip()]
+
+
+def parse_logic(text):
+    """Parses a PostgREST logic string (the argument of or_(), with nested and()/or()/not.) into a predicate."""
+    text = text.strip()
+    if text.startswith("(") and text.endswith(")"):
+        text = text[1:-1]
+    tests = [_parse_term(term) for term in _split(text)]
+    return lambda row: any(t(row) for t in tests)
+
+
+def _parse_term(term):
+    negate = term.startswith("not.")
+    if negate:
+        term = term[4:]
+    for group, combine in (("and(", all), ("or(", any)):
+        if term.startswith(group) and term.endswith(")"):
+            tests = [_parse_term(t) for t in _split(term[len(group):-1])]
+            test = (lambda ts, c: lambda row: c(t(row) for t in ts))(tests, combine)
+            break
+    else:
+        column, op, operand = term.split(".", 2)
+        if op == "not":
+            op, operand = operand.split(".", 1)
+            negate = not negate
+        test = predicate(column, op, operand)
+    return (lambda row: not test(row)) if negate else test
+
+
+# -----------------------
+# Query builder
+# -----------------------
+class LocalQuery:
+    """The subset of postgrest's request builders the app uses, evaluated against a LocalClient table."""
+
+    def __init__(self, client, table, op="select", payload=None, **options):
+        self.client = client
+        self.table = table
+        self.op = op
+        self.payload = payload
+        self.options = options
+        self.columns = None
+        self.count = options.get("count")
+        self.filters = []
+        self.orders = []
+        self.limit_rows = None
+        self.offset = 0
+        self._negate = False
+
+    # --- filters ---
+    def _add(self, test):
+        if self._negate:
+            self._negate = False
+            self.filters.append(lambda row: not test(row))
+        else:
+            self.filters.append(test)
+        return self
+
+    @property
+    def not_(self):
+        self._negate = True
+        return self
+
+    def filter(self, column, operator, criteria):
+        return self._add(predicate(column, operator, criteria))
+
+    def eq(self, column, value):
+        return self._add(predicate(column, "eq", value))
+
+    def neq(self, column, value):
+        return self._add(predicate(column, "neq", value))
+
+    def gt(self, column, value):
+        return self._add(predicate(column, "gt", value))
+
+    def gte(self, column, value):
+        return self._add(predicate(column, "gte", value))
+
+    def lt(self, column, value):
+        return self._add(predicate(column, "lt", value))
+
+    def lte(self, column, value):
+        return self._add(predicate(column, "lte", value))
+
+    def like(self, column, pattern):
+        return self._add(predicate(column, "like", pattern))
+
+    def ilike(self, column, pattern):
+        return self._add(predicate(column, "ilike", pattern))
+
+    def is_(self, column, value):
+        return self._add(predicate(column, "is", "null" if value is None else value))
+
+    def in_(self, column, values):
+        return self._add(predicate(column, "in", list(values)))
+
+    def or_(self, filters, reference_table=None):
+        return self._add(parse_logic(filters))
+
+    # --- shaping ---
+    def order(self, column, *, desc=False, nullsfirst=None, foreign_table=None):
+        self.orders.append((column, desc, desc if nullsfirst is None else nullsfirst))
+        return self
+
+    def limit(self, size, *, foreign_table=None):
+        self.limit_rows = size
+        return self
+
+    def range(self, start, end, foreign_table=None):
+        self.offset = start
+        self.limit_rows = end - start + 1
+        return self
+
+    def execute(self) -> LocalResponse:
+        return self.client._execute(self)
+
+
+class LocalTable:
+    def __init__(self, client, name):
+        self.client = client
+        self.name = name
+
+    def select(self, *columns, count=None, head=None):
+        query = LocalQuery(self.client, self.name, count=count)
+        names = [c.strip() for col in columns for c in col.split(",") if c.strip()]
+        query.columns = None if not names or "*" in names else names
+        return query
+
+    def insert(self, json, *, count=None, returning=None, upsert=False, default_to_null=True):
+        return LocalQuery(self.client, self.name, "upsert" if upsert else "insert", json,
+                          count=count, on_conflict="", default_to_null=default_to_null)
+
+    def upsert(self, json, *, count=None, returning=None, ignore_duplicates=False, on_conflict="",
+               default_to_null=True):
+        return LocalQuery(self.client, self.name, "upsert", json, count=count, on_conflict=on_conflict,
+                          ignore_duplicates=ignore_duplicates, default_to_null=default_to_null)
+
+    def update(self, json, *, count=None, returning=None):
+        return LocalQuery(self.client, self.name, "update", json, count=count)
+
+    def delete(self, *, count=None, returning=None):
+        return LocalQuery(self.client, self.name, "delete", count=count)
+
+
+class LocalRpc:
+    def __init__(self, client, name, params):
+        self.client = client
+        self.name = name
+        self.params = params or {}
+
+    def execute(self) -> LocalResponse:
+        fn = self.client.functions.get(self.name)
+        if fn is None:
+            raise APIError({"message": f"Could not find the function {self.name}", "code": "PGRST202"})
+        self.client._delay(0)
+        with self.client.lock:
+            data = fn(self.client.rows(), **self.params)
+        return LocalResponse(data)
+
+
+# -----------------------
+# Dashboard RPCs (mirror sql/dashboard_functions.sql)
+# -----------------------
+def _rpc_filter(rows, p_regions=None, p_sectors=None, p_statuses=None, p_min_value=None, p_max_value=None):
+    for row in rows:
+        value = float(row.get("value_gbp") or 0)
+        if p_regions and row.get("region") not in p_regions:
+            continue
+        if p_sectors and row.get("sector") not in p_sectors:
+            continue
+        if p_statuses and row.get("tender_status") not in p_statuses:
+            continue
+        if p_min_value is not None and value < p_min_value:
+            continue
+        if p_max_value is not None and value > p_max_value:
+            continue
+        yield row, value
+
+
+def _canonical_tenders(tables):
+    """Tenders without the ones tender_entities marks as near-duplicates."""
+    duplicates = {r["tender_id"] for r in tables.get("tender_entities", []) if r.get("duplicate")}
+    return [r for r in tables.get("tenders", []) if r.get("tender_id") not in duplicates]
+
+
+def tender_filter_options(tables):
+    rows = tables.get("tenders", [])
+    out = []
+    for kind in ("region", "sector", "tender_status"):
+        out += [{"kind": kind, "value": v} for v in sorted({r.get(kind) for r in rows} - {None})]
+    top = max((float(r["value_gbp"]) for r in rows if r.get("value_gbp") is not None), default=0)
+    out.append({"kind": "max_value", "value": str(top)})
+    return out
+
+
+def tender_metrics(tables, **params):
+    values = [v for _, v in _rpc_filter(_canonical_tenders(tables), **params)]
+    return [{"tenders": len(values), "total_value": sum(values),
+             "avg_value": sum(values) / len(values) if values else 0}]
+
+
+def tender_region_totals(tables, **params):
+    totals = {}
+    for row, value in _rpc_filter(_canonical_tenders(tables), **params):
+        if row.get("region") is not None:
+            count, total = totals.get(row["region"], (0, 0.0))
+            totals[row["region"]] = (count + 1, total + value)
+    return [{"region": r, "tenders": c, "value_gbp": t} for r, (c, t) in sorted(totals.items())]
+
+
+def buyer_totals(tables, p_limit=20, **params):
+    buyer_key = {r["tender_id"]: r.get("buyer_key") for r in tables.get("tender_entities", [])}
+    aliases = {r["buyer_key"]: r for r in tables.get("buyer_aliases", [])}
+    totals = {}
+    for row, value in _rpc_filter(_canonical_tenders(tables), **params):
+        alias = aliases.get(buyer_key.get(row.get("tender_id")))
+        if alias is not None:
+            name, count, total = totals.get(alias["buyer_id"], (alias.get("buyer_name"), 0, 0.0))
+            totals[alias["buyer_id"]] = (name, count + 1, total + value)
+    out = [{"buyer_id": b, "buyer_name": n, "tenders": c, "value_gbp": t} for b, (n, c, t) in totals.items()]
+    return sorted(out, key=lambda r: (-r["value_gbp"], r["buyer_id"]))[:p_limit]
+
+
+DEFAULT_FUNCTIONS = {
+    "tender_filter_options": tender_filter_options,
+    "tender_metrics": tender_metrics,
+    "tender_region_totals": tender_region_totals,
+    "buyer_totals": buyer_totals,
+}
+
+
+# -----------------------
+# Client
+# -----------------------
+def _sort_key(value):
+    dt = _as_datetime(value)
+    if dt is not None:
+        return (1, dt.timestamp())
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return (1, float(value))
+    return (2, str(value))
+
+
+class LocalClient:
+    """
+    In-process stand-in for the Supabase client with PostgREST semantics:
+    table().select/insert/upsert/update/delete with eq/neq/gt/gte/lt/lte/
+    like/ilike/is_/in_/not_/or_ filters, order/limit/range, count="exact",
+    and rpc() for the dashboard functions. Every request sleeps `latency`
+    (+ up to `jitter`, + `row_cost` per row) so batch sizes and concurrency
+    can be load-tested reproducibly. Identity "id" columns are assigned on
+    insert, like the real tenders table.
+    """
+
+    def __init__(self, path=DB_PATH, latency=LATENCY, jitter=JITTER, row_cost=ROW_COST, seed=None):
+        self.path = path
+        self.latency = latency
+        self.jitter = jitter
+        self.row_cost = row_cost
+        self.functions = dict(DEFAULT_FUNCTIONS)
+        self.lock = threading.RLock()
+        self.requests = 0
+        self._random = random.Random(seed)
+        self._tables = {}     # name -> list of row dicts
+        self._indexes = {}    # (name, conflict columns) -> {key: row}
+        self._next_id = {}
+        if path and os.path.exists(path):
+            with open(path, "rb") as f:
+                self._tables, self._next_id = pickle.load(f)
+
+    def table(self, name) -> LocalTable:
+        return LocalTable(self, name)
+
+    from_ = table
+
+    def rpc(self, name, params=None):
+        return LocalRpc(self, name, params)
+
+    def rows(self):
+        return self._tables
+
+    def save(self, path=None):
+        path = path or self.path
+        if not path:
+            return
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self.lock:
+            tmp = f"{path}.tmp"
+            with open(tmp, "wb") as f:
+                pickle.dump((self._tables, self._next_id), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, path)
+
+    def _delay(self, rows):
+        delay = self.latency + self.row_cost * rows
+        if self.jitter:
+            delay += self._random.uniform(0, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+        with self.lock:
+            self.requests += 1
+
+    def _index(self, table, columns):
+        key = (table, columns)
+        index = self._indexes.get(key)
+        if index is None:
+            index = self._indexes[key] = {
+                tuple(r.get(c) for c in columns): r for r in self._tables.get(table, [])
+            }
+        return index
+
+    def _matches(self, query):
+        rows = self._tables.get(query.table, [])
+        return [r for r in rows if all(test(r) for test in query.filters)]
+
+    def _execute(self, query) -> LocalResponse:
+        payload = query.payload
+        if isinstance(payload, dict):
+            payload = [payload]
+        self._delay(len(payload or ()))
+        with self.lock:
+            handler = getattr(self, f"_{query.op}")
+            data, count = handler(query, payload)
+        return LocalResponse(data, count if query.count else None)
+
+    def _select(self, query, _):
+        rows = self._matches(query)
+        count = len(rows)
+        for column, desc, nulls_first in reversed(query.orders):
+            present = [r for r in rows if r.get(column) is not None]
+            missing = [r for r in rows if r.get(column) is None]
+            present.sort(key=lambda r: _sort_key(r[column]), reverse=desc)
+            rows = missing + present if nulls_first else present + missing
+        end = None if query.limit_rows is None else query.offset + query.limit_rows
+        rows = rows[query.offset:end]
+        if query.columns is not None:
+            rows = [{c: r.get(c) for c in query.columns} for r in rows]
+        else:
+            rows = [dict(r) for r in rows]
+        return rows, count
+
+    def _insert(self, query, payload, on_conflict=None):
+        table = self._tables.setdefault(query.table, [])
+        # Like PostgREST bulk inserts: every row gets the union of the payload's columns
+        columns = list(dict.fromkeys(c for row in payload for c in row))
+        conflict = tuple(c.strip() for c in (on_conflict or "id").split(","))
+        index = self._index(query.table, conflict)
+        written = []
+        for incoming in payload:
+            row = {c: incoming.get(c) for c in columns} if query.options.get("default_to_null", True) \
+                else dict(incoming)
+            if "id" in conflict and row.get("id") is None:
+                row.pop("id", None)
+            key = tuple(row.get(c) for c in conflict)
+            existing = index.get(key) if all(k is not None for k in key) else None
+            if existing is not None:
+                if on_conflict is None:
+                    raise APIError({"message": f"duplicate key value violates unique constraint on {conflict}",
+                                    "code": "23505"})
+                if not query.options.get("ignore_duplicates"):
+                    existing.update(row)
+                written.append(dict(existing))
+                continue
+            if row.get("id") is None:
+                self._next_id[query.table] = self._next_id.get(query.table, 0) + 1
+                row["id"] = self._next_id[query.table]
+            table.append(row)
+            for (name, cols), idx in self._indexes.items():
+                if name == query.table:
+                    idx[tuple(row.get(c) for c in cols)] = row
+            written.append(dict(row))
+        return written, len(written)
+
+    def _upsert(self, query, payload):
+        return self._insert(query, payload, on_conflict=query.options.get("on_conflict") or "id")
+
+    def _update(self, query, payload):
+        changes = payload[0] if payload else {}
+        rows = self._matches(query)
+        for row in rows:
+            row.update(changes)
+        self._indexes = {k: v for k, v in self._indexes.items() if k[0] != query.table}
+        return [dict(r) for r in rows], len(rows)
+
+    def _delete(self, query, _):
+        doomed = {id(r) for r in self._matches(query)}
+        kept, removed = [], []
+        for row in self._tables.get(query.table, []):
+            (removed if id(row) in doomed else kept).append(row)
+        self._tables[query.table] = kept
+        self._indexes = {k: v for k, v in self._indexes.items() if k[0] != query.table}
+        return removed, len(removed)
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def shared_client() -> LocalClient:
+    """The process-wide LocalClient configured from LOCAL_DB_* (saved to LOCAL_DB_PATH at exit)."""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = LocalClient()
+            if _shared.path:
+                atexit.register(_shared.save)
+        return _shared
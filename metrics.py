@@ -0,0 +1,281 @@
+import os
+import sys
+import json
+import time
+import random
+import threading
+import functools
+from datetime import datetime, timezone
+
+from bulk_writer import percentile
+
+# Run reports land here as <source>-<timestamp>.json plus <source>-latest.json
+METRICS_DIR = os.getenv("METRICS_DIR", os.path.join(".cache", "metrics"))
+# Timestamped reports kept per source (older ones are pruned)
+KEEP_REPORTS = int(os.getenv("METRICS_KEEP", "60"))
+# Optional node_exporter textfile-collector path, e.g. /var/lib/node_exporter/cleanintel.prom
+PROMETHEUS_TEXTFILE = os.getenv("METRICS_TEXTFILE", "")
+# A stage this many times slower than in the previous run is flagged in the log
+REGRESSION_RATIO = float(os.getenv("METRICS_REGRESSION_RATIO", "1.5"))
+
+# Histograms keep exact count/sum/max and a uniform sample of this many values for percentiles
+SAMPLE_SIZE = 4096
+
+
+class Histogram:
+    def __init__(self):
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self.samples = []
+        self._random = random.Random(0)
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+        if len(self.samples) < SAMPLE_SIZE:
+            self.samples.append(value)
+        else:
+            # Reservoir sampling: every observation is equally likely to be kept
+            slot = self._random.randrange(self.count)
+            if slot < SAMPLE_SIZE:
+                self.samples[slot] = value
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "p50": round(percentile(self.samples, 50), 6),
+            "p95": round(percentile(self.samples, 95), 6),
+            "max": round(self.max, 6),
+        }
+
+
+class Metrics:
+    """Thread-safe counters, gauges and histograms for one loader run."""
+
+    def __init__(self):
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self.started = time.time()
+        self._lock = threading.Lock()
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def gauge(self, name, value):
+        with self._lock:
+            self.gauges[name] = value
+
+    def observe(self, name, value):
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(value)
+
+    def timer(self, name):
+        return timer(name, self)
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.gauges.clear()
+            self.histograms.clear()
+            self.started = time.time()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "counters": dict(self.counters),
+                "gauges": dict(self.gauges),
+                "histograms": {name: h.summary() for name, h in self.histograms.items()},
+            }
+
+
+# The process-wide registry the loaders record into
+registry = Metrics()
+
+
+class timer:
+    """
+    Times a block into the `<name>_seconds` histogram, as a context manager
+    (`with timer("fetch"):`) or a decorator (`@timer("fetch")`). Time spent
+    in blocks that raise is recorded too, and counted in `<name>_errors`.
+    """
+
+    def __init__(self, name, metrics=None):
+        self.name = name
+        self.metrics = metrics or registry
+        self.elapsed = 0.0
+        self._started = None
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.elapsed = time.perf_counter() - self._started
+        self.metrics.observe(f"{self.name}_seconds", self.elapsed)
+        if exc_type is not None:
+            self.metrics.count(f"{self.name}_errors")
+
+    def __call__(self, func):
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            with timer(self.name, self.metrics):
+                return func(*args, **kwargs)
+        return timed
+
+
+def count(name, n=1):
+    registry.count(name, n)
+
+
+def gauge(name, value):
+    registry.gauge(name, value)
+
+
+def observe(name, value):
+    registry.observe(name, value)
+
+
+def peak_rss_bytes() -> int:
+    """Peak resident set size of this process (0 where the resource module is unavailable)."""
+    try:
+        import resource
+    except ImportError:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024  # macOS reports bytes, Linux KiB
+
+
+# -----------------------
+# Run report
+# -----------------------
+def record_http(stats, prefix="http"):
+    """Copies a FetchClient's ClientStats into the registry."""
+    for name in ("requests", "retries", "failures", "bytes"):
+        registry.gauge(f"{prefix}_{name}", getattr(stats, name))
+    for latency in list(stats.latencies):
+        registry.observe(f"{prefix}_request_seconds", latency)
+
+
+def record_writes(report, prefix="upsert"):
+    """Copies a BulkWriter WriteReport into the registry."""
+    registry.gauge(f"{prefix}_rows_written", report.written)
+    registry.gauge(f"{prefix}_rows_failed", len(report.failed))
+    registry.gauge(f"{prefix}_batches", report.batches)
+    registry.gauge(f"{prefix}_rows_per_sec", round(report.rows_per_sec, 1))
+    for latency in report.batch_latencies:
+        registry.observe(f"{prefix}_seconds", latency)
+
+
+def build_report(source, metrics=None, **extra) -> dict:
+    metrics = metrics or registry
+    finished = time.time()
+    return {
+        "source": source,
+        "started_at": datetime.fromtimestamp(metrics.started, timezone.utc).isoformat(),
+        "finished_at": datetime.fromtimestamp(finished, timezone.utc).isoformat(),
+        "duration_seconds": round(finished - metrics.started, 3),
+        "peak_rss_bytes": peak_rss_bytes(),
+        **extra,
+        **metrics.snapshot(),
+    }
+
+
+def _write_json(path, payload):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(payload, f, indent=2, default=str)
+    os.replace(tmp, path)
+
+
+def previous_report(source, directory=METRICS_DIR):
+    try:
+        with open(os.path.join(directory, f"{source}-latest.json"), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def regressions(report, previous, ratio=REGRESSION_RATIO) -> list:
+    """(histogram, before, after) for every timer whose total time grew by more than `ratio`."""
+    if not previous:
+        return []
+    slower = []
+    before_all = previous.get("histograms", {})
+    for name, after in report.get("histograms", {}).items():
+        before = before_all.get(name)
+        if not name.endswith("_seconds") or not before or before.get("sum", 0) < 0.01:
+            continue
+        if after["sum"] > before["sum"] * ratio:
+            slower.append((name, before["sum"], after["sum"]))
+    return slower
+
+
+def prometheus_text(report) -> str:
+    """The report in Prometheus exposition format (histograms become summaries)."""
+    labels = f'source="{report["source"]}"'
+    lines = [
+        f"cleanintel_run_duration_seconds{{{labels}}} {report['duration_seconds']}",
+        f"cleanintel_run_peak_rss_bytes{{{labels}}} {report['peak_rss_bytes']}",
+        f"cleanintel_run_finished_timestamp_seconds{{{labels}}} {time.time():.0f}",
+    ]
+    for name, value in sorted(report["counters"].items()):
+        lines.append(f"# TYPE cleanintel_{name}_total counter")
+        lines.append(f"cleanintel_{name}_total{{{labels}}} {value}")
+    for name, value in sorted(report["gauges"].items()):
+        if isinstance(value, (int, float)):
+            lines.append(f"# TYPE cleanintel_{name} gauge")
+            lines.append(f"cleanintel_{name}{{{labels}}} {value}")
+    for name, h in sorted(report["histograms"].items()):
+        lines.append(f"# TYPE cleanintel_{name} summary")
+        lines.append(f'cleanintel_{name}{{{labels},quantile="0.5"}} {h["p50"]}')
+        lines.append(f'cleanintel_{name}{{{labels},quantile="0.95"}} {h["p95"]}')
+        lines.append(f"cleanintel_{name}_sum{{{labels}}} {h['sum']}")
+        lines.append(f"cleanintel_{name}_count{{{labels}}} {h['count']}")
+    return "\n".join(lines) + "\n"
+
+
+def _prune(source, directory):
+    runs = sorted(f for f in os.listdir(directory)
+                  if f.startswith(f"{source}-") and f.endswith(".json") and not f.endswith("-latest.json"))
+    for name in runs[:-KEEP_REPORTS] if KEEP_REPORTS > 0 else []:
+        os.remove(os.path.join(directory, name))
+
+
+def write_report(source, directory=METRICS_DIR, textfile=PROMETHEUS_TEXTFILE, **extra) -> dict:
+    """
+    Writes the run report for `source` (JSON under `directory`, and the
+    Prometheus textfile when configured), prints a per-stage summary and
+    flags stages that got slower than in the previous run.
+    """
+    report = build_report(source, **extra)
+    previous = previous_report(source, directory)
+    try:
+        os.makedirs(directory, exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        _write_json(os.path.join(directory, f"{source}-{stamp}.json"), report)
+        _write_json(os.path.join(directory, f"{source}-latest.json"), report)
+        _prune(source, directory)
+        if textfile:
+            tmp = f"{textfile}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(prometheus_text(report))
+            os.replace(tmp, textfile)
+    except OSError as e:
+        print(f"⚠️ Could not write the run report: {e}")
+
+    for name, h in sorted(report["histograms"].items(), key=lambda kv: -kv[1]["sum"]):
+        if name.endswith("_seconds"):
+            print(f"📊 {name[:-8]:<18} {h['sum']:8.2f}s over {h['count']:>7,} | "
+                  f"p50 {h['p50'] * 1000:.1f}ms p95 {h['p95'] * 1000:.1f}ms")
+    for name, before, after in regressions(report, previous):
+        print(f"🐢 {name[:-8]} took {after:.2f}s, up from {before:.2f}s in the previous run")
+    print(f"📊 Run report: {report['duration_seconds']:.1f}s, peak RSS {report['peak_rss_bytes'] / 2**20:,.0f} MiB")
+    return report
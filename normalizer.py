@@ -0,0 +1,160 @@
+from itertools import islice
+from datetime import datetime, timezone
+
+import pandas as pd
+
+from bulk_writer import chunked
+from classifier import classify_many
+
+# Column order of the tender dicts fetch_tenders.iter_tenders yields
+TENDER_COLUMNS = [
+    "tender_id", "title", "description", "published_date", "deadline", "value_gbp", "currency",
+    "region", "sector", "tender_status", "created_at", "updated_at",
+]
+
+
+def utc_times(values) -> pd.Series:
+    """sync_state.parse_ts for a whole column: aware UTC timestamps, NaT where unparseable."""
+    series = pd.Series([v if isinstance(v, str) and v else None for v in values], dtype=object)
+    return pd.to_datetime(series, format="ISO8601", utc=True, errors="coerce")
+
+
+def _iso(raw):
+    if not raw:
+        return None
+    try:
+        return datetime.fromisoformat(raw.replace("Z", "+00:00")).isoformat()
+    except (TypeError, ValueError, AttributeError):
+        return None
+
+
+def iso_timestamps(values) -> list:
+    """
+    Round-trips ISO 8601 strings through fromisoformat/isoformat, the way
+    fetch_contracts_finder.normalize does: invalid or empty values become None.
+    The output has to be the exact strings the per-row path produces, and the
+    C fromisoformat beats a to_datetime + string-formatting pass at that
+    (about 3.4 vs 7.6 ms per 1,000 dates), so this stays a comprehension.
+    """
+    return [_iso(v) for v in values]
+
+
+# -----------------------
+# Contracts Finder OCDS releases (fetch_tenders)
+# -----------------------
+def _releases(notices, limit=None):
+    records = notices if limit is None else islice(notices, limit)
+    return [n.get("releases", [n])[0] for n in records]
+
+
+def tender_columns(releases, since=None, now=None) -> dict:
+    """
+    Column-wise counterpart of fetch_tenders.iter_tenders for a page of
+    releases: every field is pulled out in one pass per column, the `since`
+    cut-off and amounts are vectorized, classification runs in one batch and
+    the created_at/updated_at stamp is taken once. Values are the same Python
+    objects iter_tenders would put in each dict.
+    """
+    published = [r.get("date", None) for r in releases]
+    if since is not None and releases:
+        # Results are newest-first: everything from the first older notice on was already loaded
+        older = (utc_times(published) < pd.Timestamp(since)).to_numpy().nonzero()[0]
+        if len(older):
+            releases, published = releases[:older[0]], published[:older[0]]
+
+    tenders = [r.get("tender", {}) for r in releases]
+    values = [t.get("value", {}) for t in tenders]
+    titles = [t.get("title", "No title") for t in tenders]
+    descriptions = [t.get("description", "") for t in tenders]
+    amounts = [v.get("amount") for v in values]
+    numeric = pd.to_numeric(pd.Series(amounts, dtype=object), errors="coerce").fillna(0).astype(float).tolist()
+    labels = classify_many([(a or "") + " " + (b or "") for a, b in zip(titles, descriptions)])
+    stamp = (now or datetime.now(timezone.utc)).isoformat()
+
+    return {
+        "tender_id": [r.get("ocid") for r in releases],
+        "title": titles,
+        "description": descriptions,
+        "published_date": published,
+        "deadline": [t.get("tenderPeriod", {}).get("endDate", None) for t in tenders],
+        # A missing or zero amount stays the int 0, like the per-row path (it feeds the change hash)
+        "value_gbp": [n if a else 0 for a, n in zip(amounts, numeric)],
+        "currency": [v.get("currency", "GBP") for v in values],
+        "region": [label[0] for label in labels],
+        "sector": [label[1] for label in labels],
+        "tender_status": [t.get("status", "Open") for t in tenders],
+        "created_at": [stamp] * len(releases),
+        "updated_at": [stamp] * len(releases),
+    }
+
+
+def tenders_frame(notices, limit=None, since=None, now=None) -> pd.DataFrame:
+    """A page of OCDS records/releases as the DataFrame fetch_latest_tenders builds, in one batch."""
+    columns = tender_columns(_releases(notices, limit), since, now)
+    if not columns["tender_id"]:
+        return pd.DataFrame()
+    return pd.DataFrame(columns, columns=TENDER_COLUMNS)
+
+
+def iter_tender_batches(notices, batch_size, limit=None, since=None):
+    """
+    Streaming counterpart of tenders_frame: reads `batch_size` notices at a
+    time and yields each batch as a list of tender dicts, stopping (without
+    reading further) once a batch reaches notices older than `since`.
+    """
+    records = notices if limit is None else islice(notices, limit)
+    for batch in chunked(records, batch_size):
+        releases = _releases(batch)
+        columns = tender_columns(releases, since)
+        rows = [dict(zip(TENDER_COLUMNS, row)) for row in zip(*(columns[c] for c in TENDER_COLUMNS))]
+        if rows:
+            yield rows
+        if len(rows) < len(releases):
+            return
+
+
+# -----------------------
+# Contracts Finder flat notices (scripts/fetch_contracts_finder.py)
+# -----------------------
+def _field(rows, *path):
+    """fetch_contracts_finder._get for one path across all rows."""
+    out = []
+    for d in rows:
+        for p in path:
+            d = d.get(p) if isinstance(d, dict) else None
+            if d is None:
+                break
+        out.append(d)
+    return out
+
+
+def normalize_notices(rows) -> list:
+    """
+    fetch_contracts_finder.normalize for a whole page: the same dicts, built
+    column by column with the publish dates converted in one batch and one
+    updated_at stamp for the page.
+    """
+    rows = list(rows)
+    stamp = datetime.now(timezone.utc).isoformat()
+    ids, ocids = _field(rows, "id"), _field(rows, "ocid")
+    titles = _field(rows, "title")
+    buyers = zip(_field(rows, "buyer", "name"), _field(rows, "buyer", "id"),
+                 _field(rows, "buyer", "contactPoint"))
+    amounts = [v.get("amount") if isinstance(v, dict) else None for v in _field(rows, "value")]
+    return [
+        {
+            "tender_id": tender_id or ocid,
+            "title": (title or "").strip(),
+            "description": description,
+            "buyer": {"name": name, "id": buyer_id, "contactPoint": contact},
+            "sector": sector,
+            "value_normalized": amount,
+            "value_gbp": amount,
+            "published_date": published,
+            "updated_at": stamp,
+        }
+        for tender_id, ocid, title, description, (name, buyer_id, contact), sector, amount, published in zip(
+            ids, ocids, titles, _field(rows, "description"), buyers,
+            _field(rows, "mainProcurementCategory"), amounts, iso_timestamps(_field(rows, "publishedDate")),
+        )
+    ]
@@ -0,0 +1,77 @@
+import gzip
+import json
+
+try:
+    import ijson
+except ImportError:  # optional: without it the whole body is parsed at once
+    ijson = None
+
+# Arrays that hold the notices in Contracts Finder search responses and OCDS packages
+NOTICE_KEYS = ("records", "releases", "items")
+
+
+class StreamedNotices:
+    """
+    Iterates the notices of a JSON response body one object at a time, so
+    peak memory is one notice rather than the whole page. Top-level scalars
+    (e.g. totalPages) are collected into `meta` as they are passed; read it
+    after iteration, since they may come after the notice array.
+    """
+
+    def __init__(self, stream, close=None):
+        self.stream = stream
+        self.meta = {}
+        self.count = 0
+        self._close = close
+
+    def __iter__(self):
+        try:
+            if ijson is None:
+                yield from self._iter_parsed()
+            else:
+                yield from self._iter_streamed()
+        finally:
+            if self._close is not None:
+                self._close()
+
+    def _iter_parsed(self):
+        data = json.load(self.stream)
+        self.meta = {k: v for k, v in data.items() if not isinstance(v, (list, dict))}
+        for key in NOTICE_KEYS:
+            if data.get(key):
+                for notice in data[key]:
+                    self.count += 1
+                    yield notice
+                return
+
+    def _iter_streamed(self):
+        builder = None
+        array = None  # which NOTICE_KEYS array the stream settled on
+        for prefix, event, value in ijson.parse(self.stream, use_float=True):
+            if builder is not None:
+                if prefix == f"{array}.item" and event == "end_map":
+                    self.count += 1
+                    yield builder.value
+                    builder = None
+                else:
+                    builder.event(event, value)
+            elif event == "start_map" and prefix.endswith(".item"):
+                key = prefix[:-len(".item")]
+                if key in NOTICE_KEYS and array in (None, key):
+                    array = key
+                    builder = ijson.ObjectBuilder()
+                    builder.event(event, value)
+            elif "." not in prefix and event in ("number", "string", "boolean", "null"):
+                self.meta[prefix] = value
+
+
+def stream_response(response) -> StreamedNotices:
+    """Wraps a `requests` response opened with stream=True."""
+    response.raw.decode_content = True
+    return StreamedNotices(response.raw, close=response.close)
+
+
+def open_dump(path) -> StreamedNotices:
+    """Streams notices from an archived response body on disk (.json or .json.gz)."""
+    f = gzip.open(path, "rb") if str(path).endswith(".gz") else open(path, "rb")
+    return StreamedNotices(f, close=f.close)
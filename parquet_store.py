@@ -0,0 +1,188 @@
+import os
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:  # optional: the loaders run without it, the snapshot is just not written
+    pa = None
+
+from search_index import extract_buyer_name
+
+DATASET_DIR = os.getenv("PARQUET_DIR", os.path.join(".cache", "parquet", "tenders"))
+# Set PARQUET_SNAPSHOT=off to stop the loaders writing the dataset
+ENABLED = pa is not None and os.getenv("PARQUET_SNAPSHOT", "on") != "off"
+# Buffered rows that trigger a rewrite of the affected partitions during a load
+FLUSH_ROWS = int(os.getenv("PARQUET_FLUSH_ROWS", "50000"))
+
+PARTITION = "published_month"
+UNKNOWN_MONTH = "unknown"
+if pa is not None:
+    _TS = pa.timestamp("us", tz="UTC")
+    _CAT = pa.dictionary(pa.int32(), pa.string())
+    SCHEMA = pa.schema([
+        ("tender_id", pa.string()),
+        ("title", pa.string()),
+        ("description", pa.string()),
+        ("buyer_name", pa.string()),
+        ("published_date", _TS),
+        ("deadline", _TS),
+        ("value_gbp", pa.float32()),
+        ("currency", _CAT),
+        ("region", _CAT),
+        ("sector", _CAT),
+        ("tender_status", _CAT),
+        ("updated_at", _TS),
+    ])
+    COLUMNS = SCHEMA.names
+    DATETIME_COLUMNS = [f.name for f in SCHEMA if f.type == _TS]
+
+
+def _frame(records) -> pd.DataFrame:
+    """Loader records -> dataset columns. Only columns the records carry are kept (see ParquetStore.flush)."""
+    df = pd.DataFrame.from_records(records)
+    if "buyer" in df.columns:
+        df["buyer_name"] = df.pop("buyer").map(extract_buyer_name)
+    df = df[[c for c in COLUMNS if c in df.columns]]
+    for col in DATETIME_COLUMNS:
+        if col in df.columns:
+            df[col] = pd.to_datetime(df[col], errors="coerce", utc=True, format="ISO8601")
+    if "value_gbp" in df.columns:
+        df["value_gbp"] = pd.to_numeric(df["value_gbp"], errors="coerce")
+    return df.astype(object).where(df.notna(), None)
+
+
+def _months(df: pd.DataFrame) -> pd.Series:
+    if "published_date" not in df.columns:
+        return pd.Series(UNKNOWN_MONTH, index=df.index)
+    return df["published_date"].map(lambda d: d.strftime("%Y-%m") if d is not None else UNKNOWN_MONTH)
+
+
+def _merge(old: pd.DataFrame, new: pd.DataFrame) -> pd.DataFrame:
+    """Upserts `new` into `old` by tender_id; columns `new` lacks keep their old values, like a PostgREST upsert."""
+    new = new.drop_duplicates("tender_id", keep="last").set_index("tender_id")
+    if old is None or old.empty:
+        return new.reset_index()
+    old = old.set_index("tender_id")
+    merged = old.reindex(old.index.union(new.index))
+    for col in new.columns:
+        merged.loc[new.index, col] = new[col]
+    return merged.reset_index()
+
+
+class ParquetStore:
+    """
+    Local Parquet copy of the tenders table, hive-partitioned by published
+    month (published_month=YYYY-MM/part-0.parquet) with compact column types:
+    dictionary-encoded labels, float32 values and UTC timestamps. The loaders
+    add() each written chunk; flush() merges the buffered rows into only the
+    partitions they touch and rewrites those atomically.
+
+    A tender is filed under its published month; one whose published_date
+    later changes would be left behind in its old partition as well.
+    """
+
+    def __init__(self, directory=DATASET_DIR, flush_rows=FLUSH_ROWS):
+        self.directory = directory
+        self.flush_rows = flush_rows
+        self._batches = []
+        self._buffered = 0
+
+    def add(self, records):
+        # Batches stay separate: each carries its own column set (see _merge)
+        self._batches.append(list(records))
+        self._buffered += len(self._batches[-1])
+        if self._buffered >= self.flush_rows:
+            self.flush()
+
+    def _path(self, month):
+        return os.path.join(self.directory, f"{PARTITION}={month}", "part-0.parquet")
+
+    def _read_partition(self, month):
+        path = self._path(month)
+        if not os.path.exists(path):
+            return None
+        return pq.read_table(path).to_pandas().astype(object).where(lambda d: d.notna(), None)
+
+    def _write_partition(self, month, df):
+        for col in COLUMNS:
+            if col not in df.columns:
+                df[col] = None
+        df = df[COLUMNS].sort_values("tender_id", kind="stable")
+        arrays = []
+        for field in SCHEMA:
+            plain = pa.string() if pa.types.is_dictionary(field.type) else field.type
+            arrays.append(pa.array(df[field.name].tolist(), type=plain).cast(field.type))
+        table = pa.Table.from_arrays(arrays, schema=SCHEMA)
+        path = self._path(month)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.tmp"
+        pq.write_table(table, tmp, compression="zstd")
+        os.replace(tmp, path)
+
+    def flush(self) -> int:
+        """Writes buffered rows into their partitions; returns how many partitions were rewritten."""
+        if not self._batches:
+            return 0
+        by_month = {}
+        for batch in self._batches:
+            frame = _frame(batch)
+            if "tender_id" not in frame.columns:
+                continue
+            for month, part in frame.groupby(_months(frame), sort=False):
+                by_month.setdefault(month, []).append(part)
+        self._batches = []
+        self._buffered = 0
+
+        for month, parts in by_month.items():
+            df = self._read_partition(month)
+            for part in parts:
+                df = _merge(df, part)
+            self._write_partition(month, df)
+        return len(by_month)
+
+
+def _partitioning():
+    return ds.partitioning(pa.schema([(PARTITION, pa.string())]), flavor="hive")
+
+
+def dataset(directory=DATASET_DIR):
+    """The partitioned dataset, or None if the loaders have not written one (or pyarrow is missing)."""
+    if pa is None or not os.path.isdir(directory):
+        return None
+    return ds.dataset(directory, format="parquet", schema=SCHEMA.append(pa.field(PARTITION, pa.string())),
+                      partitioning=_partitioning())
+
+
+def month_filter(start=None, end=None):
+    """Partition-pruning predicate for published months in [start, end] ("YYYY-MM" strings)."""
+    expr = None
+    field = ds.field(PARTITION)
+    for cond in ((field >= start) if start else None, (field <= end) if end else None):
+        if cond is not None:
+            expr = cond if expr is None else expr & cond
+    return expr
+
+
+def scan(columns, filter=None, directory=DATASET_DIR) -> "pa.Table":
+    """
+    Reads only `columns` of the rows matching `filter` (a pyarrow.dataset
+    expression): partitions are pruned by published_month, row groups by
+    their statistics, and the predicate is evaluated while scanning.
+    """
+    data = dataset(directory)
+    if data is None:
+        raise FileNotFoundError(f"No Parquet snapshot at {directory}")
+    return data.to_table(columns=list(columns), filter=filter)
+
+
+def read_snapshot(columns=None, filter=None, directory=DATASET_DIR) -> pd.DataFrame:
+    """scan() as a DataFrame; dictionary columns come back as pandas categoricals."""
+    return scan(columns or COLUMNS, filter, directory).to_pandas()
+
+
+def value_field():
+    """value_gbp with missing values as 0, matching how the dashboard counts them."""
+    return pc.coalesce(ds.field("value_gbp"), pa.scalar(0, pa.float32()))
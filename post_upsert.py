@@ -0,0 +1,146 @@
+import os
+import queue
+import threading
+
+import metrics
+import parquet_store
+import rollup_cube
+import saved_searches
+import vector_index
+from entity_resolution import read_duplicates
+from search_index import SearchIndex
+from query_cache import bump_generation
+
+# Set POST_UPSERT=off to skip updating the local indexes after a load
+ENABLED = os.getenv("POST_UPSERT", "on") != "off"
+# Written chunks waiting for the index thread; the writers only block once it is this far behind
+QUEUE_CHUNKS = int(os.getenv("POST_UPSERT_QUEUE", "16"))
+
+
+class PostUpsert:
+    """
+    BulkWriter `on_written` hook that keeps the local indexes in step with
+    what the loaders actually wrote to Supabase: every accepted chunk is
+    queued as it lands and fed to them by one background thread, so writer
+    threads never wait on each other's index updates, and close() drains the
+    queue and persists the indexes once the load is done and
+    bumps the upsert generation so cached query results are dropped. The
+    trigram and vector indexes are always kept, the Parquet snapshot when
+    pyarrow is installed; with a `db` client the rollup cube's changed cells
+    (without the near-duplicates entity_resolution.main mapped) are published
+    to it and written tenders are matched against the saved searches.
+    Index errors are reported but never fail the load.
+    """
+
+    def __init__(self, enabled=ENABLED, db=None):
+        self.enabled = enabled
+        self.db = db
+        self.search = SearchIndex.load() if enabled else None
+        self.vectors = vector_index.VectorIndex.load() if enabled and vector_index.ENABLED else None
+        self.parquet = parquet_store.ParquetStore() if enabled and parquet_store.ENABLED else None
+        self.cube = rollup_cube.RollupCube() if enabled and rollup_cube.ENABLED else None
+        self.alerts = saved_searches.Notifier(db) if enabled and saved_searches.ENABLED and db is not None else None
+        self.records = 0
+        self._lock = threading.Lock()
+        self._queue = queue.Queue(maxsize=max(1, QUEUE_CHUNKS))
+        self._thread = None
+
+    def __call__(self, batch):
+        with self._lock:
+            self.records += len(batch)
+            if not self.enabled:
+                return
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._consume, daemon=True)
+                self._thread.start()
+        self._queue.put(batch)
+
+    def _consume(self):
+        while True:
+            batch = self._queue.get()
+            if batch is None:
+                return
+            try:
+                self._update(batch)
+            except Exception as e:
+                print(f"⚠️ Index update failed: {e}")
+
+    def _drain(self):
+        """Waits for the index thread to apply every queued chunk."""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def _update(self, batch):
+        with metrics.timer("post_upsert"):
+            try:
+                self.search.add(batch)
+            except Exception as e:
+                print(f"⚠️ Search index update failed: {e}")
+            if self.vectors is not None:
+                try:
+                    self.vectors.add(batch)
+                except Exception as e:
+                    print(f"⚠️ Vector index update failed: {e}")
+            if self.parquet is not None:
+                try:
+                    self.parquet.add(batch)
+                except Exception as e:
+                    print(f"⚠️ Parquet snapshot update failed: {e}")
+            if self.cube is not None:
+                try:
+                    self.cube.add(batch)
+                except Exception as e:
+                    print(f"⚠️ Rollup cube update failed: {e}")
+            if self.alerts is not None:
+                try:
+                    self.alerts.add(batch)
+                except Exception as e:
+                    print(f"⚠️ Saved-search matching failed: {e}")
+
+    def close(self):
+        self._drain()
+        if not self.records:
+            return
+        if self.enabled:
+            try:
+                self.search.save()
+                print(f"🔎 Search index: {self.records} tenders updated, {len(self.search)} indexed")
+            except Exception as e:
+                print(f"⚠️ Could not save the search index: {e}")
+        if self.vectors is not None:
+            try:
+                self.vectors.save()
+                print(f"🧭 Vector index: {len(self.vectors)} tenders")
+            except Exception as e:
+                print(f"⚠️ Could not save the vector index: {e}")
+        if self.parquet is not None:
+            try:
+                print(f"🗂️ Parquet snapshot: {self.parquet.flush()} monthly partitions rewritten")
+            except Exception as e:
+                print(f"⚠️ Could not write the Parquet snapshot: {e}")
+        if self.cube is not None:
+            if self.db is not None:
+                try:
+                    self.cube.set_duplicates(read_duplicates(self.db))
+                except Exception as e:
+                    print(f"⚠️ Could not read the entity mapping; keeping the cube's duplicates: {e}")
+            try:
+                if self.db is not None:
+                    print(f"🧊 Rollup cube: {self.cube.publish(self.db)} cells published, {len(self.cube)} tenders")
+            except Exception as e:
+                print(f"⚠️ Could not publish the rollup cube: {e}")
+            try:
+                self.cube.save()
+            except Exception as e:
+                print(f"⚠️ Could not save the rollup cube: {e}")
+        if self.alerts is not None:
+            try:
+                print(f"🔔 Saved searches: {self.alerts.flush()} new matches queued for notification")
+            except Exception as e:
+                print(f"⚠️ Could not write the notification outbox: {e}")
+        try:
+            bump_generation(self.records)
+        except OSError as e:
+            print(f"⚠️ Could not bump the upsert generation: {e}")
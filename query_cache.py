@@ -0,0 +1,190 @@
+import os
+import json
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from tenders_reader import newest_update
+
+# Entries kept, seconds an entry stays fresh, and total result rows held across entries
+MAX_ENTRIES = int(os.getenv("QUERY_CACHE_ENTRIES", "256"))
+TTL_SECONDS = float(os.getenv("QUERY_CACHE_TTL", "300"))
+MAX_ROWS = int(os.getenv("QUERY_CACHE_MAX_ROWS", "200000"))
+# Touched by the loaders after every load that wrote rows (see post_upsert.PostUpsert)
+GENERATION_PATH = os.getenv("UPSERT_GENERATION_PATH", os.path.join(".cache", "upsert_generation.json"))
+# Seconds between reads of the newest tenders.updated_at by DatabaseGeneration
+GENERATION_POLL_SECONDS = float(os.getenv("QUERY_CACHE_GENERATION_POLL", "30"))
+
+
+def _normalize(value):
+    if isinstance(value, str):
+        return " ".join(value.lower().split())
+    if isinstance(value, dict):
+        return {str(k): _normalize(v) for k, v in sorted(value.items()) if v not in (None, "", [], ())}
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return sorted((_normalize(v) for v in value), key=repr)
+    return value
+
+
+def query_key(*parts) -> str:
+    """Cache key for a query: lower-cased, whitespace-collapsed strings, sorted filters, empty filters dropped."""
+    return json.dumps([_normalize(p) for p in parts], sort_keys=True, default=str)
+
+
+def bump_generation(records: int, path=GENERATION_PATH):
+    """Called by the loaders after writing rows, so every QueryCache watching `path` drops its entries."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"records": records, "at": time.time()}, f)
+    os.replace(tmp, path)
+
+
+def file_generation(path=GENERATION_PATH):
+    """
+    The generation marker's mtime (a stat call), or None before the first
+    load. Only sees loads that ran on this host; use DatabaseGeneration when
+    the loaders run elsewhere (e.g. GitHub Actions).
+    """
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+class DatabaseGeneration:
+    """
+    Generation derived from the database, for apps that do not share a disk
+    with the loaders: the newest tenders.updated_at (stamped on every write,
+    see sql/dashboard_functions.sql), read at most every `interval` seconds,
+    together with the local marker file. A failed read keeps the last value,
+    so entries then expire by TTL only.
+    """
+
+    def __init__(self, client, interval=GENERATION_POLL_SECONDS, path=GENERATION_PATH):
+        self.client = client
+        self.interval = interval
+        self.path = path
+        self._value = None
+        self._next_read = 0.0
+
+    def __call__(self):
+        now = time.monotonic()
+        if now >= self._next_read:
+            self._next_read = now + self.interval
+            try:
+                self._value = newest_update(self.client)
+            except Exception as e:
+                print(f"⚠️ Could not read the tenders generation: {e}")
+        return self._value, file_generation(self.path)
+
+
+def _size(value) -> int:
+    try:
+        return max(1, len(value))
+    except TypeError:
+        return 1
+
+
+class QueryCache:
+    """
+    Thread-safe LRU + TTL cache for query results, bounded by entry count
+    and total rows. get_or_compute() coalesces identical concurrent misses:
+    the first caller runs the query, the rest wait for its result. All
+    entries are dropped when `generation()` changes, i.e. when a loader has
+    written new rows: the default file_generation only notices loads on this
+    host, pass a DatabaseGeneration to notice them anywhere. Cached values
+    are shared, so callers must not mutate them.
+    """
+
+    def __init__(self, max_entries=MAX_ENTRIES, ttl=TTL_SECONDS, max_rows=MAX_ROWS,
+                 generation=file_generation):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_rows = max_rows
+        self.generation = generation
+        self.hits = self.misses = self.coalesced = 0
+        self._entries = OrderedDict()  # key -> (expires_at, rows, value)
+        self._inflight = {}            # key -> Future of the running query
+        self._rows = 0
+        self._epoch = 0                # bumped whenever the entries are dropped
+        self._seen_generation = generation() if generation else None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def invalidate(self):
+        with self._lock:
+            self._clear()
+
+    def _clear(self):
+        self._entries.clear()
+        self._rows = 0
+        self._epoch += 1
+
+    def _check_generation(self):
+        if self.generation is None:
+            return
+        current = self.generation()
+        if current != self._seen_generation:
+            self._seen_generation = current
+            self._clear()
+
+    def _store(self, key, value):
+        rows = _size(value)
+        if rows > self.max_rows:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._rows -= old[1]
+        self._entries[key] = (time.monotonic() + self.ttl, rows, value)
+        self._rows += rows
+        while len(self._entries) > self.max_entries or self._rows > self.max_rows:
+            _, (_, evicted, _) = self._entries.popitem(last=False)
+            self._rows -= evicted
+
+    def get_or_compute(self, key, compute):
+        with self._lock:
+            self._check_generation()
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[2]
+            if entry is not None:
+                del self._entries[key]
+                self._rows -= entry[1]
+
+            epoch = self._epoch
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            return future.result()
+
+        try:
+            value = compute()
+        except BaseException as e:
+            with self._lock:
+                del self._inflight[key]
+            future.set_exception(e)
+            raise
+        with self._lock:
+            del self._inflight[key]
+            self._check_generation()
+            # Rows loaded (or an invalidation) while the query ran may be missing from its result
+            if self._epoch == epoch:
+                self._store(key, value)
+        future.set_result(value)
+        return value
+
+    def stats(self) -> str:
+        return (f"{len(self._entries)} entries, {self._rows} rows | "
+                f"{self.hits} hits, {self.misses} misses, {self.coalesced} coalesced")
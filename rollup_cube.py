@@ -0,0 +1,349 @@
+import os
+import json
+import time
+from datetime import datetime, timezone
+
+import pandas as pd
+
+from bulk_writer import chunked
+from sync_state import parse_ts
+from tenders_reader import iter_pages, newest_update, written_since
+
+# Local state: every tender's current contribution, so a changed tender can be retracted
+ROLLUP_PATH = os.getenv("ROLLUP_PATH", os.path.join(".cache", "rollup.json"))
+# Summary table the cells are published to (sql/dashboard_functions.sql)
+ROLLUP_TABLE = os.getenv("ROLLUP_TABLE", "tender_rollup")
+# Set ROLLUP=off to stop the loaders maintaining the cube
+ENABLED = os.getenv("ROLLUP", "on") != "off"
+
+GRAINS = ("week", "month")
+DIMENSIONS = ["region", "sector", "tender_status"]
+UNKNOWN_PERIOD = "unknown"
+# Tenders columns a contribution is built from
+SOURCE_COLUMNS = ["tender_id", "region", "sector", "tender_status", "published_date", "value_gbp"]
+TABLE_COLUMNS = ["cell", "grain", "period"] + DIMENSIONS + ["tenders", "value_gbp", "min_value", "max_value"]
+
+
+def periods(day):
+    """(week, month) period labels of a YYYY-MM-DD day: ISO week "2024-W05" and "2024-02"."""
+    if not day:
+        return UNKNOWN_PERIOD, UNKNOWN_PERIOD
+    date = datetime.strptime(day, "%Y-%m-%d")
+    year, week, _ = date.isocalendar()
+    return f"{year}-W{week:02d}", day[:7]
+
+
+def cell_id(key) -> str:
+    """Primary key of a cell in the summary table: its grain, period and labels joined by "|"."""
+    return "|".join("" if part is None else str(part) for part in key)
+
+
+class RollupCube:
+    """
+    Count, sum, min and max of value_gbp per (grain, period, region, sector,
+    status) cell, for publication weeks and months. The loaders add() every
+    chunk they wrote: each tender's previous contribution is retracted and
+    its new one applied, so the cube tracks the tenders table without ever
+    re-reading it. Fields a record lacks keep their previous value, like a
+    PostgREST upsert. Retracting a cell's min or max marks the cell for a
+    rescan of its tenders at publish time.
+
+    A cube that has not been seeded from the whole table (rebuild) only
+    covers what the loaders wrote since; publish() seeds it first. Since the
+    summary table is shared by every host that loads tenders, publish() also
+    catches up first: the tenders written since the cube's watermark (the
+    newest tenders.updated_at it accounted for) that did not go through its
+    add(), such as another host's load or writes made while this host ran
+    from a stale cache, are read back and added.
+
+    Near-duplicate tenders (entity_resolution) are excluded through
+    set_duplicates(): their contribution is retracted and kept aside (later
+    writes update it there), so a tender listed under several ids is counted
+    once, and a tender that stops being a duplicate is applied again.
+    """
+
+    def __init__(self, path=ROLLUP_PATH):
+        self.path = path
+        self.seeded = False
+        self.tenders = {}  # tender_id -> [region, sector, status, day, value]
+        self.cells = {}  # (grain, period, region, sector, status) -> [count, sum, min, max]
+        self.dirty = set()
+        self.stale = set()
+        self.duplicates = set()
+        self.watermark = None
+        self.written = set()  # tender ids add()ed since the watermark
+        self.excluded = {}  # duplicate tender_id -> contribution, applied again if it stops being one
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return
+        self.seeded = state.get("seeded", False)
+        self.watermark = state.get("watermark")
+        self.tenders = state.get("tenders", {})
+        self.duplicates = set(state.get("duplicates", []))
+        self.excluded = state.get("excluded", {})
+        for row in state.get("cells", []):
+            self.cells[tuple(row[:5])] = row[5:]
+        # Cells changed by loads whose publish failed are republished next time
+        self.dirty = {key if key == "*" else tuple(key) for key in state.get("dirty", [])}
+
+    def __len__(self):
+        return len(self.tenders)
+
+    def _keys(self, contribution):
+        region, sector, status, day, _ = contribution
+        return [(grain, period, region, sector, status) for grain, period in zip(GRAINS, periods(day))]
+
+    def _retract(self, contribution):
+        value = contribution[4]
+        for key in self._keys(contribution):
+            cell = self.cells.get(key)
+            if cell is None:
+                continue
+            cell[0] -= 1
+            cell[1] -= value
+            if cell[0] <= 0:
+                del self.cells[key]
+                self.stale.discard(key)
+            elif value <= cell[2] or value >= cell[3]:
+                self.stale.add(key)
+            self.dirty.add(key)
+
+    def _apply(self, contribution):
+        value = contribution[4]
+        for key in self._keys(contribution):
+            cell = self.cells.get(key)
+            if cell is None:
+                self.cells[key] = [1, value, value, value]
+            else:
+                cell[0] += 1
+                cell[1] += value
+                cell[2] = min(cell[2], value)
+                cell[3] = max(cell[3], value)
+            self.dirty.add(key)
+
+    def add(self, records):
+        """Applies a chunk of written tender records, retracting each tender's previous contribution."""
+        for record in records:
+            tender_id = record.get("tender_id")
+            if tender_id is None:
+                continue
+            tender_id = str(tender_id)
+            self.written.add(tender_id)
+            duplicate = tender_id in self.duplicates
+            old = (self.excluded if duplicate else self.tenders).get(tender_id)
+            new = list(old) if old is not None else [None, None, None, None, 0.0]
+            for i, col in enumerate(DIMENSIONS):
+                if col in record:
+                    new[i] = record[col]
+            if "published_date" in record:
+                published = parse_ts(record["published_date"])
+                new[3] = published.strftime("%Y-%m-%d") if published else None
+            if "value_gbp" in record:
+                try:
+                    new[4] = float(record["value_gbp"] or 0)
+                except (TypeError, ValueError):
+                    new[4] = 0.0
+            if new == old:
+                continue
+            if duplicate:
+                self.excluded[tender_id] = new
+                continue
+            if old is not None:
+                self._retract(old)
+            self._apply(new)
+            self.tenders[tender_id] = new
+
+    def set_duplicates(self, tender_ids) -> int:
+        """
+        Makes `tender_ids` the excluded near-duplicates: retracts the new ones
+        and applies again the ones no longer listed. Returns how many changed.
+        """
+        duplicates = set(map(str, tender_ids))
+        fresh, restored = duplicates - self.duplicates, self.duplicates - duplicates
+        for tender_id in fresh:
+            old = self.tenders.pop(tender_id, None)
+            if old is not None:
+                self._retract(old)
+                self.excluded[tender_id] = old
+        for tender_id in restored:
+            old = self.excluded.pop(tender_id, None)
+            if old is not None:
+                self._apply(old)
+                self.tenders[tender_id] = old
+        self.duplicates = duplicates
+        return len(fresh) + len(restored)
+
+    def _rescan(self):
+        """Recomputes min/max of the cells whose extreme was retracted, in one pass over the tenders."""
+        if not self.stale:
+            return
+        extremes = {}
+        for contribution in self.tenders.values():
+            for key in self._keys(contribution):
+                if key in self.stale:
+                    lo, hi = extremes.get(key, (contribution[4], contribution[4]))
+                    extremes[key] = (min(lo, contribution[4]), max(hi, contribution[4]))
+        for key, (lo, hi) in extremes.items():
+            self.cells[key][2:] = [lo, hi]
+        self.stale = set()
+
+    def rebuild(self, client):
+        """Seeds the cube from every row of the tenders table, setting the duplicates' contributions aside."""
+        self.tenders, self.excluded, self.cells, self.stale = {}, {}, {}, set()
+        # Read first: rows written during the walk are checked again at the next publish
+        self.watermark = newest_update(client)
+        for rows in iter_pages(client, columns=SOURCE_COLUMNS):
+            self.add(rows)
+        self.seeded = True
+        self.written = set()
+        self.dirty = {"*"}
+
+    def catch_up(self, client) -> int:
+        """
+        Adds the tenders written since the watermark that did not go through
+        add() and moves the watermark up to the newest write. Returns how
+        many were missed.
+        """
+        latest = newest_update(client)
+        missed = 0
+        if latest is not None and latest != self.watermark:
+            for rows in written_since(client, self.watermark, SOURCE_COLUMNS, latest):
+                rows = [row for row in rows if str(row["tender_id"]) not in self.written]
+                self.add(rows)
+                missed += len(rows)
+        self.watermark, self.written = latest, set()
+        return missed
+
+    def frame(self, grain="month") -> pd.DataFrame:
+        """The cells of one grain as summary-table rows."""
+        self._rescan()
+        rows = [self._row(key) for key in self.cells if key[0] == grain]
+        return pd.DataFrame(rows, columns=TABLE_COLUMNS)
+
+    def _row(self, key):
+        count, total, lo, hi = self.cells[key]
+        return dict(zip(TABLE_COLUMNS, [cell_id(key), *key, count, total, lo, hi]))
+
+    def publish(self, client, table=ROLLUP_TABLE) -> int:
+        """
+        Upserts the cells changed since the last publish into the summary
+        table and deletes the ones that emptied; seeds the cube from the
+        tenders table first if it never was, and catches up on the tenders
+        written elsewhere since. Returns the cells written.
+        """
+        if not self.seeded or self.watermark is None:
+            self.rebuild(client)
+        else:
+            missed = self.catch_up(client)
+            if missed:
+                print(f"🧊 Rollup cube: caught up on {missed} tenders written elsewhere")
+        self._rescan()
+        if "*" in self.dirty:
+            client.table(table).delete().in_("grain", list(GRAINS)).execute()
+            changed, emptied = list(self.cells), []
+        else:
+            changed = [key for key in self.dirty if key in self.cells]
+            emptied = [cell_id(key) for key in self.dirty if key not in self.cells]
+        stamp = datetime.now(timezone.utc).isoformat()
+        for batch in chunked(changed, 500):
+            rows = [dict(self._row(key), updated_at=stamp) for key in batch]
+            client.table(table).upsert(rows, on_conflict="cell").execute()
+        for batch in chunked(emptied, 200):
+            client.table(table).delete().in_("cell", batch).execute()
+        self.dirty = set()
+        return len(changed) + len(emptied)
+
+    def save(self):
+        self._rescan()
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        state = {
+            "seeded": self.seeded,
+            "watermark": self.watermark,
+            "tenders": self.tenders,
+            "duplicates": sorted(self.duplicates),
+            "excluded": self.excluded,
+            "cells": [list(key) + cell for key, cell in self.cells.items()],
+            "dirty": [key if key == "*" else list(key) for key in self.dirty],
+        }
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(state, f, separators=(",", ":"))
+        os.replace(tmp, self.path)
+
+
+# -----------------------
+# Reading the cube (dashboard)
+# -----------------------
+def read_cells(client, grain="month", table=ROLLUP_TABLE, page_size=1000) -> pd.DataFrame:
+    """Every cell of one grain from the summary table, walked by keyset on `cell`."""
+    rows, after = [], None
+    while True:
+        query = client.table(table).select(", ".join(TABLE_COLUMNS)).eq("grain", grain)
+        if after is not None:
+            query = query.gt("cell", after)
+        page = query.order("cell").limit(page_size).execute().data or []
+        if not page:
+            break
+        rows += page
+        after = page[-1]["cell"]
+    frame = pd.DataFrame(rows, columns=TABLE_COLUMNS)
+    for col in ("tenders", "value_gbp", "min_value", "max_value"):
+        frame[col] = pd.to_numeric(frame[col], errors="coerce").fillna(0)
+    return frame
+
+
+class RollupSource:
+    """
+    The dashboard's metric cards and region totals from the month cells of
+    the cube. The cube has no per-row values, so it only serves filters
+    without a value range (see answers()); the dashboard sends the rest, and
+    the deadline table, to its row-level source.
+    """
+
+    def __init__(self, cells: pd.DataFrame):
+        self.cells = cells
+        self.min_value = float(cells["min_value"].min()) if len(cells) else 0.0
+        self.max_value = float(cells["max_value"].max()) if len(cells) else 0.0
+
+    def answers(self, filters) -> bool:
+        """True when the value range spans every tender (the slider's top is the maximum rounded down)."""
+        return ((filters.min_value is None or filters.min_value <= min(0.0, self.min_value))
+                and (filters.max_value is None or filters.max_value >= int(self.max_value)))
+
+    def _selected(self, filters):
+        cells = self.cells
+        for col, wanted in (("region", filters.regions), ("sector", filters.sectors),
+                            ("tender_status", filters.statuses)):
+            if wanted:
+                cells = cells[cells[col].isin(list(wanted))]
+        return cells
+
+    def fetch_metrics(self, filters):
+        cells = self._selected(filters)
+        count, total = int(cells["tenders"].sum()), float(cells["value_gbp"].sum())
+        return {"tenders": count, "total_value": total, "avg_value": total / count if count else 0.0}
+
+    def fetch_region_totals(self, filters):
+        cells = self._selected(filters).dropna(subset=["region"])
+        out = cells.groupby("region", sort=True)[["tenders", "value_gbp"]].sum().reset_index()
+        out["tenders"] = out["tenders"].astype("int64")
+        return out[out["tenders"] > 0].reset_index(drop=True)
+
+
+def main():
+    """Rebuilds the cube from the whole tenders table and republishes every cell."""
+    from supabase_client import create_client
+
+    started = time.perf_counter()
+    client = create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_SERVICE_KEY"), service=True)
+    cube = RollupCube()
+    cube.rebuild(client)
+    written = cube.publish(client)
+    cube.save()
+    print(f"🧊 Rollup cube: {len(cube)} tenders in {written} cells, rebuilt in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,311 @@
+import os
+import re
+import smtplib
+from datetime import datetime, timezone
+from email.message import EmailMessage
+
+import numpy as np
+import pandas as pd
+
+from ai_query_parser import parse_ai_prompt, parse_locally
+from bulk_writer import chunked
+from search_index import extract_buyer_name
+
+SEARCHES_TABLE = os.getenv("SAVED_SEARCHES_TABLE", "saved_searches")
+OUTBOX_TABLE = os.getenv("SEARCH_OUTBOX_TABLE", "search_notifications")
+# Set SAVED_SEARCHES=off to stop the loaders percolating written tenders
+ENABLED = os.getenv("SAVED_SEARCHES", "on") != "off"
+
+# Filter keys of a saved search: parse_ai_prompt's, plus the prompt's keywords
+FILTER_KEYS = ["keywords", "region", "sector", "value_cap", "timeframe_days"]
+
+# Alert emails; without SMTP_HOST nothing is sent and the outbox stays queued
+SMTP_HOST = os.getenv("SMTP_HOST")
+SMTP_PORT = int(os.getenv("SMTP_PORT") or "587")
+SMTP_USER = os.getenv("SMTP_USER")
+SMTP_PASSWORD = os.getenv("SMTP_PASSWORD")
+ALERT_FROM = os.getenv("ALERT_FROM") or SMTP_USER or ""
+
+_NON_WORD = re.compile(r"[^0-9a-z]+")
+_EMAIL = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+# Term groups of a saved search (see Percolator): keyword words, region, sector
+GROUPS = 3
+
+
+def _words(text) -> list:
+    if not text or not isinstance(text, str):
+        return []
+    return _NON_WORD.sub(" ", text.lower()).split()
+
+
+def names_sector(prompt: str, sector) -> bool:
+    """True when the prompt spells out the sector label itself ("healthcare", "facilities & cleaning")."""
+    label = _words(sector)
+    return bool(label) and set(label) <= set(_words(prompt))
+
+
+def search_filters(prompt: str, llm=...) -> dict:
+    """
+    The filters a saved search stores for a prompt: parse_ai_prompt's region,
+    value cap and timeframe, plus every keyword the rules found (sector
+    keywords and the other content words), which a tender matches when it
+    contains any of them, like the app's search. The sector is kept only when
+    the prompt names it: a keyword such as "cleaning" stays a keyword, since
+    loaders label sectors differently (Contracts Finder's are "services",
+    "works" and "goods").
+    """
+    filters = dict.fromkeys(FILTER_KEYS)
+    filters.update({k: v for k, v in (parse_ai_prompt(prompt, llm=llm) or {}).items() if k in FILTER_KEYS})
+    filters["keywords"] = parse_locally(prompt)[0]["keywords"]
+    if filters.get("sector") and not names_sector(prompt, filters["sector"]):
+        filters["sector"] = None
+    return filters
+
+
+def valid_email(address) -> bool:
+    return isinstance(address, str) and bool(_EMAIL.match(address.strip()))
+
+
+def save_search(client, user: str, prompt: str, filters=None, llm=...) -> dict:
+    """Stores a saved search for `user`, the email address its alerts go to; returns the stored row."""
+    if not valid_email(user):
+        raise ValueError(f"Not a valid email address: {user!r}")
+    row = {
+        "user_id": user.strip().lower(),
+        "prompt": prompt,
+        "filters": filters if filters is not None else search_filters(prompt, llm),
+        "active": True,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+    }
+    data = client.table(SEARCHES_TABLE).insert(row).execute().data or [row]
+    return data[0]
+
+
+def load_searches(client, page_size=1000) -> list:
+    """Every active saved search, walked by keyset on id."""
+    rows, after = [], None
+    while True:
+        query = client.table(SEARCHES_TABLE).select("id, user_id, prompt, filters").eq("active", True)
+        if after is not None:
+            query = query.gt("id", after)
+        page = query.order("id").limit(page_size).execute().data or []
+        if not page:
+            return rows
+        rows += page
+        after = page[-1]["id"]
+
+
+# -----------------------
+# Percolator
+# -----------------------
+class Percolator:
+    """
+    Matches written tenders against every saved search at once. The searches
+    are compiled into an inverted index from terms (keyword words, "region:",
+    "sector:" labels) to the (search, group) pairs using them: all keyword
+    words of a search form one group, which any of them satisfies, and its
+    region and sector are a group each. A batch of tenders is matched in one
+    pass: the postings of every (tender, term) pair are concatenated, a
+    search matches a tender when all of its groups were hit, and the value
+    caps and deadline windows of those candidate pairs are checked as arrays.
+    Searches without any term are candidates for every tender.
+
+    A keyword matches a whole word of the title, description or buyer name,
+    or its plural ("school" matches "schools").
+    """
+
+    def __init__(self, searches):
+        self.searches = list(searches)
+        self.postings = {}
+        required, caps, days, always = [], [], [], []
+        for i, search in enumerate(self.searches):
+            filters = search.get("filters") or {}
+            groups = self._search_terms(filters)
+            for group, terms in enumerate(groups):
+                for term in terms:
+                    self.postings.setdefault(term, []).append(i * GROUPS + group)
+            required.append(sum(1 for terms in groups if terms))
+            if not required[-1]:
+                always.append(i)
+            caps.append(filters.get("value_cap") or np.inf)
+            days.append(filters.get("timeframe_days") or np.nan)
+        self.postings = {term: np.asarray(ids, dtype="int64") for term, ids in self.postings.items()}
+        self.required = np.asarray(required, dtype="int64")
+        self.caps = np.asarray(caps, dtype="float64")
+        self.days = np.asarray(days, dtype="float64")
+        self.always = np.asarray(always, dtype="int64")
+
+    def __len__(self):
+        return len(self.searches)
+
+    @staticmethod
+    def _search_terms(filters) -> list:
+        """The search's term groups: keyword words (any of them), region, sector."""
+        words = {f"w:{w}" for keyword in filters.get("keywords") or [] for w in _words(keyword)}
+        region = {f"region:{filters['region']}"} if filters.get("region") else set()
+        sector = {f"sector:{filters['sector']}"} if filters.get("sector") else set()
+        return [words, region, sector]
+
+    @staticmethod
+    def _tender_terms(record) -> set:
+        buyer = record.get("buyer_name") or extract_buyer_name(record.get("buyer"))
+        terms = set()
+        for field in (record.get("title"), record.get("description"), buyer):
+            for w in _words(field):
+                terms.add(f"w:{w}")
+                # Plurals match their singular keyword, like the classifier's tables
+                if len(w) > 4 and w.endswith("es"):
+                    terms.add(f"w:{w[:-2]}")
+                if len(w) > 3 and w.endswith("s"):
+                    terms.add(f"w:{w[:-1]}")
+        for col in ("region", "sector"):
+            if record.get(col):
+                terms.add(f"{col}:{record[col]}")
+        return terms
+
+    def match(self, records, now=None) -> list:
+        """(search index, record) for every saved search each record satisfies."""
+        records = [r for r in records if r.get("tender_id") is not None]
+        n = len(self.searches)
+        if not records or not n:
+            return []
+
+        tenders, hits = [], []
+        for t, record in enumerate(records):
+            for term in self._tender_terms(record):
+                ids = self.postings.get(term)
+                if ids is not None:
+                    hits.append(ids)
+                    tenders.append(np.full(len(ids), t, dtype="int64"))
+        pairs = np.zeros(0, dtype="int64")
+        if hits:
+            # Distinct (tender, search, group) hits, then the groups hit per (tender, search)
+            groups = np.unique(np.concatenate(tenders) * (n * GROUPS) + np.concatenate(hits))
+            pairs, counts = np.unique(groups // GROUPS, return_counts=True)
+            pairs = pairs[counts == self.required[pairs % n]]
+        if len(self.always):
+            everyone = (np.arange(len(records), dtype="int64")[:, None] * n + self.always[None, :]).ravel()
+            pairs = np.concatenate([pairs, everyone])
+        if not len(pairs):
+            return []
+        t, q = pairs // n, pairs % n
+
+        # Value caps and deadline windows, checked for the candidate pairs only
+        values = pd.to_numeric(pd.Series([r.get("value_gbp", r.get("value_normalized")) for r in records],
+                                         dtype=object), errors="coerce").fillna(0).to_numpy("float64")
+        keep = values[t] <= self.caps[q]
+        windowed = ~np.isnan(self.days[q])
+        if windowed.any():
+            deadlines = pd.to_datetime(pd.Series([r.get("deadline") for r in records], dtype=object),
+                                       errors="coerce", utc=True, format="ISO8601")
+            days_left = ((deadlines - pd.Timestamp(now or datetime.now(timezone.utc))).dt.total_seconds()
+                         / 86400).to_numpy("float64")
+            left = days_left[t]
+            in_window = (left >= 0) & (left <= np.nan_to_num(self.days[q]))
+            keep &= ~windowed | in_window
+        return [(int(qi), records[ti]) for ti, qi in zip(t[keep], q[keep])]
+
+
+class Notifier:
+    """
+    PostUpsert side of the alerts: percolates each written chunk and queues
+    one outbox row per (saved search, tender) match. flush() upserts them
+    into the outbox table, where a changed tender that still matches is
+    queued again. The saved searches are read on the first chunk.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.percolator = None
+        self.pending = {}
+
+    def add(self, records):
+        if self.percolator is None:
+            try:
+                searches = load_searches(self.client)
+            except Exception as e:
+                print(f"⚠️ Could not read saved searches; no alerts this run: {e}")
+                searches = []
+            self.percolator = Percolator(searches)
+        stamp = datetime.now(timezone.utc).isoformat()
+        for q, record in self.percolator.match(records):
+            search = self.percolator.searches[q]
+            key = (search["id"], str(record["tender_id"]))
+            self.pending[key] = {
+                "search_id": search["id"],
+                "user_id": search.get("user_id"),
+                "tender_id": str(record["tender_id"]),
+                "title": record.get("title"),
+                "matched_at": stamp,
+                "delivered_at": None,
+            }
+
+    def flush(self) -> int:
+        rows = list(self.pending.values())
+        for batch in chunked(rows, 500):
+            self.client.table(OUTBOX_TABLE).upsert(batch, on_conflict="search_id,tender_id").execute()
+        self.pending = {}
+        return len(rows)
+
+
+# -----------------------
+# Delivery
+# -----------------------
+def deliver(client, send, limit=1000) -> int:
+    """
+    Hands undelivered outbox rows to `send(user_id, rows)`, one call per user,
+    and stamps them delivered. A user whose send raises stays queued.
+    """
+    rows = (client.table(OUTBOX_TABLE).select("*").is_("delivered_at", "null")
+            .order("matched_at").limit(limit).execute().data or [])
+    by_user = {}
+    for row in rows:
+        by_user.setdefault(row.get("user_id"), []).append(row)
+    delivered = 0
+    stamp = datetime.now(timezone.utc).isoformat()
+    for user, matches in by_user.items():
+        try:
+            send(user, matches)
+        except Exception as e:
+            print(f"⚠️ Could not notify {user}: {e}")
+            continue
+        for match in matches:
+            (client.table(OUTBOX_TABLE).update({"delivered_at": stamp})
+             .eq("search_id", match["search_id"]).eq("tender_id", match["tender_id"]).execute())
+        delivered += len(matches)
+    return delivered
+
+
+def alert_email(user, matches) -> EmailMessage:
+    message = EmailMessage()
+    message["From"] = ALERT_FROM
+    message["To"] = user
+    message["Subject"] = f"{len(matches)} new tenders match your saved search"
+    lines = [f"- {match.get('title') or match['tender_id']} ({match['tender_id']})" for match in matches]
+    message.set_content("New tenders matching your saved searches:\n\n" + "\n".join(lines) + "\n")
+    return message
+
+
+def send_email(user, matches):
+    """deliver() sender: one email per user over SMTP (STARTTLS, login when SMTP_USER is set)."""
+    if not valid_email(user):
+        raise ValueError(f"Not a valid email address: {user!r}")
+    with smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=30) as smtp:
+        smtp.starttls()
+        if SMTP_USER:
+            smtp.login(SMTP_USER, SMTP_PASSWORD or "")
+        smtp.send_message(alert_email(user, matches))
+
+
+def main():
+    from supabase_client import create_client
+
+    if not SMTP_HOST:
+        print("⚠️ SMTP_HOST is not set; leaving saved-search notifications queued.")
+        return
+    client = create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_SERVICE_KEY"), service=True)
+    print(f"📬 Delivered {deliver(client, send_email)} notifications")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,46 @@
-import os, time
+import os, sys, time
 import requests
-from datetime import datetime
-from urllib.parse import urlencode
-from supabase import create_client, Client
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
 
-SUPABASE_URL = os.environ["SUPABASE_URL"]
-SUPABASE_SERVICE_KEY = os.environ["SUPABASE_SERVICE_KEY"]
+# Shared loader modules live at the repo root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-sb: Client = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
+from supabase_client import create_client
+import metrics
+from bulk_writer import BulkWriter, chunked
+from normalizer import normalize_notices
+from change_detection import HashIndex
+from post_upsert import PostUpsert
+from http_cache import HttpCache
+from http_client import FetchClient, TokenBucket
+from sync_state import sync_since, save_high_water_mark, parse_ts, api_date, HighWaterMark
+
+SUPABASE_URL = os.getenv("SUPABASE_URL")
+SUPABASE_SERVICE_KEY = os.getenv("SUPABASE_SERVICE_KEY")
+
+# Raises if the keys are missing, unless SUPABASE_BACKEND=local
+sb = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY, service=True)
 
 BASE = "https://www.contractsfinder.service.gov.uk/Published/Notices/OCDS/Search"
+SYNC_SOURCE = "contracts_finder"
+
+PAGE_SIZE = int(os.getenv("CF_PAGE_SIZE", "50"))
+# Pages fetched in parallel once page 1 tells us totalPages (1 = old sequential walk)
+CONCURRENCY = int(os.getenv("CF_CONCURRENCY", "4"))
+# Token-bucket limit shared by all fetch threads: sustained requests/sec and burst size
+RATE_PER_SEC = float(os.getenv("CF_RATE_PER_SEC", "5"))
+RATE_BURST = int(os.getenv("CF_RATE_BURST", "5"))
+# CF_STREAM=on parses each page body incrementally (sequential paging, flat memory for big pages)
+STREAM = os.getenv("CF_STREAM", "off") == "on"
+
+
+# Pooled keep-alive session with retries/backoff, shared by all fetch threads
+client = FetchClient(limiter=TokenBucket(RATE_PER_SEC, RATE_BURST))
+# Raw pages are archived under .cache/http/contracts_finder; HTTP_CACHE=offline replays them
+http_cache = HttpCache(SYNC_SOURCE, fetch=client.get)
+# Set on pages that came back 304 and were already loaded by an earlier run
+NOT_MODIFIED = "_not_modified"
 
 
 def _get(d, *path, default=None):
@@ -22,7 +53,7 @@ def _get(d, *path, default=None):
     return d
 
 
-def fetch_page(page: int, page_size: int = 50) -> dict:
+def page_params(page: int, page_size: int = 50, since=None) -> dict:
     params = {
         "order": "desc",
         "sortType": "publishedDate",
@@ -31,13 +62,25 @@ def fetch_page(page: int, page_size: int = 50) -> dict:
         "status": "Open",
         "type": "Opportunity"
     }
-    url = f"{BASE}?{urlencode(params)}"
-    r = requests.get(url, timeout=30)
-    r.raise_for_status()
-    return r.json()
+    if since is not None:
+        params["publishedFrom"] = api_date(since)
+    return params
+
+
+@metrics.timer("fetch")
+def fetch_page(page: int, page_size: int = 50, since=None) -> dict:
+    entry = http_cache.get(BASE, params=page_params(page, page_size, since), timeout=30)
+    with metrics.timer("parse_page"):
+        data = entry.json()
+    metrics.count("pages_fetched")
+    if entry.skippable:
+        metrics.count("pages_not_modified")
+        data[NOT_MODIFIED] = True
+    return data
 
 
 def normalize(row: dict) -> dict:
+    """One notice as a tenders row; normalizer.normalize_notices does the same for a whole batch."""
     tender_id = _get(row, "id") or _get(row, "ocid")
 
     title = (_get(row, "title") or "").strip()
@@ -71,39 +114,237 @@ def normalize(row: dict) -> dict:
         "buyer": buyer,
         "sector": sector,
         "value_normalized": value_normalized,
+        # The column the dashboard RPCs and the rollup cube aggregate
+        "value_gbp": value_normalized,
         "published_date": published_date.isoformat() if published_date else None,
+        # Delta readers (snapshot, search and vector indexes) pick rows up by updated_at
+        "updated_at": datetime.now(timezone.utc).isoformat(),
     }
 
 
-def upsert_rows(rows):
-    if rows:
-        sb.table("tenders").upsert(rows, on_conflict="tender_id").execute()
+def upsert_rows(rows, writer: BulkWriter, index: HashIndex):
+    # Unchanged tenders (same content hash as last time) are never re-sent
+    with metrics.timer("diff"):
+        new, changed = index.split(rows)
+    metrics.count("rows_seen", len(rows))
+    metrics.count("rows_new", len(new))
+    metrics.count("rows_changed", len(changed))
+    metrics.count("rows_unchanged", len(rows) - len(new) - len(changed))
+    if new or changed:
+        writer.add(new + changed)
 
 
-def main():
-    page = 1
-    total_inserted = 0
+def _records(data: dict) -> list:
+    return data.get("records") or data.get("items") or []
 
-    while True:
-        data = fetch_page(page)
-        records = data.get("records") or data.get("items") or []
-        if not records:
-            break
 
-        processed = [normalize(r) for r in records if r]
-        processed = [p for p in processed if p.get("title")]
+def _reached_seen(data: dict, since) -> bool:
+    """True once a (newest-first) page contains notices older than `since`."""
+    if since is None:
+        return False
+    for r in _records(data):
+        published = parse_ts(_get(r, "publishedDate"))
+        if published is not None and published < since:
+            return True
+    return False
 
-        upsert_rows(processed)
-        total_inserted += len(processed)
+
+def iter_pages_sequential(page_size: int = PAGE_SIZE, since=None):
+    page = 1
+    while True:
+        data = fetch_page(page, page_size, since)
+        if not _records(data):
+            return
+        yield data
 
         total_pages = data.get("totalPages", 0)
         if total_pages and page >= total_pages:
-            break
+            return
+        if _reached_seen(data, since):
+            return
+        page += 1
+
+
+def iter_pages(page_size: int = PAGE_SIZE, concurrency: int = CONCURRENCY, since=None,
+               failed_pages=None):
+    """
+    Yields result pages in arrival order. Page 1 is fetched first to learn
+    totalPages; the remaining pages are then fetched by a pool of
+    `concurrency` threads, all throttled by the shared token bucket.
+    In incremental mode (`since` set) paging stops at already-seen notices.
+    A fanned-out page that still fails after retries is appended to
+    `failed_pages` and skipped instead of aborting the run.
+    """
+    if concurrency <= 1 or since is not None:
+        # Incremental runs are a page or two; the early stop beats fanning out
+        yield from iter_pages_sequential(page_size, since)
+        return
+
+    first = fetch_page(1, page_size)
+    if not _records(first):
+        return
+    yield first
+
+    total_pages = first.get("totalPages", 0)
+    if not total_pages:
+        # No page count to fan out over; walk the rest one page at a time
+        page = 2
+        while _records(data := fetch_page(page, page_size)):
+            yield data
+            page += 1
+        return
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = {pool.submit(fetch_page, p, page_size): p for p in range(2, total_pages + 1)}
+        try:
+            for fut in as_completed(futures):
+                try:
+                    data = fut.result()
+                except requests.RequestException as e:
+                    print(f"Page {futures[fut]} failed after retries: {e}")
+                    if failed_pages is not None:
+                        failed_pages.append(futures[fut])
+                    continue
+                yield data
+        finally:
+            for fut in futures:
+                fut.cancel()
+
+
+def fetch_page_stream(page: int, page_size: int = 50, since=None):
+    """
+    Like fetch_page, but the archived body is parsed lazily as the notices
+    are iterated. Returns (notices, skippable).
+    """
+    with metrics.timer("fetch"):
+        entry = http_cache.get(BASE, params=page_params(page, page_size, since), timeout=30)
+    metrics.count("pages_fetched")
+    if entry.skippable:
+        metrics.count("pages_not_modified")
+    return entry.notices(), entry.skippable
+
+
+def process_records(records, writer: BulkWriter, index: HashIndex,
+                    hwm: HighWaterMark, since=None) -> bool:
+    """
+    Normalizes records and queues them for upsert one batch at a time, so a
+    streamed page never sits in memory whole. Returns True if the page
+    reached notices older than `since` (already loaded by an earlier run).
+    """
+    reached_seen = False
+    for chunk in chunked((r for r in records if r), writer.batch_size):
+        with metrics.timer("normalize"):
+            normalized = normalize_notices(chunk)
+        batch = []
+        for p in normalized:
+            if not p.get("title"):
+                continue
+            published = parse_ts(p["published_date"])
+            if since is not None and published is not None and published < since:
+                reached_seen = True
+                continue
+            hwm.observe(published)
+            batch.append(p)
+        upsert_rows(batch, writer, index)
+    return reached_seen
 
+
+def stream_pages(writer: BulkWriter, index: HashIndex, hwm: HighWaterMark,
+                 since=None, page_size: int = PAGE_SIZE) -> int:
+    """Sequential streaming walk over all pages; returns the number of pages read."""
+    page = 1
+    while True:
+        notices, skippable = fetch_page_stream(page, page_size, since)
+        if skippable:
+            # 304 for a page that was already loaded: read it only for paging metadata
+            reached_seen = False
+            for _ in notices:
+                pass
+        else:
+            reached_seen = process_records(notices, writer, index, hwm, since)
+        if not notices.count:
+            return page - 1
+
+        total_pages = notices.meta.get("totalPages", 0)
+        if (total_pages and page >= total_pages) or reached_seen:
+            return page
         page += 1
-        time.sleep(0.4)
 
-    print(f"Done. Inserted / updated: {total_inserted} tenders.")
+
+def replay_archive():
+    """Re-runs normalization and loading from the archived pages alone (HTTP_CACHE=offline)."""
+    entries = http_cache.entries()
+    print(f"Replaying {len(entries)} archived pages...")
+    index = HashIndex(SYNC_SOURCE)
+    hooks = PostUpsert(db=sb)
+    with BulkWriter(sb, on_written=hooks) as writer:
+        for entry in entries:
+            process_records(entry.notices(), writer, index, HighWaterMark())
+    index.commit(writer.report.failed)
+    hooks.close()
+    metrics.record_writes(writer.report)
+    print(f"Replay upserts: {writer.report.summary()}")
+
+
+def main():
+    try:
+        run()
+    finally:
+        # Written for failed runs too, so the slow or broken stage shows up in the report
+        metrics.record_http(client.stats)
+        metrics.write_report(SYNC_SOURCE, mode="streaming" if STREAM else "paged",
+                             concurrency=CONCURRENCY, page_size=PAGE_SIZE)
+
+
+def run():
+    if http_cache.mode == "offline":
+        replay_archive()
+        return
+
+    started = time.monotonic()
+    since = sync_since(SYNC_SOURCE)
+    if since is not None:
+        print(f"Incremental sync: notices published since {since.isoformat()}")
+    pages = 0
+    failed_pages = []
+    hwm = HighWaterMark()
+    index = HashIndex(SYNC_SOURCE)
+    hooks = PostUpsert(db=sb)
+
+    with BulkWriter(sb, on_written=hooks) as writer:
+        try:
+            if STREAM:
+                pages = stream_pages(writer, index, hwm, since)
+            else:
+                # Pages are normalized and upserted as they arrive, while later pages are still in flight
+                for data in iter_pages(since=since, failed_pages=failed_pages):
+                    if not data.get(NOT_MODIFIED):
+                        process_records(_records(data), writer, index, hwm, since)
+                    pages += 1
+        except requests.RequestException as e:
+            # Everything fetched so far is still written; the next run resumes from the old mark
+            print(f"Fetching stopped early: {e}")
+            failed_pages.append(e)
+    report = writer.report
+    total_inserted = report.written
+    index.commit(report.failed)
+    with metrics.timer("post_upsert_close"):
+        hooks.close()
+    metrics.record_writes(report)
+    metrics.gauge("pages_failed", len(failed_pages))
+
+    # Only advanced after every page and row landed, so a failed run is retried from the old mark
+    if report.failed or failed_pages:
+        print(f"{len(report.failed)} tenders and {len(failed_pages)} pages failed; "
+              f"keeping the previous sync high-water mark.")
+    else:
+        save_high_water_mark(SYNC_SOURCE, hwm.value)
+        http_cache.mark_loaded()
+    http_cache.prune()
+    elapsed = time.monotonic() - started
+    print(f"Done. Inserted / updated: {total_inserted} tenders from {pages} pages in {elapsed:.1f}s.")
+    print(f"Upserts: {report.summary()}")
+    print(f"HTTP: {client.stats.summary()}")
 
 
 if __name__ == "__main__":
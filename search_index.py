@@ -0,0 +1,212 @@
+import os
+import re
+import json
+import math
+import pickle
+import numpy as np
+
+INDEX_PATH = os.getenv("SEARCH_INDEX_PATH", os.path.join(".cache", "search_index.pkl"))
+# Share of the query's trigrams a tender must contain to match (lower = more typo-tolerant)
+MIN_SIMILARITY = float(os.getenv("SEARCH_MIN_SIMILARITY", "0.5"))
+
+# A trigram found in several fields counts with its best field's weight
+FIELD_WEIGHTS = {"title": 3.0, "buyer_name": 2.0, "description": 1.0}
+# Columns the search results display, kept alongside the index
+DISPLAY_FIELDS = ["title", "buyer_name", "value_gbp", "status", "deadline"]
+# Columns to read when (re)building the index from Supabase
+SOURCE_COLUMNS = ["tender_id", "title", "description", "buyer", "value_gbp", "status", "deadline", "updated_at"]
+
+_NON_WORD = re.compile(r"[^0-9a-z]+")
+
+
+def extract_buyer_name(obj):
+    """Readable buyer name from the buyer jsonb (dict, plain string or anything else)."""
+    if isinstance(obj, dict):
+        if obj.get("name"):
+            return obj["name"]
+        cp = obj.get("contactPoint")
+        if isinstance(cp, dict) and cp.get("name"):
+            return cp["name"]
+        org = obj.get("organization")
+        if isinstance(org, dict) and org.get("name"):
+            return org["name"]
+    # jsonb as a plain string (e.g., "Royal Hospital Chelsea")
+    if isinstance(obj, str):
+        return obj.strip('"')
+    if obj is None:
+        return None
+    # fallback
+    try:
+        return json.dumps(obj, ensure_ascii=False)
+    except Exception:
+        return str(obj)
+
+
+def trigrams(text) -> set:
+    """pg_trgm-style trigrams: lower-cased words padded with two spaces in front, one behind."""
+    if not text or not isinstance(text, str):
+        return set()
+    grams = set()
+    for word in _NON_WORD.sub(" ", text.lower()).split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class SearchIndex:
+    """
+    In-process trigram inverted index over title, description and buyer
+    name. Each trigram maps to parallel arrays of document numbers and field
+    weights; a query adds up its trigrams' postings with NumPy, keeps tenders
+    that share at least MIN_SIMILARITY of the query's trigrams (so typos still
+    match) and ranks them by field-weighted overlap.
+
+    Upserting a tender tombstones its old document and appends a new one;
+    save() compacts once tombstones pile up.
+    """
+
+    def __init__(self):
+        self.keys = []        # doc number -> tender_id
+        self.docs = []        # doc number -> display fields
+        self.alive = []       # doc number -> not superseded/removed
+        self.doc_of = {}      # tender_id -> current doc number
+        self.postings = {}    # trigram -> ([doc numbers], [weights])
+        self.watermark = None  # newest updated_at synced from Supabase
+        self._arrays = {}
+
+    def __len__(self):
+        return len(self.doc_of)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_arrays"] = {}
+        return state
+
+    def add(self, records):
+        """Adds or replaces tenders (dicts as written by the loaders or read from Supabase)."""
+        for record in records:
+            tender_id = record.get("tender_id")
+            if tender_id is None:
+                continue
+            # Loaders write different column sets; keep display fields this record lacks
+            previous = self.docs[self.doc_of[tender_id]] if tender_id in self.doc_of else {}
+            self.remove(tender_id)
+
+            buyer_name = record.get("buyer_name") or extract_buyer_name(record.get("buyer"))
+            fields = {"title": record.get("title"), "description": record.get("description"),
+                      "buyer_name": buyer_name}
+            weights = {}
+            for field, weight in FIELD_WEIGHTS.items():
+                for gram in trigrams(fields[field]):
+                    if weights.get(gram, 0) < weight:
+                        weights[gram] = weight
+
+            doc = len(self.keys)
+            self.keys.append(tender_id)
+            shown = {
+                "title": record.get("title"),
+                "buyer_name": buyer_name,
+                "value_gbp": record.get("value_gbp", record.get("value_normalized")),
+                "status": record.get("status", record.get("tender_status")),
+                "deadline": record.get("deadline"),
+            }
+            self.docs.append({k: previous.get(k) if v is None else v for k, v in shown.items()})
+            self.alive.append(True)
+            self.doc_of[tender_id] = doc
+            for gram, weight in weights.items():
+                ids, ws = self.postings.setdefault(gram, ([], []))
+                ids.append(doc)
+                ws.append(weight)
+                self._arrays.pop(gram, None)
+
+    def remove(self, tender_id):
+        doc = self.doc_of.pop(tender_id, None)
+        if doc is not None:
+            self.alive[doc] = False
+            self.docs[doc] = None
+
+    def _posting(self, gram):
+        arrays = self._arrays.get(gram)
+        if arrays is None:
+            ids, ws = self.postings[gram]
+            arrays = (np.asarray(ids, dtype=np.int32), np.asarray(ws, dtype=np.float32))
+            self._arrays[gram] = arrays
+        return arrays
+
+    def search(self, query, limit=200, min_similarity=MIN_SIMILARITY):
+        """Returns up to `limit` (score, tender_id, display fields) tuples, best first."""
+        grams = [g for g in trigrams(query) if g in self.postings]
+        total = len(trigrams(query))
+        if not grams or not self.keys:
+            return []
+
+        scores = np.zeros(len(self.keys), dtype=np.float32)
+        hits = np.zeros(len(self.keys), dtype=np.int16)
+        for gram in grams:
+            ids, ws = self._posting(gram)
+            scores[ids] += ws
+            hits[ids] += 1
+
+        needed = max(1, math.ceil(min_similarity * total))
+        candidates = np.flatnonzero((hits >= needed) & np.asarray(self.alive, dtype=bool))
+        if not len(candidates):
+            return []
+        # Normalized to 0..1: every query trigram found in a title scores 1
+        ranked = scores[candidates] / (total * max(FIELD_WEIGHTS.values()))
+        if len(candidates) > limit:
+            top = np.argpartition(-ranked, limit - 1)[:limit]
+            candidates, ranked = candidates[top], ranked[top]
+        order = np.argsort(-ranked, kind="stable")
+        return [(float(ranked[i]), self.keys[candidates[i]], self.docs[candidates[i]]) for i in order]
+
+    def compact(self):
+        """Drops tombstoned documents and renumbers the rest."""
+        keep = np.flatnonzero(np.asarray(self.alive, dtype=bool))
+        remap = np.full(len(self.keys), -1, dtype=np.int64)
+        remap[keep] = np.arange(len(keep))
+        postings = {}
+        for gram, (ids, ws) in self.postings.items():
+            ids = np.asarray(ids, dtype=np.int64)
+            mask = remap[ids] >= 0
+            if mask.any():
+                postings[gram] = (remap[ids[mask]].tolist(), np.asarray(ws)[mask].tolist())
+        self.postings = postings
+        self.keys = [self.keys[i] for i in keep]
+        self.docs = [self.docs[i] for i in keep]
+        self.alive = [True] * len(keep)
+        self.doc_of = {k: i for i, k in enumerate(self.keys)}
+        self._arrays = {}
+
+    def save(self, path=INDEX_PATH):
+        if len(self.keys) and len(self.doc_of) < 0.75 * len(self.keys):
+            self.compact()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path=INDEX_PATH) -> "SearchIndex":
+        """Loads the on-disk index, or returns an empty one."""
+        try:
+            with open(path, "rb") as f:
+                return pickle.load(f)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return cls()
+
+    def sync(self, client) -> int:
+        """Pulls tenders changed since the last sync from Supabase (all of them the first time)."""
+        from tenders_reader import read_tenders
+
+        since = self.watermark
+        where = (lambda q: q.gte("updated_at", since)) if since else None
+        df = read_tenders(client, columns=SOURCE_COLUMNS, where=where)
+        if df.empty:
+            return 0
+        df = df.astype(object).where(df.notna(), None)
+        self.add(df.to_dict("records"))
+        newest = max((v for v in df["updated_at"] if v is not None), default=None)
+        if newest is not None:
+            self.watermark = newest.isoformat()
+        return len(df)
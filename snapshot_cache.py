@@ -0,0 +1,90 @@
+import os
+import threading
+import time
+import pandas as pd
+
+from tenders_reader import read_tenders
+
+# Seconds between background delta refreshes
+REFRESH_SECONDS = float(os.getenv("SNAPSHOT_REFRESH_SECONDS", "600"))
+
+
+class SnapshotCache:
+    """
+    Keeps the last tenders snapshot warm in memory. refresh() pulls only the
+    rows whose updated_at is newer than the snapshot's high-water mark and
+    merges them in by tender_id; a daemon thread does this every
+    `refresh_seconds`, so readers always get the current frame immediately.
+    """
+
+    def __init__(self, client, columns, key="tender_id", refresh_seconds=REFRESH_SECONDS):
+        self.client = client
+        self.columns = list(columns)
+        for extra in (key, "updated_at"):
+            if extra not in self.columns:
+                self.columns.append(extra)
+        self.key = key
+        self.refresh_seconds = refresh_seconds
+        self.frame = None
+        self.watermark = None
+        self.refreshed_at = None
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def get(self) -> pd.DataFrame:
+        """Current snapshot; the first call loads the full table, later calls never block."""
+        if self.frame is None:
+            with self._lock:
+                if self.frame is None:
+                    self._replace(read_tenders(self.client, columns=self.columns))
+        self.start()
+        return self.frame
+
+    def _replace(self, frame):
+        self.frame = frame.reset_index(drop=True)
+        self.watermark = frame["updated_at"].max() if len(frame) else None
+        if pd.isna(self.watermark):
+            self.watermark = None
+        self.refreshed_at = time.time()
+
+    def refresh(self) -> int:
+        """Merges rows changed since the watermark into the snapshot; returns how many changed."""
+        with self._lock:
+            if self.frame is None or self.watermark is None:
+                self._replace(read_tenders(self.client, columns=self.columns))
+                return len(self.frame)
+
+            # gte, not gt: rows sharing the watermark's timestamp may have landed after the last pull
+            since = self.watermark.isoformat()
+            # A delta is small: one keyset walk, no sharding (and so no count)
+            delta = read_tenders(self.client, columns=self.columns, shards=1,
+                                 where=lambda q: q.gte("updated_at", since))
+            self.refreshed_at = time.time()
+            if delta.empty:
+                return 0
+
+            # Build the merged frame off to the side and swap it in with one assignment,
+            # so readers holding the old frame are never affected
+            merged = pd.concat([self.frame, delta], ignore_index=True)
+            merged = merged.drop_duplicates(subset=self.key, keep="last").reset_index(drop=True)
+            for col in delta.columns:
+                if isinstance(delta[col].dtype, pd.CategoricalDtype) and not isinstance(merged[col].dtype, pd.CategoricalDtype):
+                    merged[col] = merged[col].astype("category")
+            self.frame = merged
+            self.watermark = max(self.watermark, delta["updated_at"].max())
+            return len(delta)
+
+    def _loop(self):
+        while True:
+            time.sleep(self.refresh_seconds)
+            try:
+                changed = self.refresh()
+                if changed:
+                    print(f"Snapshot refresh: merged {changed} changed tenders")
+            except Exception as e:
+                print(f"Snapshot refresh failed; keeping the previous snapshot: {e}")
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="snapshot-refresh", daemon=True)
+            self._thread.start()
@@ -0,0 +1,327 @@
+import os
+import time
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import pandas as pd
+import requests
+
+import metrics
+from supabase_client import create_client
+from bulk_writer import BulkWriter, BATCH_SIZE, chunked
+from change_detection import HashIndex
+from classifier import DEFAULT_REGION
+from http_cache import HttpCache
+from http_client import FetchClient, TokenBucket, pooled_session
+from normalizer import TENDER_COLUMNS, tender_columns, utc_times
+from post_upsert import PostUpsert
+from sync_state import sync_since, save_high_water_mark, api_date, HighWaterMark
+
+# Comma-separated adapters to run, concurrently (see ALL_SOURCES)
+SOURCES = os.getenv("SOURCES", "contracts_finder_ocds,find_a_tender,public_contracts_scotland")
+# Connections kept open per host, shared by every source's client
+POOL_SIZE = int(os.getenv("SOURCES_POOL_SIZE", "16"))
+
+# The canonical tender row every adapter produces
+COLUMNS = TENDER_COLUMNS + ["buyer"]
+
+
+# -----------------------
+# Adapters
+# -----------------------
+class Source:
+    """
+    One OCDS feed. An adapter only says which page to request first, which
+    page follows a response, and how a response maps to canonical tender
+    rows; fetching, archiving, change detection and writing are shared (see
+    load_sources). `env` prefixes its settings: <env>_RATE_PER_SEC,
+    <env>_RATE_BURST and <env>_PAGE_SIZE.
+    """
+
+    name = ""
+    env = ""
+    url = ""
+    rate_per_sec = 2.0
+    burst = 2
+    page_size = 100
+    # Pages are ordered newest-first, so paging stops at the first notice older than `since`
+    newest_first = False
+    # Region for notices the classifier leaves as UK (General), e.g. a national feed
+    default_region = None
+
+    def __init__(self):
+        self.rate_per_sec = float(os.getenv(f"{self.env}_RATE_PER_SEC", self.rate_per_sec))
+        self.burst = int(os.getenv(f"{self.env}_RATE_BURST", self.burst))
+        self.page_size = int(os.getenv(f"{self.env}_PAGE_SIZE", self.page_size))
+
+    def first_request(self, since):
+        """(url, params) of the first page."""
+        raise NotImplementedError
+
+    def next_request(self, data, request, since):
+        """(url, params) of the page after `data` (the response to `request`), or None."""
+        next_url = (data.get("links") or {}).get("next")
+        return (next_url, None) if next_url and releases(data) else None
+
+    def tenders(self, data, since=None) -> list:
+        """Canonical tender rows for one response body, one row per tender_id."""
+        found = releases(data)
+        columns = tender_columns(found, since if self.newest_first else None)
+        kept = found[:len(columns["tender_id"])]
+        columns["buyer"] = [buyer_of(r) for r in kept]
+        if self.default_region:
+            columns["region"] = [self.default_region if r == DEFAULT_REGION else r for r in columns["region"]]
+
+        published = utc_times(columns["published_date"])
+        older = None
+        if since is not None and not self.newest_first:
+            # Feeds that are not newest-first are filtered row by row instead of cut off
+            older = (published < pd.Timestamp(since)).to_numpy()
+        latest = {}
+        for i, tender_id in enumerate(columns["tender_id"]):
+            if tender_id is None or (older is not None and older[i]):
+                continue
+            # Several releases of one tender on a page: keep the newest, or the upsert would hit the row twice
+            if tender_id not in latest or not published.iloc[i] < published.iloc[latest[tender_id]]:
+                latest[tender_id] = i
+        return [{c: columns[c][i] for c in COLUMNS} for i in sorted(latest.values())]
+
+    def reached_since(self, data, since) -> bool:
+        if since is None or not self.newest_first:
+            return False
+        published = utc_times([r.get("date") for r in releases(data)])
+        return bool((published < pd.Timestamp(since)).any())
+
+
+class ContractsFinder(Source):
+    """Contracts Finder OCDS search: newest-first, paged by page number (or links.next)."""
+
+    name = "contracts_finder_ocds"
+    env = "CF"
+    url = "https://www.contractsfinder.service.gov.uk/Published/Notices/OCDS/Search"
+    rate_per_sec = 5.0
+    burst = 5
+    page_size = 50
+    newest_first = True
+
+    def _params(self, page, since):
+        params = {"order": "desc", "orderBy": "publicationDate", "status": "open",
+                  "page": page, "limit": self.page_size}
+        if since is not None:
+            params["publishedFrom"] = api_date(since)
+        return params
+
+    def first_request(self, since):
+        return self.url, self._params(1, since)
+
+    def next_request(self, data, request, since):
+        if not releases(data) or self.reached_since(data, since):
+            return None
+        linked = super().next_request(data, request, since)
+        if linked is not None:
+            return linked
+        url, params = request
+        page = (params or {}).get("page", 1)
+        if page >= data.get("totalPages", 0):
+            return None
+        return url, self._params(page + 1, since)
+
+
+class FindATender(Source):
+    """Find a Tender OCDS release packages, filtered by updatedFrom and walked with the links.next cursor."""
+
+    name = "find_a_tender"
+    env = "FTS"
+    url = "https://www.find-tender.service.gov.uk/api/1.0/ocdsReleasePackages"
+    rate_per_sec = 2.0
+    burst = 2
+    page_size = 100
+
+    def first_request(self, since):
+        params = {"stages": "tender", "limit": self.page_size}
+        if since is not None:
+            params["updatedFrom"] = api_date(since)
+        return self.url, params
+
+
+class PublicContractsScotland(Source):
+    """Public Contracts Scotland: one OCDS release package per month of contract notices."""
+
+    name = "public_contracts_scotland"
+    env = "PCS"
+    url = "https://api.publiccontractsscotland.gov.uk/v1/Notices"
+    rate_per_sec = 1.0
+    burst = 1
+    default_region = "Scotland"
+
+    def __init__(self):
+        super().__init__()
+        # Months read on a full crawl (incremental runs start at the high-water mark's month)
+        self.months = int(os.getenv("PCS_MONTHS", "1"))
+
+    def _params(self, year, month):
+        return {"dateFrom": f"{month:02d}-{year}", "outputType": 0, "noticeType": 2}
+
+    def first_request(self, since):
+        now = datetime.now(timezone.utc)
+        if since is None:
+            months_back = max(0, self.months - 1)
+            index = now.year * 12 + now.month - 1 - months_back
+        else:
+            index = since.year * 12 + since.month - 1
+        return self.url, self._params(index // 12, index % 12 + 1)
+
+    def next_request(self, data, request, since):
+        url, params = request
+        month, year = (int(part) for part in params["dateFrom"].split("-"))
+        index = year * 12 + month  # the following month, zero-based
+        now = datetime.now(timezone.utc)
+        if index > now.year * 12 + now.month - 1:
+            return None
+        return url, self._params(index // 12, index % 12 + 1)
+
+
+ALL_SOURCES = {cls.name: cls for cls in (ContractsFinder, FindATender, PublicContractsScotland)}
+
+
+def releases(data) -> list:
+    """The releases in an OCDS release package, record package or Contracts Finder search page."""
+    found = data.get("releases") or data.get("records") or []
+    return [n.get("compiledRelease") or n.get("releases", [n])[0] for n in found]
+
+
+def buyer_of(release):
+    buyer = release.get("buyer") or {}
+    return {"name": buyer.get("name"), "id": buyer.get("id")}
+
+
+# -----------------------
+# Scheduler
+# -----------------------
+@dataclass
+class SourceRun:
+    source: Source
+    client: FetchClient
+    cache: HttpCache
+    index: HashIndex
+    since: datetime = None
+    hwm: HighWaterMark = field(default_factory=HighWaterMark)
+    pages: int = 0
+    rows: int = 0
+    errors: list = field(default_factory=list)
+    tender_ids: set = field(default_factory=set)
+    seconds: float = 0.0
+
+
+def source_pages(run: SourceRun):
+    """Yields (CacheEntry, body) for every page of a source; replays the archive when HTTP_CACHE=offline."""
+    if run.cache.mode == "offline":
+        for entry in run.cache.entries():
+            yield entry, entry.json()
+        return
+    request = run.source.first_request(run.since)
+    while request is not None:
+        url, params = request
+        with metrics.timer("fetch"):
+            entry = run.cache.get(url, params=params, headers={"Accept": "application/json"}, timeout=30)
+        with metrics.timer("parse_page"):
+            data = entry.json()
+        yield entry, data
+        request = run.source.next_request(data, request, run.since)
+
+
+def load_source(run: SourceRun, new_writer: BulkWriter, changed_writer: BulkWriter) -> SourceRun:
+    """Fetches and queues one source's pages; runs on its own scheduler thread."""
+    started = time.perf_counter()
+    try:
+        for entry, data in source_pages(run):
+            run.pages += 1
+            metrics.count("pages_fetched")
+            if entry.skippable:
+                metrics.count("pages_not_modified")
+                continue
+            with metrics.timer("normalize"):
+                rows = run.source.tenders(data, run.since)
+            for batch in chunked(rows, BATCH_SIZE):
+                with metrics.timer("diff"):
+                    new, changed = run.index.split(batch)
+                for record in changed:
+                    record.pop("created_at", None)  # ✅ Keeps the original created_at on updates
+                new_writer.add(new)
+                changed_writer.add(changed)
+                run.tender_ids.update(str(r["tender_id"]) for r in new + changed)
+                for record in batch:
+                    run.hwm.observe(record["published_date"])
+            run.rows += len(rows)
+    except (requests.RequestException, FileNotFoundError, ValueError) as e:
+        # Everything fetched so far is still written; this source resumes from its old mark
+        print(f"⚠️ {run.source.name}: fetching stopped early: {e}")
+        run.errors.append(e)
+    run.seconds = time.perf_counter() - started
+    return run
+
+
+def load_sources(sources, db=None, session=None) -> dict:
+    """
+    Runs every source on its own thread in one process. They share one HTTP
+    connection pool, the two bulk writers (new / changed rows) and the
+    post-upsert hooks; each keeps its own rate limit, circuit breaker,
+    response archive, change-detection index and high-water mark, so a
+    failing feed never holds back the others' sync state.
+    """
+    db = db or create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_SERVICE_KEY"), service=True)
+    session = session or pooled_session(POOL_SIZE)
+    runs = []
+    for source in sources:
+        client = FetchClient(limiter=TokenBucket(source.rate_per_sec, source.burst), session=session)
+        runs.append(SourceRun(source, client, HttpCache(source.name, fetch=client.get),
+                              HashIndex(source.name), since=sync_since(source.name)))
+
+    hooks = PostUpsert(db=db)
+    with BulkWriter(db, on_conflict="tender_id", on_written=hooks) as new_writer, \
+            BulkWriter(db, on_conflict="tender_id", on_written=hooks) as changed_writer:
+        with ThreadPoolExecutor(max_workers=max(1, len(runs))) as pool:
+            list(pool.map(lambda run: load_source(run, new_writer, changed_writer), runs))
+    report = new_writer.report.merge(changed_writer.report)
+    metrics.record_writes(report)
+
+    failed_ids = {str(record.get("tender_id")) for record, _ in report.failed}
+    for run in runs:
+        run.index.commit(report.failed)
+        failed = len(run.tender_ids & failed_ids)
+        if failed or run.errors:
+            print(f"⚠️ {run.source.name}: {failed} tenders failed; keeping the previous sync high-water mark.")
+        elif run.cache.mode != "offline":
+            save_high_water_mark(run.source.name, run.hwm.value)
+            run.cache.mark_loaded()
+        if run.cache.mode != "offline":
+            run.cache.prune()
+        metrics.record_http(run.client.stats, prefix=f"http_{run.source.name}")
+        metrics.gauge(f"{run.source.name}_rows", run.rows)
+        print(f"📥 {run.source.name}: {run.rows} tenders from {run.pages} pages in {run.seconds:.1f}s | "
+              f"HTTP: {run.client.stats.summary()}")
+    hooks.close()
+    print(f"⏱️ {report.summary()}")
+    return {run.source.name: run for run in runs}
+
+
+def selected_sources(names=SOURCES) -> list:
+    wanted = [n.strip() for n in names.split(",") if n.strip()]
+    unknown = [n for n in wanted if n not in ALL_SOURCES]
+    if unknown:
+        raise SystemExit(f"Unknown sources: {', '.join(unknown)} (known: {', '.join(ALL_SOURCES)})")
+    return [ALL_SOURCES[n]() for n in wanted]
+
+
+def main():
+    sources = selected_sources()
+    print(f"🚀 Loading {len(sources)} sources concurrently: {', '.join(s.name for s in sources)}")
+    try:
+        load_sources(sources)
+    finally:
+        metrics.write_report("sources", sources=[s.name for s in sources])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+-- Server-side aggregates for dashboard.py (see dashboard_data.py).
+-- Apply once in the Supabase SQL editor. Every filter argument is optional:
+-- NULL (or an empty array) means "no filter on this column".
+-- Counts and totals skip the tenders tender_entities marks as near-duplicates.
+
+-- Near-duplicate and buyer resolution the loaders maintain (entity_resolution.py):
+-- every tender's canonical tender (the oldest of its near-duplicates) and the
+-- normalized key of its buyer name, and each buyer key's canonical buyer.
+create table if not exists tender_entities (
+    tender_id text primary key,
+    canonical_id text not null,
+    duplicate boolean not null default false,
+    buyer_key text,
+    updated_at timestamptz
+);
+create index if not exists tender_entities_duplicate_idx on tender_entities (tender_id) where duplicate;
+create index if not exists tender_entities_buyer_idx on tender_entities (buyer_key);
+create table if not exists buyer_aliases (
+    buyer_key text primary key,
+    buyer_id text not null,
+    buyer_name text,
+    updated_at timestamptz
+);
+
+create or replace function tender_filter_options()
+returns table (kind text, value text)
+language sql stable as $$
+    select distinct 'region', region from tenders where region is not null
+    union all
+    select distinct 'sector', sector from tenders where sector is not null
+    union all
+    select distinct 'tender_status', tender_status from tenders where tender_status is not null
+    union all
+    select 'max_value', coalesce(max(value_gbp), 0)::text from tenders
+$$;
+
+create or replace function tender_metrics(
+    p_regions text[] default null,
+    p_sectors text[] default null,
+    p_statuses text[] default null,
+    p_min_value numeric default null,
+    p_max_value numeric default null
+)
+returns table (tenders bigint, total_value numeric, avg_value numeric)
+language sql stable as $$
+    select count(*),
+           coalesce(sum(coalesce(value_gbp, 0)), 0),
+           coalesce(avg(coalesce(value_gbp, 0)), 0)
+    from tenders t
+    where (coalesce(cardinality(p_regions), 0) = 0 or region = any(p_regions))
+      and (coalesce(cardinality(p_sectors), 0) = 0 or sector = any(p_sectors))
+      and (coalesce(cardinality(p_statuses), 0) = 0 or tender_status = any(p_statuses))
+      and (p_min_value is null or coalesce(value_gbp, 0) >= p_min_value)
+      and (p_max_value is null or coalesce(value_gbp, 0) <= p_max_value)
+      and not exists (select 1 from tender_entities e where e.tender_id = t.tender_id and e.duplicate)
+$$;
+
+create or replace function tender_region_totals(
+    p_regions text[] default null,
+    p_sectors text[] default null,
+    p_statuses text[] default null,
+    p_min_value numeric default null,
+    p_max_value numeric default null
+)
+returns table (region text, tenders bigint, value_gbp numeric)
+language sql stable as $$
+    select t.region, count(*), coalesce(sum(coalesce(t.value_gbp, 0)), 0)
+    from tenders t
+    where t.region is not null
+      and (coalesce(cardinality(p_regions), 0) = 0 or t.region = any(p_regions))
+      and (coalesce(cardinality(p_sectors), 0) = 0 or t.sector = any(p_sectors))
+      and (coalesce(cardinality(p_statuses), 0) = 0 or t.tender_status = any(p_statuses))
+      and (p_min_value is null or coalesce(t.value_gbp, 0) >= p_min_value)
+      and (p_max_value is null or coalesce(t.value_gbp, 0) <= p_max_value)
+      and not exists (select 1 from tender_entities e where e.tender_id = t.tender_id and e.duplicate)
+    group by t.region
+    order by t.region
+$$;
+
+-- Tender count and value per canonical buyer, largest first
+create or replace function buyer_totals(
+    p_regions text[] default null,
+    p_sectors text[] default null,
+    p_statuses text[] default null,
+    p_min_value numeric default null,
+    p_max_value numeric default null,
+    p_limit int default 20
+)
+returns table (buyer_id text, buyer_name text, tenders bigint, value_gbp numeric)
+language sql stable as $$
+    select b.buyer_id, min(b.buyer_name), count(*), coalesce(sum(coalesce(t.value_gbp, 0)), 0)
+    from tenders t
+    join tender_entities e on e.tender_id = t.tender_id and not e.duplicate
+    join buyer_aliases b on b.buyer_key = e.buyer_key
+    where (coalesce(cardinality(p_regions), 0) = 0 or t.region = any(p_regions))
+      and (coalesce(cardinality(p_sectors), 0) = 0 or t.sector = any(p_sectors))
+      and (coalesce(cardinality(p_statuses), 0) = 0 or t.tender_status = any(p_statuses))
+      and (p_min_value is null or coalesce(t.value_gbp, 0) >= p_min_value)
+      and (p_max_value is null or coalesce(t.value_gbp, 0) <= p_max_value)
+    group by b.buyer_id
+    order by 4 desc, 1
+    limit p_limit
+$$;
+
+-- updated_at is stamped at write time whatever the loader sends, so the delta
+-- readers (snapshot_cache, search_index, vector_index) see every changed row
+create or replace function tenders_set_updated_at()
+returns trigger
+language plpgsql as $$
+begin
+    new.updated_at := clock_timestamp();
+    return new;
+end
+$$;
+drop trigger if exists tenders_updated_at on tenders;
+create trigger tenders_updated_at before insert or update on tenders
+    for each row execute function tenders_set_updated_at();
+create index if not exists tenders_updated_at_idx on tenders (updated_at);
+
+-- Supports the deadline-window query and the filters pushed down with it
+create index if not exists tenders_deadline_idx on tenders (deadline);
+create index if not exists tenders_region_sector_idx on tenders (region, sector, tender_status);
+
+-- Rollup cube the loaders maintain incrementally (rollup_cube.py): one row per
+-- (grain, period, region, sector, status) cell. The dashboard's metric cards and
+-- region chart read the month cells instead of aggregating tenders.
+create table if not exists tender_rollup (
+    cell text primary key,
+    grain text not null,
+    period text not null,
+    region text,
+    sector text,
+    tender_status text,
+    tenders bigint not null,
+    value_gbp numeric not null,
+    min_value numeric,
+    max_value numeric,
+    updated_at timestamptz
+);
+create index if not exists tender_rollup_grain_idx on tender_rollup (grain, cell);
+
+-- Saved searches and their notification outbox (saved_searches.py). The loaders
+-- match every written tender against the active searches and queue one outbox
+-- row per (search, tender); a notifier delivers and stamps delivered_at.
+create table if not exists saved_searches (
+    id bigserial primary key,
+    user_id text not null,
+    prompt text,
+    filters jsonb not null,
+    active boolean not null default true,
+    created_at timestamptz default now()
+);
+create table if not exists search_notifications (
+    search_id bigint not null references saved_searches (id) on delete cascade,
+    user_id text,
+    tender_id text not null,
+    title text,
+    matched_at timestamptz not null,
+    delivered_at timestamptz,
+    primary key (search_id, tender_id)
+);
+create index if not exists search_notifications_pending_idx
+    on search_notifications (matched_at) where delivered_at is null;
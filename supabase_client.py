@@ -5,15 +5,28 @@ from dotenv import load_dotenv
 # load .env automatically when this file is imported
 load_dotenv()
 
-def create_client():
+# "supabase": the real project; "local": the in-process stand-in in local_backend.py
+BACKEND = os.getenv("SUPABASE_BACKEND", "supabase")
+
+
+def create_client(url=None, key=None, backend=None, service=False):
     """
     Returns a ready-to-use Supabase client by reading
-    SUPABASE_URL and SUPABASE_KEY from the .env file.
+    SUPABASE_URL and SUPABASE_KEY from the .env file (unless given).
+    The loaders and other writers pass service=True: the key must then be
+    the service key (SUPABASE_SERVICE_KEY), never the anon key.
+    With SUPABASE_BACKEND=local it returns the shared local stand-in
+    instead, which needs neither.
     """
-    url = os.getenv("SUPABASE_URL")
-    key = os.getenv("SUPABASE_KEY")
+    if (backend or BACKEND) == "local":
+        from local_backend import shared_client
+        return shared_client()
+
+    key_name = "SUPABASE_SERVICE_KEY" if service else "SUPABASE_KEY"
+    url = url or os.getenv("SUPABASE_URL")
+    key = key or os.getenv(key_name)
 
     if not url or not key:
-        raise ValueError("Missing SUPABASE_URL or SUPABASE_KEY in .env")
+        raise ValueError(f"Missing SUPABASE_URL or {key_name} in .env")
 
     return create_supabase_client(url, key)
@@ -0,0 +1,94 @@
+import os
+import json
+from datetime import datetime, timedelta, timezone
+
+# Where each loader remembers the newest notice it has already loaded
+STATE_PATH = os.getenv("SYNC_STATE_PATH", os.path.join(".cache", "sync_state.json"))
+# "incremental" asks the API only for notices newer than the high-water mark; "full" re-crawls everything
+SYNC_MODE = os.getenv("SYNC_MODE", "incremental")
+# Re-read this much before the high-water mark to catch late-indexed or back-dated notices
+OVERLAP_HOURS = float(os.getenv("SYNC_OVERLAP_HOURS", "6"))
+
+
+def parse_ts(value):
+    """Parses an OCDS date string (or datetime) into an aware UTC datetime, or None."""
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        dt = value
+    else:
+        try:
+            dt = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc)
+
+
+def load_state(path=STATE_PATH) -> dict:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def get_high_water_mark(source: str, path=STATE_PATH):
+    return parse_ts(load_state(path).get(source, {}).get("high_water_mark"))
+
+
+def sync_since(source: str, path=STATE_PATH, overlap_hours=OVERLAP_HOURS):
+    """
+    Returns the lower publication-date bound for an incremental run
+    (high-water mark minus the overlap window), or None for a full crawl.
+    """
+    if SYNC_MODE != "incremental":
+        return None
+    hwm = get_high_water_mark(source, path)
+    if hwm is None:
+        return None
+    return hwm - timedelta(hours=overlap_hours)
+
+
+def save_high_water_mark(source: str, value, path=STATE_PATH):
+    """Advances the stored high-water mark for `source`; never moves it backwards."""
+    new = parse_ts(value)
+    if new is None:
+        return
+    state = load_state(path)
+    old = parse_ts(state.get(source, {}).get("high_water_mark"))
+    if old is not None and old >= new:
+        return
+
+    state[source] = {
+        "high_water_mark": new.isoformat(),
+        "saved_at": datetime.now(timezone.utc).isoformat(),
+    }
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp, path)
+
+
+class HighWaterMark:
+    """Tracks the newest timestamp seen while records stream past."""
+
+    def __init__(self):
+        self.value = None
+
+    def observe(self, value):
+        ts = parse_ts(value)
+        if ts is not None and (self.value is None or ts > self.value):
+            self.value = ts
+
+    def track(self, records, field="published_date"):
+        for record in records:
+            self.observe(record.get(field))
+            yield record
+
+
+def api_date(dt: datetime) -> str:
+    """Formats a datetime the way the Contracts Finder `publishedFrom` parameter expects."""
+    return dt.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S")
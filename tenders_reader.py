@@ -0,0 +1,214 @@
+import os
+import queue
+import threading
+import numpy as np
+import pandas as pd
+
+# PostgREST silently caps responses (max-rows, 1000 by default on Supabase),
+# so pages must stay at or below the server cap.
+PAGE_SIZE = int(os.getenv("READER_PAGE_SIZE", "1000"))
+# Pages buffered ahead of the decoder, per shard
+PREFETCH = int(os.getenv("READER_PREFETCH", "2"))
+# Key ranges read in parallel (1 = a single keyset walk)
+SHARDS = int(os.getenv("READER_SHARDS", "1"))
+
+CATEGORY_COLUMNS = {"region", "sector", "tender_status", "status", "currency"}
+FLOAT32_COLUMNS = {"value_gbp", "value_normalized"}
+DATETIME_COLUMNS = {"deadline", "published_date", "created_at", "updated_at"}
+
+
+def _keyset_query(client, select, key, page_size, where, after, upper):
+    query = client.table("tenders").select(select)
+    if where is not None:
+        query = where(query)
+    if key == "published_date":
+        # published_date is not unique: page on (published_date, tender_id).
+        # Rows with a NULL published_date are not reachable by this key.
+        query = query.not_.is_("published_date", "null")
+        if after is not None:
+            date, tid = after
+            query = query.or_(f"published_date.gt.{date},and(published_date.eq.{date},tender_id.gt.{tid})")
+        if upper is not None:
+            query = query.lt("published_date", upper)
+        return query.order("published_date").order("tender_id").limit(page_size)
+
+    if after is not None:
+        query = query.gt(key, after)
+    if upper is not None:
+        query = query.lt(key, upper)
+    return query.order(key).limit(page_size)
+
+
+def newest_update(client):
+    """The newest tenders.updated_at (stamped on every write, see sql/dashboard_functions.sql), or None."""
+    rows = (client.table("tenders").select("updated_at").not_.is_("updated_at", "null")
+            .order("updated_at", desc=True).limit(1).execute().data or [])
+    return rows[0]["updated_at"] if rows else None
+
+
+def written_since(client, after, columns=None, upto=None):
+    """iter_pages over the tenders written after the updated_at `after` (up to `upto`)."""
+    def where(query):
+        query = query.gt("updated_at", after)
+        return query if upto is None else query.lte("updated_at", upto)
+
+    return iter_pages(client, columns=columns, where=where)
+
+
+def iter_pages(client, columns=None, key="tender_id", page_size=PAGE_SIZE, where=None,
+               lower=None, upper=None):
+    """
+    Yields lists of row dicts, walking `tenders` by keyset (key > last seen)
+    instead of offset. Stops only on an empty page, so a server-side row cap
+    lower than `page_size` cannot truncate the result. `lower`/`upper` bound
+    the key range as [lower, upper); `where` adds filters to every page query.
+    """
+    select = ", ".join(columns) if columns else "*"
+    if columns and key not in columns:
+        select += f", {key}"
+    if key == "published_date" and columns and "tender_id" not in columns:
+        select += ", tender_id"
+
+    after = None
+    while True:
+        query = _keyset_query(client, select, key, page_size, where, after, upper)
+        if lower is not None:
+            query = query.gte(key, lower)
+        rows = query.execute().data or []
+        if not rows:
+            return
+        yield rows
+        last = rows[-1]
+        after = (last["published_date"], last["tender_id"]) if key == "published_date" else last[key]
+
+
+def shard_bounds(client, shards, key="tender_id", where=None):
+    """
+    Splits the key space into `shards` roughly equal [lower, upper) ranges
+    using the planner's row estimate and one offset probe per cut. Returns
+    (bounds, estimated count); a single shard needs no count at all (0).
+    """
+    if shards <= 1:
+        return [(None, None)], 0
+    # An exact count would scan the whole filtered set; the estimate only has to split it roughly
+    query = client.table("tenders").select(key, count="planned")
+    if where is not None:
+        query = where(query)
+    total = query.limit(1).execute().count or 0
+    if total < shards * PAGE_SIZE:
+        # Not worth splitting; the estimate still sizes the column buffers
+        return [(None, None)], total
+
+    cuts = []
+    for i in range(1, shards):
+        probe = client.table("tenders").select(key)
+        if where is not None:
+            probe = where(probe)
+        rows = probe.order(key).range(i * total // shards, i * total // shards).execute().data
+        if rows and rows[0][key] is not None:
+            cuts.append(rows[0][key])
+    cuts = sorted(set(cuts))
+    bounds = list(zip([None] + cuts, cuts + [None]))
+    return bounds, total
+
+
+def _prefetch(pages, out, done):
+    """Producer thread: pushes pages into a bounded queue so fetching overlaps decoding."""
+    try:
+        for rows in pages:
+            out.put(rows)
+    except Exception as e:
+        out.put(e)
+    finally:
+        out.put(done)
+
+
+class _ColumnBuffer:
+    """Preallocated storage for one column, in its compact dtype."""
+
+    def __init__(self, name, capacity):
+        self.name = name
+        if name in FLOAT32_COLUMNS:
+            self.kind = "float32"
+            self.data = np.full(capacity, np.nan, dtype=np.float32)
+        elif name in DATETIME_COLUMNS:
+            self.kind = "datetime"
+            self.data = np.full(capacity, np.datetime64("NaT"), dtype="datetime64[ns]")
+        elif name in CATEGORY_COLUMNS:
+            self.kind = "category"
+            self.categories = {}
+            self.data = np.full(capacity, -1, dtype=np.int32)
+        else:
+            self.kind = "object"
+            self.data = np.empty(capacity, dtype=object)
+
+    def grow(self, capacity):
+        old = self.data
+        fill = {"float32": np.nan, "datetime": np.datetime64("NaT"), "category": -1, "object": None}[self.kind]
+        self.data = np.full(capacity, fill, dtype=old.dtype)
+        self.data[:len(old)] = old
+
+    def write(self, start, values):
+        end = start + len(values)
+        if self.kind == "float32":
+            self.data[start:end] = pd.to_numeric(pd.Series(values, dtype=object), errors="coerce").to_numpy(np.float32)
+        elif self.kind == "datetime":
+            parsed = pd.to_datetime(pd.Series(values, dtype=object), errors="coerce", utc=True)
+            self.data[start:end] = parsed.dt.tz_localize(None).to_numpy("datetime64[ns]")
+        elif self.kind == "category":
+            codes = self.categories
+            self.data[start:end] = [-1 if v is None else codes.setdefault(v, len(codes)) for v in values]
+        else:
+            self.data[start:end] = values
+
+    def finish(self, n):
+        if self.kind == "category":
+            return pd.Categorical.from_codes(self.data[:n], categories=list(self.categories))
+        if self.kind == "datetime":
+            return pd.DatetimeIndex(self.data[:n]).tz_localize("UTC")
+        return self.data[:n]
+
+
+def read_tenders(client, columns=None, key="tender_id", page_size=PAGE_SIZE,
+                 prefetch=PREFETCH, shards=SHARDS, where=None) -> pd.DataFrame:
+    """
+    Reads the whole (optionally filtered) tenders table into a DataFrame with
+    compact dtypes: categoricals for region/sector/status, float32 values and
+    UTC datetime64 dates. Pages are fetched by keyset on background threads
+    (one per key-range shard) while earlier pages are decoded into column
+    buffers, preallocated from the row estimate when sharded and grown by
+    doubling otherwise.
+    """
+    bounds, total = shard_bounds(client, shards, key, where)
+    capacity = max(total, 1)
+
+    pages = queue.Queue(maxsize=max(1, prefetch) * len(bounds))
+    done = object()
+    for lower, upper in bounds:
+        walker = iter_pages(client, columns, key, page_size, where, lower, upper)
+        threading.Thread(target=_prefetch, args=(walker, pages, done), daemon=True).start()
+
+    buffers = None
+    n = 0
+    finished = 0
+    while finished < len(bounds):
+        rows = pages.get()
+        if rows is done:
+            finished += 1
+            continue
+        if isinstance(rows, Exception):
+            raise rows
+        if buffers is None:
+            names = list(columns) if columns else list(rows[0].keys())
+            buffers = [_ColumnBuffer(name, capacity) for name in names]
+        if n + len(rows) > capacity:
+            capacity = max(capacity * 2, n + len(rows))
+            for buf in buffers:
+                buf.grow(capacity)
+        for buf in buffers:
+            buf.write(n, [row.get(buf.name) for row in rows])
+        n += len(rows)
+
+    if buffers is None:
+        return pd.DataFrame(columns=list(columns or []))
+    return pd.DataFrame({buf.name: buf.finish(n) for buf in buffers})
@@ -0,0 +1,28 @@
+import pytest
+
+from classifier import DEFAULT_REGION, DEFAULT_SECTOR, classify, classify_many
+
+
+@pytest.mark.parametrize("text, label", [
+    ("Healthcare services", (DEFAULT_REGION, "Healthcare")),
+    ("Railway station upgrade", (DEFAULT_REGION, "Transport & Infrastructure")),
+    ("Roadworks in Kent", ("South England", "Transport & Infrastructure")),
+    ("Digitalisation of records", (DEFAULT_REGION, "Information Technology")),
+    ("New schools in Leeds", ("Midlands & North", "Education")),
+    ("Replacement buses", (DEFAULT_REGION, "Transport & Infrastructure")),
+    ("Civils works package", (DEFAULT_REGION, "Construction & Engineering")),
+])
+def test_keywords_match_plurals_and_listed_compounds(text, label):
+    assert classify(text) == label
+    assert classify_many([text]) == [label]
+
+
+@pytest.mark.parametrize("text", [
+    "Exhibition stand for Kentucky",
+    "Roadshow event management",
+    "History of civilisation lectures",
+    "Its items arrive with the order",
+])
+def test_keywords_do_not_match_other_words_they_begin(text):
+    assert classify(text) == (DEFAULT_REGION, DEFAULT_SECTOR)
+    assert classify_many([text]) == [(DEFAULT_REGION, DEFAULT_SECTOR)]
@@ -0,0 +1,47 @@
+from entity_resolution import EntityResolver
+
+DESCRIPTION = "Daily cleaning of council offices, libraries and depots including consumables and waste collection"
+
+
+def notice(tender_id, title, **fields):
+    return dict({"tender_id": tender_id, "title": title, "description": DESCRIPTION,
+                 "deadline": "2030-01-10T00:00:00+00:00"}, **fields)
+
+
+def test_same_notice_from_both_loaders_is_one_tender(tmp_path):
+    resolver = EntityResolver(str(tmp_path))
+    # scripts/fetch_contracts_finder.py keys on the notice id and carries the buyer
+    resolver.add([notice("abc-123", "Office cleaning contract", buyer={"name": "Leeds City Council"})])
+    # fetch_tenders.py keys on the ocid and has no buyer
+    resolver.add([notice("ocds-b5fd17-abc-123", "Office cleaning contract")])
+    assert resolver.duplicate_ids() == {"ocds-b5fd17-abc-123"}
+    assert resolver.canonical_id("ocds-b5fd17-abc-123") == "abc-123"
+
+
+def test_other_publishers_ocids_are_not_linked(tmp_path):
+    resolver = EntityResolver(str(tmp_path))
+    resolver.add([notice("abc-123", "Office cleaning contract"), notice("ocds-h6vhtk-abc-123", "Road resurfacing")])
+    assert resolver.duplicate_ids() == set()
+
+
+def test_short_titles_and_lots_are_not_merged(tmp_path):
+    resolver = EntityResolver(str(tmp_path))
+    buyer = {"name": "Leeds City Council"}
+    resolver.add([
+        {"tender_id": "a", "title": "Cleaning Services", "buyer": buyer},
+        {"tender_id": "b", "title": "Cleaning services", "buyer": buyer},
+        notice("c", "Cleaning services Lot 1 North", buyer=buyer),
+        notice("d", "Cleaning services Lot 2 South", buyer=buyer),
+    ])
+    assert resolver.duplicate_ids() == set()
+
+
+def test_a_changed_duplicate_is_canonical_again(tmp_path):
+    resolver = EntityResolver(str(tmp_path))
+    buyer = {"name": "Leeds City Council"}
+    resolver.add([notice("t1", "Office cleaning contract 2025", buyer=buyer),
+                  notice("t2", "Office cleaning contract 2025", buyer=buyer)])
+    assert resolver.duplicate_ids() == {"t2"}
+    resolver.add([notice("t2", "Window cleaning framework 2026", buyer=buyer,
+                         description="Quarterly window cleaning of schools across the city")])
+    assert resolver.duplicate_ids() == set()
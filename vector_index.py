@@ -0,0 +1,352 @@
+import os
+import re
+import math
+import pickle
+import zlib
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+
+from classifier import REGION_KEYWORDS, SECTOR_KEYWORDS
+from search_index import extract_buyer_name
+
+VECTOR_DIR = os.getenv("VECTOR_INDEX_DIR", os.path.join(".cache", "vectors"))
+# Set VECTOR_INDEX=off to stop the loaders maintaining the index
+ENABLED = os.getenv("VECTOR_INDEX", "on") != "off"
+# Dimensions of the hashed tender vectors (stored as int8)
+DIM = int(os.getenv("VECTOR_DIM", "256"))
+
+# Buckets of the hashed document-frequency table the IDF weights come from
+DF_BUCKETS = 1 << 18
+# A keyword of the classifier's tables also adds its label as a feature, with this weight,
+# so "janitorial" and "cleaning" share a dimension
+CONCEPT_WEIGHT = 1.0
+# Characters of the description kept for display
+DESCRIPTION_CHARS = 280
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset("""
+    a an and are as at be by for from has have in into is it its of on or our that the their this to was
+    were will with within we you your all any under over up per via
+""".split())
+
+# Fields kept per tender for display and for the structured filters
+DOC_FIELDS = ["title", "description", "buyer_name", "region", "sector", "value_gbp", "deadline"]
+# Columns to read when (re)building the index from Supabase
+SOURCE_COLUMNS = ["tender_id", "title", "description", "buyer", "region", "sector", "value_gbp",
+                  "deadline", "updated_at"]
+
+
+def _stem(token):
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+# Stemmed single-word keyword of the classifier's tables -> its labels, as concept features
+CONCEPTS = {}
+for _table in (REGION_KEYWORDS, SECTOR_KEYWORDS):
+    for _label, _keywords in _table:
+        for _kw in _keywords:
+            if " " not in _kw:
+                CONCEPTS.setdefault(_stem(_kw), []).append(f"~{_label}")
+
+_words = {}
+
+
+def _word(token):
+    """Stemmed form of a token, or None for stopwords (memoized: the vocabulary is small)."""
+    word = _words.get(token, False)
+    if word is False:
+        word = _words[token] = None if len(token) < 2 or token in STOPWORDS else _stem(token)
+    return word
+
+
+def features(text) -> dict:
+    """Weighted features of a text: stemmed words (sub-linear term frequency) plus classifier concepts."""
+    if not text or not isinstance(text, str):
+        return {}
+    counts = Counter(map(_word, _TOKEN.findall(text.lower())))
+    counts.pop(None, None)
+    weights = {word: 1.0 + math.log(n) if n > 1 else 1.0 for word, n in counts.items()}
+    for word in counts.keys() & CONCEPTS.keys():
+        for label in CONCEPTS[word]:
+            weights[label] = CONCEPT_WEIGHT
+    return weights
+
+
+_hashes = {}
+
+
+def _hash(feature) -> int:
+    h = _hashes.get(feature)
+    if h is None:
+        h = _hashes[feature] = zlib.crc32(feature.encode("utf-8"))
+    return h
+
+
+class VectorIndex:
+    """
+    Offline semantic index: every tender's title, description and buyer name
+    become one L2-normalized vector of DIM signed hashed features, weighted
+    by sub-linear TF and IDF (from a hashed document-frequency table kept
+    alongside), with classifier labels as extra "concept" features so
+    "janitorial" and "cleaning" overlap. Vectors are stored as int8 in a
+    memory-mapped matrix and appended on every upsert (the previous row is
+    tombstoned, as in SearchIndex).
+
+    The matrix is dimension-major (DIM x rows): a query of a few keywords
+    only has non-zero weight in a handful of dimensions, so scoring every
+    tender reads just those rows of the matrix, a few bytes per tender, and
+    the ranking is exact. IDF weights are those at insertion time;
+    rebuild() refreshes them.
+    """
+
+    def __init__(self, directory=VECTOR_DIR, dim=DIM):
+        self.directory = directory
+        self.dim = dim
+        self.keys = []         # row -> tender_id
+        self.docs = []         # row -> display/filter fields (None once superseded)
+        self.doc_of = {}       # tender_id -> current row
+        self.df = np.zeros(DF_BUCKETS, dtype=np.int32)
+        self.documents = 0
+        self.capacity = 0
+        self.watermark = None  # newest updated_at synced from Supabase
+        self._matrix = None
+        self._arrays = None
+
+    def __len__(self):
+        return len(self.doc_of)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.update(_matrix=None, _arrays=None)
+        return state
+
+    @property
+    def path(self):
+        return os.path.join(self.directory, "vectors.i8")
+
+    def _open(self, capacity):
+        """Maps the vector file, growing it (and copying the rows) when `capacity` exceeds it."""
+        if self._matrix is not None and capacity <= self.capacity:
+            return self._matrix
+        os.makedirs(self.directory, exist_ok=True)
+        if capacity > self.capacity:
+            capacity = max(1024, capacity, 2 * self.capacity)
+            grown = np.memmap(f"{self.path}.tmp", dtype=np.int8, mode="w+", shape=(self.dim, capacity))
+            if self.capacity and os.path.exists(self.path):
+                old = np.memmap(self.path, dtype=np.int8, mode="r", shape=(self.dim, self.capacity))
+                grown[:, :len(self.keys)] = old[:, :len(self.keys)]
+                del old
+            grown.flush()
+            del grown
+            self._matrix = None
+            os.replace(f"{self.path}.tmp", self.path)
+            self.capacity = capacity
+        self._matrix = np.memmap(self.path, dtype=np.int8, mode="r+", shape=(self.dim, self.capacity))
+        return self._matrix
+
+    # --- vectors ---
+    def _idf(self, hashes):
+        return np.log((1.0 + self.documents) / (1.0 + self.df[hashes % DF_BUCKETS])) + 1.0
+
+    def vectors(self, weights) -> np.ndarray:
+        """L2-normalized float32 rows for a list of feature dicts (all zeros for an empty one)."""
+        rows = np.repeat(np.arange(len(weights)), [len(w) for w in weights])
+        hashes = np.fromiter((_hash(f) for w in weights for f in w), dtype=np.int64, count=len(rows))
+        values = np.fromiter((v for w in weights for v in w.values()), dtype=np.float64, count=len(rows))
+        values *= self._idf(hashes) * np.where(hashes & (1 << 31), -1.0, 1.0)
+        out = np.zeros((len(weights), self.dim), dtype=np.float64)
+        np.add.at(out, (rows, hashes % self.dim), values)
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        return (out / np.where(norms > 0, norms, 1.0)).astype(np.float32)
+
+    def vector(self, text) -> np.ndarray:
+        """The L2-normalized float32 vector of a text (all zeros when it has no features)."""
+        return self.vectors([features(text)])[0]
+
+    # --- updates ---
+    def add(self, records):
+        """Adds or replaces tenders (dicts as written by the loaders or read from Supabase)."""
+        batch = []
+        for record in records:
+            tender_id = record.get("tender_id")
+            if tender_id is None:
+                continue
+            tender_id = str(tender_id)
+            old = self.doc_of.get(tender_id)
+            previous = self.docs[old] if old is not None else {}
+            buyer_name = record.get("buyer_name") or extract_buyer_name(record.get("buyer"))
+            fields = {
+                "title": record.get("title"),
+                "description": (record.get("description") or "")[:DESCRIPTION_CHARS] or None,
+                "buyer_name": buyer_name,
+                "region": record.get("region"),
+                "sector": record.get("sector"),
+                "value_gbp": record.get("value_gbp", record.get("value_normalized")),
+                "deadline": record.get("deadline"),
+            }
+            # Loaders write different column sets; keep the fields this record lacks
+            doc = {k: previous.get(k) if v is None else v for k, v in fields.items()}
+            text = " ".join(str(v) for v in (record.get("title"), record.get("description"), buyer_name) if v)
+            batch.append((tender_id, old, doc, text))
+        if not batch:
+            return
+
+        # Document frequencies first, so a first load's vectors already see the whole batch
+        weights = [features(text) for *_, text in batch]
+        buckets = [b for w in weights for b in {_hash(f) % DF_BUCKETS for f in w}]
+        np.add.at(self.df, np.asarray(buckets, dtype=np.int64), 1)
+        self.documents += sum(1 for w in weights if w)
+
+        start = len(self.keys)
+        matrix = self._open(start + len(batch))
+        vectors = self.vectors(weights)
+        for i, (_, old, _, text) in enumerate(batch):
+            if not text and old is not None:
+                # No text in this record (e.g. a value-only update): the tender keeps its vector
+                vectors[i] = matrix[:, old].astype(np.float32) / 127.0
+        matrix[:, start:start + len(batch)] = np.round(vectors.T * 127).astype(np.int8)
+        for i, (tender_id, _, doc, _) in enumerate(batch):
+            old = self.doc_of.get(tender_id)
+            if old is not None:
+                self.docs[old] = None
+            self.keys.append(tender_id)
+            self.docs.append(doc)
+            self.doc_of[tender_id] = start + i
+        self._arrays = None
+
+    def rebuild(self, client) -> int:
+        """Re-reads every tender, so all vectors use the current IDF weights."""
+        fresh = VectorIndex(self.directory, self.dim)
+        self._matrix = None
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.__dict__.update(fresh.__dict__)
+        return self.sync(client)
+
+    # --- queries ---
+    def _filter_arrays(self):
+        if self._arrays is None:
+            docs = [d or {} for d in self.docs]
+            deadlines = pd.to_datetime(pd.Series([d.get("deadline") for d in docs], dtype=object),
+                                       errors="coerce", utc=True, format="ISO8601")
+            deadlines = deadlines.dt.tz_localize(None).to_numpy("datetime64[ns]")
+            self._arrays = {
+                "alive": np.array([d is not None for d in self.docs], dtype=bool),
+                "region": np.array([d.get("region") for d in docs], dtype=object),
+                "sector": np.array([d.get("sector") for d in docs], dtype=object),
+                "value_gbp": pd.to_numeric(pd.Series([d.get("value_gbp") for d in docs], dtype=object),
+                                           errors="coerce").to_numpy("float64"),
+                "deadline": deadlines.view("int64"),
+                "has_deadline": ~np.isnat(deadlines),
+            }
+        return self._arrays
+
+    def _mask(self, rows, region=None, sector=None, value_cap=None, timeframe_days=None, now=None):
+        arrays = self._filter_arrays()
+        keep = arrays["alive"][rows]
+        if region:
+            keep &= arrays["region"][rows] == region
+        if sector:
+            keep &= arrays["sector"][rows] == sector
+        if value_cap:
+            # Like the assistant's lte("value_gbp"): tenders without a value never pass a cap
+            keep &= arrays["value_gbp"][rows] <= value_cap
+        if timeframe_days:
+            # Like the assistant's lte("deadline", today + days)
+            day = (now or datetime.now(timezone.utc)).date() + timedelta(days=int(timeframe_days) + 1)
+            until = pd.Timestamp(day).value
+            keep &= arrays["has_deadline"][rows] & (arrays["deadline"][rows] < until)
+        return keep
+
+    def _score(self, query):
+        """Cosine of `query` with every row, reading only the query's non-zero dimensions."""
+        rows = len(self.keys)
+        matrix = self._open(rows)
+        scores = np.zeros(rows, dtype=np.float32)
+        for d in np.flatnonzero(query):
+            scores += np.float32(query[d] / 127.0) * matrix[d, :rows]
+        return scores
+
+    def search(self, text, k=50, min_score=0.05, **filters):
+        """
+        Up to `k` (score, tender_id, fields) tuples most similar to `text`,
+        best first, among the tenders passing `filters` (region, sector,
+        value_cap, timeframe_days, now).
+        """
+        query = self.vector(text)
+        if not self.doc_of or not query.any():
+            return []
+        rows = np.arange(len(self.keys))
+        rows = rows[self._mask(rows, **filters)]
+        if not len(rows):
+            return []
+        scores = self._score(query)[rows]
+        keep = scores >= min_score
+        rows, scores = rows[keep], scores[keep]
+        if len(rows) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+            rows, scores = rows[top], scores[top]
+        order = np.argsort(-scores, kind="stable")
+        return [(float(scores[i]), self.keys[rows[i]],
+                 {f: self.docs[rows[i]].get(f) for f in DOC_FIELDS}) for i in order]
+
+    # --- persistence ---
+    def compact(self):
+        """Drops superseded rows and renumbers the rest (rewrites the vector file)."""
+        keep = np.flatnonzero([d is not None for d in self.docs])
+        vectors = np.asarray(self._open(len(self.keys))[:, keep])
+        self._matrix = None
+        self.capacity = 0
+        self.keys = [self.keys[i] for i in keep]
+        self.docs = [self.docs[i] for i in keep]
+        self.doc_of = {k: i for i, k in enumerate(self.keys)}
+        self._open(len(keep))[:, :len(keep)] = vectors
+        self._arrays = None
+
+    def save(self):
+        if len(self.keys) and len(self.doc_of) < 0.75 * len(self.keys):
+            self.compact()
+        if self._matrix is not None:
+            self._matrix.flush()
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, "index.pkl")
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, directory=VECTOR_DIR) -> "VectorIndex":
+        """Loads the on-disk index (vectors memory-mapped), or returns an empty one."""
+        try:
+            with open(os.path.join(directory, "index.pkl"), "rb") as f:
+                index = pickle.load(f)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return cls(directory)
+        index.directory = directory
+        return index
+
+    def sync(self, client) -> int:
+        """Pulls tenders changed since the last sync from Supabase (all of them the first time)."""
+        from tenders_reader import read_tenders
+
+        since = self.watermark
+        where = (lambda q: q.gte("updated_at", since)) if since else None
+        df = read_tenders(client, columns=SOURCE_COLUMNS, where=where)
+        if df.empty:
+            return 0
+        df = df.astype(object).where(df.notna(), None)
+        if "deadline" in df.columns:
+            df["deadline"] = [d.isoformat() if d is not None else None for d in df["deadline"]]
+        self.add(df.to_dict("records"))
+        newest = max((v for v in df["updated_at"] if v is not None), default=None)
+        if newest is not None:
+            self.watermark = newest.isoformat()
+        return len(df)